@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from core.admin import AutocompleteFilter, AutocompleteFilterMixin
+from .models import CheckIn
+
+
+@admin.register(CheckIn)
+class CheckInAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ("registration", "event", "scanned_at", "source", "device", "scanned_by")
+    list_filter = ("source", ("event", AutocompleteFilter))
+    search_fields = ("registration__ticket_code", "registration__full_name", "device")
+    list_select_related = ("registration", "event", "scanned_by")
+    readonly_fields = ("registration", "event", "source", "device", "scanned_by", "scanned_at", "created_at")
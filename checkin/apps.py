@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CheckinConfig(AppConfig):
+    name = 'checkin'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('events', '0011_ticketrenderjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('ONLINE', 'Online'), ('OFFLINE', 'Offline (lote)')], default='ONLINE', max_length=10)),
+                ('device', models.CharField(blank=True, max_length=60)),
+                ('scanned_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkins', to='events.event')),
+                ('registration', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='checkin', to='events.eventregistration')),
+                ('scanned_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-scanned_at',),
+                'indexes': [models.Index(fields=['event', 'scanned_at'], name='checkin_che_event_i_05cf36_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CheckInCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='events.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'shard'), name='uniq_checkin_counter_event_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+import random
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Sum
+
+
+class CheckInSource(models.TextChoices):
+    ONLINE = "ONLINE", "Online"
+    OFFLINE = "OFFLINE", "Offline (lote)"
+
+
+class CheckIn(models.Model):
+    """
+    Entrada de um ingresso no evento. Uma por inscrição: a constraint única é o
+    que rejeita leituras repetidas, mesmo com vários scanners em simultâneo.
+    """
+    registration = models.OneToOneField(
+        "events.EventRegistration", on_delete=models.CASCADE, related_name="checkin"
+    )
+    event = models.ForeignKey("events.Event", on_delete=models.CASCADE, related_name="checkins")
+
+    source = models.CharField(max_length=10, choices=CheckInSource.choices, default=CheckInSource.ONLINE)
+    device = models.CharField(max_length=60, blank=True)
+    scanned_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    # hora da leitura no dispositivo (lotes offline chegam mais tarde)
+    scanned_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-scanned_at",)
+        indexes = [
+            models.Index(fields=["event", "scanned_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.registration_id} • {self.scanned_at:%H:%M:%S}"
+
+
+class CheckInCounter(models.Model):
+    """
+    Contagem de entradas por evento, repartida por SHARDS linhas: cada check-in
+    incrementa uma linha ao acaso, para os scanners não disputarem o lock da mesma
+    linha (Postgres). O total é a soma das linhas, sem COUNT(*) aos CheckIn.
+    """
+    SHARDS = 8
+
+    event = models.ForeignKey("events.Event", on_delete=models.CASCADE, related_name="+")
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["event", "shard"], name="uniq_checkin_counter_event_shard"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}/{self.shard}: {self.count}"
+
+    @classmethod
+    def increment(cls, event_id: int, n: int = 1):
+        shard = random.randrange(cls.SHARDS)
+        counter = cls.objects.filter(event_id=event_id, shard=shard)
+        if not counter.update(count=F("count") + n):
+            # 1ª entrada do evento: cria os shards (a zeros) e volta a tentar
+            cls.objects.bulk_create(
+                [cls(event_id=event_id, shard=i) for i in range(cls.SHARDS)], ignore_conflicts=True
+            )
+            counter.update(count=F("count") + n)
+
+    @classmethod
+    def total(cls, event_id: int) -> int:
+        return cls.objects.filter(event_id=event_id).aggregate(n=Sum("count"))["n"] or 0
@@ -0,0 +1,170 @@
+"""
+Registo das leituras de QR no check-in.
+
+A unicidade de CheckIn.registration é o que garante que cada ingresso só entra uma
+vez: a leitura é um INSERT (sem SELECT ... FOR UPDATE) e um segundo scanner com o
+mesmo ingresso recebe IntegrityError -> "duplicate". O contador do evento é
+incrementado na mesma transação (CheckInCounter).
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from events.models import EventRegistration, PaymentStatus, RegistrationStatus
+from events.tickets import InvalidTicketToken, event_key, legacy_code, parse_token, verify_token
+
+from .models import CheckIn, CheckInCounter, CheckInSource
+
+OK = "ok"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+UNKNOWN = "unknown"
+WRONG_EVENT = "wrong_event"
+
+
+@dataclass
+class ScanResult:
+    result: str
+    ticket_code: str | None = None
+    name: str = ""
+    detail: str = ""
+    checked_in_at: datetime | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "result": self.result,
+            "ticket_code": self.ticket_code,
+            "name": self.name,
+            "detail": self.detail,
+            "checked_in_at": self.checked_in_at.isoformat() if self.checked_in_at else None,
+        }
+
+
+def decode(token: str, event) -> str:
+    """
+    Devolve o ticket_code de um QR assinado (events.tickets), de um QR antigo
+    (RWB|RWB-XXXXXXXX) ou de um código escrito à mão (RWB-XXXXXXXX).
+    Levanta InvalidTicketToken.
+    """
+    token = (token or "").strip().upper()
+    if token.startswith("RWB-") and ":" not in token:
+        return token
+    code = legacy_code(token)
+    if code:
+        # sem assinatura: o evento é confirmado pela inscrição (_check_registration)
+        return code
+    _, event_id, _ = parse_token(token)
+    if event_id != event.pk:
+        raise InvalidTicketToken("Ingresso de outro evento.")
+    return verify_token(token, event_key(event.pk), event.pk)
+
+
+def _scanned_at(value) -> datetime:
+    # data ilegível (ex.: relógio do scanner mal configurado): conta a hora de chegada
+    try:
+        dt = parse_datetime(value) if isinstance(value, str) else value
+    except ValueError:
+        dt = None
+    return dt or timezone.now()
+
+
+def _check_registration(reg, code: str, event) -> ScanResult | None:
+    if reg is None:
+        return ScanResult(UNKNOWN, code, detail="Ingresso não encontrado.")
+    if reg.event_id != event.pk:
+        return ScanResult(WRONG_EVENT, code, reg.full_name, "Ingresso de outro evento.")
+    if reg.payment_status != PaymentStatus.PAID or reg.status != RegistrationStatus.ACTIVE:
+        return ScanResult(UNKNOWN, code, reg.full_name, "Ingresso não pago ou cancelado.")
+    return None
+
+
+def _registrations():
+    return EventRegistration.objects.only("id", "event_id", "ticket_code", "full_name", "payment_status", "status")
+
+
+def _duplicate(reg) -> ScanResult:
+    first = CheckIn.objects.filter(registration_id=reg.pk).values_list("scanned_at", flat=True).first()
+    return ScanResult(DUPLICATE, reg.ticket_code, reg.full_name, "Ingresso já usado.", first)
+
+
+def scan(token: str, *, event, device: str = "", user=None, scanned_at=None,
+         source: str = CheckInSource.ONLINE) -> ScanResult:
+    try:
+        code = decode(token, event)
+    except InvalidTicketToken as e:
+        return ScanResult(INVALID, detail=str(e))
+
+    reg = _registrations().filter(ticket_code=code).first()
+    rejected = _check_registration(reg, code, event)
+    if rejected:
+        return rejected
+
+    scanned_at = _scanned_at(scanned_at)
+    try:
+        with transaction.atomic():
+            CheckIn.objects.create(
+                registration=reg, event=event, source=source, device=device[:60],
+                scanned_by=user, scanned_at=scanned_at,
+            )
+            CheckInCounter.increment(event.pk)
+    except IntegrityError:
+        return _duplicate(reg)
+
+    return ScanResult(OK, code, reg.full_name, checked_in_at=scanned_at)
+
+
+def scan_batch(scans: list[dict], *, event, device: str = "", user=None) -> list[ScanResult]:
+    """
+    Lote de leituras feitas offline ([{"token", "scanned_at"}], pela ordem em que
+    foram lidas). Um SELECT para as inscrições, outro para as entradas já registadas
+    e um INSERT em bloco; só cai para leitura a leitura se houver uma corrida com
+    outro scanner.
+    """
+    results: list[ScanResult | None] = [None] * len(scans)
+    codes = {}
+    for i, item in enumerate(scans):
+        try:
+            codes[i] = decode(item.get("token"), event)
+        except InvalidTicketToken as e:
+            results[i] = ScanResult(INVALID, detail=str(e))
+
+    regs = {r.ticket_code: r for r in _registrations().filter(ticket_code__in=set(codes.values()))}
+    done = dict(
+        CheckIn.objects.filter(registration__in=[r.pk for r in regs.values()]).values_list("registration_id", "scanned_at")
+    )
+
+    new = {}
+    for i, code in codes.items():
+        reg = regs.get(code)
+        rejected = _check_registration(reg, code, event)
+        if rejected:
+            results[i] = rejected
+        elif reg.pk in done:
+            results[i] = ScanResult(DUPLICATE, code, reg.full_name, "Ingresso já usado.", done[reg.pk])
+        elif reg.pk in new:
+            # lido duas vezes no mesmo lote
+            results[i] = ScanResult(DUPLICATE, code, reg.full_name, "Ingresso já usado.", new[reg.pk][1].scanned_at)
+        else:
+            checkin = CheckIn(
+                registration=reg, event=event, source=CheckInSource.OFFLINE, device=device[:60],
+                scanned_by=user, scanned_at=_scanned_at(scans[i].get("scanned_at")),
+            )
+            new[reg.pk] = (i, checkin)
+            results[i] = ScanResult(OK, code, reg.full_name, checked_in_at=checkin.scanned_at)
+
+    if new:
+        try:
+            with transaction.atomic():
+                CheckIn.objects.bulk_create([c for _, c in new.values()])
+                CheckInCounter.increment(event.pk, len(new))
+        except IntegrityError:
+            for i, checkin in new.values():
+                results[i] = scan(
+                    scans[i].get("token"), event=event, device=device, user=user,
+                    scanned_at=checkin.scanned_at, source=CheckInSource.OFFLINE,
+                )
+
+    return results
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import CheckIn, CheckInCounter
+
+
+@receiver(post_delete, sender=CheckIn)
+def decrement_counter_on_delete(sender, instance, **kwargs):
+    # ex.: entrada anulada no admin
+    CheckInCounter.increment(instance.event_id, -1)
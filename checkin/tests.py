@@ -0,0 +1,153 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import City, Event, EventRegistration, EventType, PaymentStatus
+from events.tickets import InvalidTicketToken, OfflineValidator, build_snapshot, make_token
+
+from . import services
+from .models import CheckIn, CheckInCounter
+
+
+def make_event(title="Weekly Run") -> Event:
+    return Event.objects.create(
+        title=title,
+        city=City.MAPUTO,
+        event_type=EventType.WEEKLY,
+        start_at=timezone.now() + timedelta(hours=1),
+        meeting_point="Marginal",
+        price=Decimal("500.00"),
+    )
+
+
+def make_ticket(event, phone="841234567", **kwargs) -> EventRegistration:
+    kwargs.setdefault("payment_status", PaymentStatus.PAID)
+    return EventRegistration.objects.create(event=event, full_name="Ana Sitoe", phone=phone, **kwargs)
+
+
+class DecodeTests(TestCase):
+    def setUp(self):
+        self.event = make_event()
+        self.code = "RWB-3F9A1C7E"
+
+    def test_signed_token(self):
+        self.assertEqual(services.decode(make_token(self.code, self.event.pk), self.event), self.code)
+
+    def test_signed_token_of_another_event(self):
+        with self.assertRaises(InvalidTicketToken):
+            services.decode(make_token(self.code, self.event.pk + 1), self.event)
+
+    def test_tampered_signature(self):
+        token = make_token(self.code, self.event.pk)[:-2] + "AA"
+        with self.assertRaises(InvalidTicketToken):
+            services.decode(token, self.event)
+
+    def test_typed_code(self):
+        self.assertEqual(services.decode(" rwb-3f9a1c7e ", self.event), self.code)
+
+    def test_legacy_qr(self):
+        self.assertEqual(services.decode(f"RWB|{self.code}", self.event), self.code)
+
+    def test_garbage(self):
+        for token in ("", "hello", "RWB|hello", "RWB1:RWB-3F9A1C7E:x:y"):
+            with self.subTest(token=token), self.assertRaises(InvalidTicketToken):
+                services.decode(token, self.event)
+
+
+class ScanTests(TestCase):
+    def setUp(self):
+        self.event = make_event()
+        self.reg = make_ticket(self.event)
+
+    def test_scan_then_duplicate(self):
+        first = services.scan(make_token(self.reg.ticket_code, self.event.pk), event=self.event)
+        self.assertEqual((first.result, first.ticket_code), (services.OK, self.reg.ticket_code))
+
+        again = services.scan(f"RWB|{self.reg.ticket_code}", event=self.event)
+        self.assertEqual(again.result, services.DUPLICATE)
+        self.assertEqual(again.checked_in_at, first.checked_in_at)
+        self.assertEqual(CheckIn.objects.count(), 1)
+        self.assertEqual(CheckInCounter.total(self.event.pk), 1)
+
+    def test_legacy_qr_of_another_event(self):
+        other = make_ticket(make_event("Long Run"), phone="841111111")
+        result = services.scan(f"RWB|{other.ticket_code}", event=self.event)
+        self.assertEqual(result.result, services.WRONG_EVENT)
+
+    def test_unpaid_ticket(self):
+        unpaid = make_ticket(self.event, phone="841111111", payment_status=PaymentStatus.PENDING)
+        result = services.scan(unpaid.ticket_code, event=self.event)
+        self.assertEqual(result.result, services.UNKNOWN)
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_batch(self):
+        second = make_ticket(self.event, phone="841111111")
+        services.scan(second.ticket_code, event=self.event)
+        token = make_token(self.reg.ticket_code, self.event.pk)
+
+        results = services.scan_batch([
+            {"token": token, "scanned_at": "2026-01-10T06:00:00+02:00"},
+            {"token": f"RWB|{self.reg.ticket_code}"},
+            {"token": second.ticket_code},
+            {"token": "nope"},
+        ], event=self.event)
+
+        self.assertEqual(
+            [r.result for r in results],
+            [services.OK, services.DUPLICATE, services.DUPLICATE, services.INVALID],
+        )
+        self.assertEqual(results[1].checked_in_at, results[0].checked_in_at)
+        self.assertEqual(CheckIn.objects.count(), 2)
+        self.assertEqual(CheckInCounter.total(self.event.pk), 2)
+
+    def test_offline_validator_accepts_legacy_qr(self):
+        validator = OfflineValidator(build_snapshot(self.event))
+        self.assertEqual(validator.check(f"RWB|{self.reg.ticket_code}")[0], validator.OK)
+        self.assertEqual(validator.check(make_token(self.reg.ticket_code, self.event.pk))[0], validator.DUPLICATE)
+
+
+@override_settings(CHECKIN_API_KEY="scanner-key")
+class ScanApiTests(TestCase):
+    def setUp(self):
+        self.event = make_event()
+        self.reg = make_ticket(self.event)
+        self.url = reverse("checkin:scan", kwargs={"slug": self.event.slug})
+        self.batch_url = reverse("checkin:batch", kwargs={"slug": self.event.slug})
+
+    def post(self, data, key="scanner-key", url=None):
+        return self.client.post(
+            url or self.url, data, content_type="application/json", headers={"X-Checkin-Key": key}
+        )
+
+    def test_scan(self):
+        data = self.post({"token": make_token(self.reg.ticket_code, self.event.pk), "device": "gate-1"}).json()
+        self.assertTrue(data["ok"])
+        self.assertEqual(CheckIn.objects.get().device, "gate-1")
+
+    def test_requires_key(self):
+        self.assertEqual(self.post({"token": self.reg.ticket_code}, key="wrong").status_code, 403)
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_non_string_fields_are_rejected(self):
+        for data in ({"token": 123}, {"token": {"code": self.reg.ticket_code}}, {"token": "x", "device": ["gate"]}):
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["ok"])
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_batch_rejects_non_string_fields(self):
+        for scan in ({"token": 123}, {"token": self.reg.ticket_code, "scanned_at": 1767225600}):
+            with self.subTest(scan=scan):
+                response = self.post({"scans": [{"token": "nope"}, scan]}, url=self.batch_url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("scans[1]", response.json()["error"])
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_unreadable_scanned_at_uses_arrival_time(self):
+        scans = [{"token": self.reg.ticket_code, "scanned_at": "2026-13-30T06:00:00"}]
+        response = self.post({"scans": scans}, url=self.batch_url)
+        self.assertEqual(response.json()["accepted"], 1)
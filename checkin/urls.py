@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = "checkin"
+
+urlpatterns = [
+    path("<slug:slug>/scan/", views.scan, name="scan"),
+    path("<slug:slug>/batch/", views.scan_batch, name="batch"),
+    path("<slug:slug>/tally/", views.tally, name="tally"),
+]
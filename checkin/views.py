@@ -0,0 +1,126 @@
+import hmac
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core.metrics import query_budget
+from events.models import Event
+
+from . import services
+from .models import CheckInCounter
+
+# leituras por pedido no /batch/
+MAX_BATCH = 500
+
+
+def _api_key_ok(request) -> bool:
+    key = request.headers.get("X-Checkin-Key") or ""
+    return bool(settings.CHECKIN_API_KEY) and hmac.compare_digest(key, settings.CHECKIN_API_KEY)
+
+
+def checkin_api(view):
+    """
+    Autenticação dos scanners: header X-Checkin-Key (CHECKIN_API_KEY) ou sessão de staff.
+    Sem CSRF, por isso os POST têm de ser JSON (um formulário de outro site não o consegue enviar).
+    """
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _api_key_ok(request) and not (request.user.is_authenticated and request.user.is_staff):
+            return JsonResponse({"ok": False, "error": "Não autorizado."}, status=403)
+
+        if request.method == "POST":
+            if request.content_type != "application/json":
+                return JsonResponse({"ok": False, "error": "Content-Type tem de ser application/json."}, status=415)
+            try:
+                request.json = json.loads(request.body or b"{}")
+            except ValueError:
+                return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+            if not isinstance(request.json, dict):
+                return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _scanner(request):
+    user = request.user if request.user.is_authenticated else None
+    return (request.json.get("device") or "")[:60], user
+
+
+def _type_error(data: dict, fields=("device",)) -> str | None:
+    """Erro se algum dos campos vier com um tipo que não texto (ex.: número ou objeto)."""
+    for field in fields:
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            return f"{field} tem de ser texto."
+    return None
+
+
+def _bad_request(error: str):
+    return JsonResponse({"ok": False, "error": error}, status=400)
+
+
+@query_budget(8)
+@require_http_methods(["POST"])
+@checkin_api
+def scan(request, slug):
+    """POST {"token": "...", "device": "..."} -> resultado da leitura."""
+    error = _type_error(request.json, ("token", "device"))
+    if error:
+        return _bad_request(error)
+    event = get_object_or_404(Event, slug=slug)
+    device, user = _scanner(request)
+
+    result = services.scan(request.json.get("token") or "", event=event, device=device, user=user)
+    return JsonResponse({"ok": result.result == services.OK, **result.as_dict()})
+
+
+@query_budget(10)
+@require_http_methods(["POST"])
+@checkin_api
+def scan_batch(request, slug):
+    """POST {"device": "...", "scans": [{"token": "...", "scanned_at": "ISO 8601"}, ...]}"""
+    error = _type_error(request.json)
+    if error:
+        return _bad_request(error)
+    event = get_object_or_404(Event, slug=slug)
+    device, user = _scanner(request)
+
+    scans = request.json.get("scans")
+    if not isinstance(scans, list) or not all(isinstance(s, dict) for s in scans):
+        return _bad_request("scans tem de ser uma lista.")
+    if len(scans) > MAX_BATCH:
+        return _bad_request(f"Máximo de {MAX_BATCH} leituras por lote.")
+    for i, item in enumerate(scans):
+        error = _type_error(item, ("token", "scanned_at"))
+        if error:
+            return _bad_request(f"scans[{i}]: {error}")
+
+    results = services.scan_batch(scans, event=event, device=device, user=user)
+    return JsonResponse({
+        "ok": True,
+        "accepted": sum(r.result == services.OK for r in results),
+        "results": [r.as_dict() for r in results],
+    })
+
+
+@query_budget(4)
+@require_http_methods(["GET"])
+@checkin_api
+def tally(request, slug):
+    """Entradas do evento (contador mantido, sem COUNT(*) aos check-ins)."""
+    event = get_object_or_404(Event.objects.only("id", "slug", "capacity", "seats_taken"), slug=slug)
+    response = JsonResponse({
+        "event": event.slug,
+        "checked_in": CheckInCounter.total(event.pk),
+        "seats_taken": event.seats_taken,
+        "capacity": event.capacity,
+    })
+    response["Cache-Control"] = "no-store"
+    return response
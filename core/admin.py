@@ -1,3 +1,48 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
-# Register your models here.
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Filtro por FK com o autocomplete do admin (select2) em vez da lista de todos os
+    objetos relacionados, que carrega a tabela inteira em cada changelist.
+    O admin do modelo relacionado precisa de search_fields, e o ModelAdmin que usa
+    o filtro junta AutocompleteFilter.media ao seu (ver AutocompleteFilterMixin).
+
+    Uso: list_filter = (("event", AutocompleteFilter),)
+    """
+    template = "admin/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        # as opções vêm do autocomplete, à medida que se escreve
+        return []
+
+    def has_output(self):
+        return True
+
+    def widget(self):
+        # via formfield: o widget precisa das choices (lazy) de um ModelChoiceField;
+        # só o objeto selecionado é lido da BD
+        value = self.lookup_val[-1] if self.lookup_val else None
+        form_field = self.field.formfield(widget=AutocompleteSelect(self.field, self.admin_site), required=False)
+        return form_field.widget.render(self.lookup_kwarg, value)
+
+    @classmethod
+    def media(cls, field, admin_site):
+        return AutocompleteSelect(field, admin_site).media
+
+
+class AutocompleteFilterMixin:
+    """Junta o JS/CSS do select2 ao changelist dos ModelAdmin com AutocompleteFilter."""
+
+    @property
+    def media(self):
+        media = super().media
+        for spec in self.list_filter:
+            if isinstance(spec, tuple) and issubclass(spec[1], AutocompleteFilter):
+                media += spec[1].media(self.model._meta.get_field(spec[0]), self.admin_site)
+        return media
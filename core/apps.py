@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .metrics import install_db_wrapper
+
+        connection_created.connect(install_db_wrapper, dispatch_uid="core.metrics.db_wrapper")
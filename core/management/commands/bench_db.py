@@ -0,0 +1,225 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from core.management.commands.loadtest import percentile
+from events import schedule
+from events.models import City, Event, EventRegistration, EventType
+
+PROFILES = ("sqlite-legacy", "sqlite", "postgres")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os perfis de base de dados (DB_PROFILE) com inscrições concorrentes: "
+        "vários processos (como os workers do uvicorn/gunicorn) com vários utilizadores concorrentes, "
+        "mais leitores da agenda. Em --server asgi (o deploy do Procfile) cada pedido corre num thread "
+        "novo com CONN_MAX_AGE=0, como as views síncronas em ASGI; --server wsgi mantém um thread "
+        "(e uma ligação persistente) por worker. "
+        "As bases SQLite são temporárias; o perfil postgres usa DATABASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+        parser.add_argument("--processes", type=int, default=3)
+        parser.add_argument("--server", choices=("asgi", "wsgi"), default="asgi")
+        parser.add_argument("--threads", type=int, default=2, help="Utilizadores a inscrever-se, por processo.")
+        parser.add_argument("--readers", type=int, default=1, help="Threads a ler a agenda, por processo.")
+        parser.add_argument("--registrations", type=int, default=100, help="Inscrições por thread.")
+        parser.add_argument("--json", action="store_true", help="Resultados em JSON.")
+        # uso interno: os processos filhos
+        parser.add_argument("--setup", action="store_true", help="(interno) cria o evento do benchmark.")
+        parser.add_argument("--teardown", type=int, metavar="EVENT_ID", help="(interno) apaga o evento.")
+        parser.add_argument("--worker", type=int, metavar="EVENT_ID", help="(interno) corre a carga.")
+        parser.add_argument("--start-at", type=float, help="(interno) instante de arranque comum.")
+
+    def handle(self, *args, **opts):
+        if opts["setup"]:
+            return self._setup()
+        if opts["teardown"]:
+            EventRegistration.objects.filter(event_id=opts["teardown"]).delete()
+            Event.objects.filter(pk=opts["teardown"]).delete()
+            return
+        if opts["worker"]:
+            return self._worker(opts)
+
+        results = []
+        for profile in opts["profiles"]:
+            if profile == "postgres" and not settings.DATABASE_URL:
+                self.stderr.write("postgres: sem DATABASE_URL, perfil saltado.")
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                results.append(self._run_profile(profile, tmp, opts))
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'perfil':<15}{'inscrições':>11}{'insc/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'erros':>7}{'leituras/s':>12}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['profile']:<15}{r['ok']:>11}{r['per_s']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                f"{r['p99_ms']:>9}{r['errors']:>7}{r['reads_per_s']:>12}"
+            )
+        self.stdout.write(
+            f"{opts['processes']} processo(s) x {opts['threads']} thread(s) x {opts['registrations']} inscrições, "
+            f"{opts['readers']} leitor(es) por processo, {opts['server']}."
+        )
+
+    # --- processo principal ---
+
+    def _manage(self, profile: str, tmp: str, *args: str, server: str = "wsgi", **kwargs):
+        env = {**os.environ, "DB_PROFILE": profile, "SQLITE_PATH": os.path.join(tmp, "bench.sqlite3")}
+        if server == "asgi":
+            # a mesma omissão do runwithbroto/asgi.py
+            env.setdefault("DB_CONN_MAX_AGE", "0")
+        cmd = [sys.executable, str(settings.BASE_DIR / "manage.py"), *args, "--skip-checks"]
+        return subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True, **kwargs)
+
+    def _call(self, profile: str, tmp: str, *args: str) -> str:
+        proc = self._manage(profile, tmp, *args)
+        out, _ = proc.communicate()
+        if proc.returncode:
+            raise CommandError(f"{profile}: '{' '.join(args)}' falhou (código {proc.returncode}).")
+        return out
+
+    def _run_profile(self, profile: str, tmp: str, opts) -> dict:
+        self._call(profile, tmp, "migrate", "--noinput", "-v", "0")
+        event_id = self._call(profile, tmp, "bench_db", "--setup").strip()
+
+        # todos os processos começam ao mesmo tempo, depois do arranque do Django
+        start_at = time.time() + 3
+        procs = [
+            self._manage(
+                profile, tmp, "bench_db", "--worker", event_id, "--start-at", str(start_at),
+                "--threads", str(opts["threads"]), "--readers", str(opts["readers"]),
+                "--registrations", str(opts["registrations"]), "--server", opts["server"],
+                server=opts["server"],
+            )
+            for _ in range(max(1, opts["processes"]))
+        ]
+        outputs = [json.loads(p.communicate()[0]) for p in procs]
+
+        if profile == "postgres":
+            self._call(profile, tmp, "bench_db", "--teardown", event_id)
+
+        latencies = [ms for o in outputs for ms in o["latencies"]]
+        elapsed = max(o["ended"] for o in outputs) - start_at
+        reads = sum(o["reads"] for o in outputs)
+        return {
+            "profile": profile,
+            "ok": len(latencies),
+            "errors": sum(o["errors"] for o in outputs),
+            "seconds": round(elapsed, 2),
+            "per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0,
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "reads_per_s": round(reads / elapsed, 1) if elapsed > 0 else 0,
+        }
+
+    # --- processos filhos ---
+
+    def _setup(self):
+        event = Event.objects.create(
+            title="Bench DB",
+            city=City.MAPUTO,
+            event_type=EventType.WEEKLY,
+            start_at=timezone.now() + timedelta(days=30),
+            meeting_point="Bench",
+            capacity=10**9,
+        )
+        self.stdout.write(str(event.pk))
+
+    def _worker(self, opts):
+        event_id = opts["worker"]
+        lock = threading.Lock()
+        latencies, errors, reads = [], [0], [0]
+        writing = threading.Event()
+        writing.set()
+
+        def handle_request(fn):
+            # como um pedido do Django: close_old_connections no início e no fim
+            # (fecha a ligação se CONN_MAX_AGE=0, reaproveita-a se for persistente)
+            close_old_connections()
+            try:
+                return fn()
+            finally:
+                close_old_connections()
+
+        def request(fn):
+            if opts["server"] == "wsgi":
+                return handle_request(fn)
+            # ASGI: a view síncrona corre num thread novo, que leva a ligação consigo
+            outcome = {}
+
+            def run():
+                try:
+                    outcome["value"] = handle_request(fn)
+                except BaseException as exc:
+                    outcome["error"] = exc
+                finally:
+                    connection.close()
+
+            th = threading.Thread(target=run)
+            th.start()
+            th.join()
+            if "error" in outcome:
+                raise outcome["error"]
+            return outcome.get("value")
+
+        def register(t: int, i: int):
+            # como a view register: lê o evento e cria a inscrição
+            event = Event.objects.get(pk=event_id)
+            EventRegistration(event=event, full_name=f"Bench {os.getpid()}-{t}-{i}", phone=f"84{t:02d}{i:05d}").save()
+
+        def writer(t: int):
+            for i in range(opts["registrations"]):
+                started = time.perf_counter()
+                try:
+                    request(lambda: register(t, i))
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            connection.close()
+
+        def reader():
+            while writing.is_set():
+                try:
+                    request(lambda: list(schedule.upcoming_events()[:20]))
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    reads[0] += 1
+            connection.close()
+
+        time.sleep(max(0.0, opts["start_at"] - time.time()))
+        writers = [threading.Thread(target=writer, args=(t,)) for t in range(opts["threads"])]
+        readers = [threading.Thread(target=reader) for _ in range(opts["readers"])]
+        for th in writers + readers:
+            th.start()
+        for th in writers:
+            th.join()
+        ended = time.time()
+        writing.clear()
+        for th in readers:
+            th.join()
+
+        self.stdout.write(json.dumps({"latencies": latencies, "errors": errors[0], "reads": reads[0], "ended": ended}))
@@ -0,0 +1,311 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urljoin
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import City, Event, EventRegistration, EventType, RegistrationStatus
+from payments.fake_paysuite import FakePaySuite
+from payments.models import Payment, PaymentStatus
+
+DB_TIMING = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+STEPS = [
+    "event_list",
+    "register_form",
+    "register",
+    "start_event_payment",
+    "checkout",
+    "payment_status",
+    "registration_success",
+    "order_ticket_pdf",
+]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # step -> [(ms, queries|None, ok)]
+        self.outcomes = defaultdict(int)
+        self.confirm_ms = []
+
+    def add(self, step: str, ms: float, queries, ok: bool):
+        with self.lock:
+            self.samples[step].append((ms, queries, ok))
+
+    def outcome(self, name: str):
+        with self.lock:
+            self.outcomes[name] += 1
+
+
+class Flow:
+    """Um utilizador: agenda -> inscrição -> pagamento -> confirmação -> ingresso."""
+
+    def __init__(self, base_url: str, event_slug: str, rec: Recorder, phone: str, confirm_timeout: float):
+        self.base = base_url.rstrip("/") + "/"
+        self.slug = event_slug
+        self.rec = rec
+        self.phone = phone
+        self.confirm_timeout = confirm_timeout
+        self.s = requests.Session()
+
+    def url(self, path: str) -> str:
+        return urljoin(self.base, path.lstrip("/"))
+
+    def step(self, name: str, method: str, url: str, ok=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            r = self.s.request(method, url, allow_redirects=False, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.rec.add(name, (time.perf_counter() - started) * 1000, None, False)
+            return None
+        ms = (time.perf_counter() - started) * 1000
+        m = DB_TIMING.search(r.headers.get("Server-Timing", ""))
+        self.rec.add(name, ms, int(m.group(1)) if m else None, r.status_code in ok)
+        return r
+
+    def run(self):
+        if not self.step("event_list", "GET", self.url(reverse("events:event_list"))):
+            return self.rec.outcome("error")
+
+        if not self.step("register_form", "GET", self.url(reverse("events:register_form", args=[self.slug]))):
+            return self.rec.outcome("error")
+
+        r = self.step(
+            "register", "POST", self.url(reverse("events:register", args=[self.slug])),
+            ok=(302,),
+            data={
+                "full_name": f"Loadtest {self.phone}",
+                "phone": self.phone,
+                "payment": "mpesa",
+                "csrfmiddlewaretoken": self.s.cookies.get("csrftoken", ""),
+            },
+            headers={"Referer": self.base},
+        )
+        location = r.headers.get("Location", "") if r is not None else ""
+        if r is None or r.status_code != 302:
+            return self.rec.outcome("error")
+        if "/success/" in location:
+            return self.finish(location.rstrip("/").split("/")[-2])
+        if reverse("payments:start_event_payment") not in location:
+            return self.rec.outcome("sold_out")
+
+        r = self.step("start_event_payment", "GET", self.url(location), ok=(302,))
+        checkout_url = r.headers.get("Location", "") if r is not None else ""
+        if not checkout_url.startswith("http"):
+            return self.rec.outcome("payment_error")
+
+        paid_clicked = time.perf_counter()
+        r = self.step("checkout", "GET", checkout_url, ok=(302,))
+        return_url = r.headers.get("Location", "") if r is not None else ""
+        ref = return_url.split("ref=")[-1] if "ref=" in return_url else ""
+        if not ref:
+            return self.rec.outcome("payment_error")
+
+        # o que a página de retorno faz: polling ao estado (webhook ou consulta à PaySuite)
+        deadline = paid_clicked + self.confirm_timeout
+        while time.perf_counter() < deadline:
+            r = self.step("payment_status", "GET", self.url(reverse("payments:status")), params={"ref": ref})
+            data = r.json() if r is not None and r.status_code == 200 else {}
+            if data.get("state") == "paid":
+                with self.rec.lock:
+                    self.rec.confirm_ms.append((time.perf_counter() - paid_clicked) * 1000)
+                return self.finish(data["ticket_code"])
+            if data.get("state") == "failed":
+                return self.rec.outcome("payment_failed")
+            time.sleep(0.5)
+        return self.rec.outcome("confirm_timeout")
+
+    def finish(self, ticket_code: str):
+        self.step("registration_success", "GET", self.url(reverse("events:registration_success", args=[ticket_code])))
+        r = self.step("order_ticket_pdf", "GET", self.url(reverse("events:order_ticket_pdf", args=[ticket_code])))
+        self.rec.outcome("completed" if r is not None and r.status_code == 200 else "error")
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do fluxo completo (agenda, inscrição, pagamento, webhook, sucesso, PDF) "
+        "contra um servidor já a correr, com uma PaySuite falsa local. O servidor tem de usar "
+        "PAYSUITE_API_BASE=http://<fake-host>:<fake-port>/api/v1, o mesmo PAYSUITE_WEBHOOK_SECRET "
+        "e a mesma base de dados (para contar oversell)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=100, help="Nº de fluxos (utilizadores).")
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--event", help="Slug do evento a usar.")
+        parser.add_argument("--capacity", type=int, default=50, help="Capacidade do evento criado (sem --event).")
+        parser.add_argument("--price", type=Decimal, default=Decimal("500.00"), help="Preço do evento criado (0 = grátis).")
+        parser.add_argument("--confirm-timeout", type=float, default=30, help="Segundos à espera do pagamento confirmado.")
+        parser.add_argument("--seed", type=int, default=None, help="Semente para latências/falhas reprodutíveis.")
+        parser.add_argument("--json", dest="json_path", help="Grava o relatório em JSON neste ficheiro.")
+
+        parser.add_argument("--no-fake", action="store_true", help="Não arranca a PaySuite falsa (já está a correr).")
+        parser.add_argument("--fake-host", default="127.0.0.1")
+        parser.add_argument("--fake-port", type=int, default=8765)
+        parser.add_argument("--latency-ms", type=float, default=150)
+        parser.add_argument("--failure-rate", type=float, default=0.0)
+        parser.add_argument("--webhook-delay-ms", type=float, default=300)
+
+    def handle(self, *args, **opts):
+        if opts["seed"] is not None:
+            random.seed(opts["seed"])
+
+        event = self._event(opts)
+        self.stdout.write(f"Evento: {event.slug} (capacidade {event.capacity}, preço {event.price})")
+
+        fake = None
+        if not opts["no_fake"]:
+            fake = FakePaySuite(
+                host=opts["fake_host"],
+                port=opts["fake_port"],
+                secret=settings.PAYSUITE_WEBHOOK_SECRET or "",
+                latency_ms=opts["latency_ms"],
+                failure_rate=opts["failure_rate"],
+                webhook_delay_ms=opts["webhook_delay_ms"],
+            ).start()
+            self.stdout.write(f"PaySuite falsa em {fake.api_base}")
+
+        rec = Recorder()
+        # telefones únicos por execução (o register reaproveita inscrições recentes do mesmo telefone)
+        phone_base = random.randrange(10**6) * 1000
+        flows = [
+            Flow(opts["base_url"], event.slug, rec, f"84{(phone_base + i) % 10**7:07d}", opts["confirm_timeout"])
+            for i in range(opts["users"])
+        ]
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+                for future in [pool.submit(flow.run) for flow in flows]:
+                    future.result()
+        finally:
+            wall = time.perf_counter() - started
+            if fake:
+                # deixa chegar os webhooks ainda agendados
+                time.sleep(opts["webhook_delay_ms"] / 1000 + 1)
+                fake.stop()
+
+        report = self._report(rec, event, wall, opts, fake)
+        self._print(report)
+        if opts["json_path"]:
+            with open(opts["json_path"], "w") as f:
+                json.dump(report, f, indent=2, default=str)
+
+        if report["oversell"]:
+            raise CommandError(f"OVERSELL: {report['oversell']} inscrição(ões) acima da capacidade.")
+
+    def _event(self, opts) -> Event:
+        if opts["event"]:
+            event = Event.objects.filter(slug=opts["event"]).first()
+            if not event:
+                raise CommandError(f"Evento '{opts['event']}' não encontrado.")
+            return event
+
+        return Event.objects.create(
+            title=f"Loadtest {timezone.localtime():%Y-%m-%d %H:%M:%S}",
+            city=City.MAPUTO,
+            event_type=EventType.WEEKLY,
+            start_at=timezone.now() + timedelta(days=7),
+            meeting_point="Loadtest",
+            price=opts["price"],
+            capacity=opts["capacity"],
+        )
+
+    def _report(self, rec: Recorder, event: Event, wall: float, opts, fake) -> dict:
+        steps = {}
+        total_requests = 0
+        for name in STEPS + sorted(set(rec.samples) - set(STEPS)):
+            samples = rec.samples.get(name)
+            if not samples:
+                continue
+            ms = [s[0] for s in samples]
+            queries = [s[1] for s in samples if s[1] is not None]
+            total_requests += len(samples)
+            steps[name] = {
+                "n": len(samples),
+                "errors": sum(1 for s in samples if not s[2]),
+                "p50_ms": round(percentile(ms, 50), 1),
+                "p95_ms": round(percentile(ms, 95), 1),
+                "p99_ms": round(percentile(ms, 99), 1),
+                "max_ms": round(max(ms), 1),
+                "queries_avg": round(sum(queries) / len(queries), 1) if queries else None,
+                "queries_max": max(queries) if queries else None,
+            }
+
+        event.refresh_from_db()
+        active = EventRegistration.objects.filter(event=event).exclude(status=RegistrationStatus.CANCELLED).count()
+        paid = Payment.objects.filter(registration__event=event, status=PaymentStatus.PAID).count()
+
+        report = {
+            "options": {k: opts[k] for k in ("base_url", "users", "concurrency", "latency_ms", "failure_rate", "seed")},
+            "event": event.slug,
+            "capacity": event.capacity,
+            "wall_s": round(wall, 2),
+            "flows_per_s": round(rec.outcomes.get("completed", 0) / wall, 2) if wall else 0,
+            "requests_per_s": round(total_requests / wall, 2) if wall else 0,
+            "outcomes": dict(rec.outcomes),
+            "steps": steps,
+            "confirm_ms": {
+                "p50": round(percentile(rec.confirm_ms, 50), 1),
+                "p95": round(percentile(rec.confirm_ms, 95), 1),
+                "p99": round(percentile(rec.confirm_ms, 99), 1),
+            },
+            "registrations_active": active,
+            "payments_paid": paid,
+            "seats_taken": event.seats_taken,
+            "seats_drift": event.seats_taken - active,
+            "oversell": max(0, active - event.capacity),
+        }
+        if fake:
+            report["paysuite"] = dict(fake.stats)
+            report["webhook_ms"] = {
+                "p50": round(percentile(fake.webhook_ms, 50), 1),
+                "p95": round(percentile(fake.webhook_ms, 95), 1),
+                "p99": round(percentile(fake.webhook_ms, 99), 1),
+            }
+        return report
+
+    def _print(self, report: dict):
+        w = self.stdout.write
+        w("")
+        w(f"{'passo':<22}{'n':>6}{'erros':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'q/avg':>7}{'q/max':>7}")
+        for name, s in report["steps"].items():
+            w(
+                f"{name:<22}{s['n']:>6}{s['errors']:>7}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}"
+                f"{s['max_ms']:>9}{s['queries_avg'] if s['queries_avg'] is not None else '-':>7}"
+                f"{s['queries_max'] if s['queries_max'] is not None else '-':>7}"
+            )
+        w("")
+        w(f"duração: {report['wall_s']}s  fluxos/s: {report['flows_per_s']}  pedidos/s: {report['requests_per_s']}")
+        w(f"resultados: {report['outcomes']}")
+        w(f"confirmação do pagamento (ms): {report['confirm_ms']}")
+        if "paysuite" in report:
+            w(f"paysuite falsa: {report['paysuite']}  webhook (ms): {report['webhook_ms']}")
+        w(
+            f"inscrições ativas: {report['registrations_active']}/{report['capacity']}  "
+            f"pagas: {report['payments_paid']}  seats_taken: {report['seats_taken']} "
+            f"(drift {report['seats_drift']})"
+        )
+        style = self.style.ERROR if report["oversell"] else self.style.SUCCESS
+        w(style(f"oversell: {report['oversell']}"))
@@ -0,0 +1,102 @@
+"""
+Métricas por pedido: queries SQL, chamadas à PaySuite, render de templates e de PDFs.
+
+O RequestMetricsMiddleware abre um RequestMetrics por pedido; o código instrumentado
+usa `timed("nome")` (não faz nada fora de um pedido, ex.: management commands).
+O RequestMetrics atual vive numa ContextVar, que o asgiref copia para os threads das
+views sync em ASGI, por isso as queries são contadas por um execute_wrapper instalado
+em todas as ligações (db_wrapper), e não só no thread do middleware.
+"""
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Uma view fez mais queries do que o orçamento declarado (só com QUERY_BUDGET_STRICT)."""
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_ms = 0.0
+        # nome -> [nº de chamadas, ms]
+        self.timings = defaultdict(lambda: [0, 0.0])
+
+    def add(self, name: str, ms: float):
+        entry = self.timings[name]
+        entry[0] += 1
+        entry[1] += ms
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f'db;dur={self.db_ms:.1f};desc="{self.db_queries} queries"']
+        for name, (count, ms) in sorted(self.timings.items()):
+            parts.append(f'{name};dur={ms:.1f};desc="{count}x"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> dict:
+        data = {"db_queries": self.db_queries, "db_ms": round(self.db_ms, 1)}
+        for name, (count, ms) in self.timings.items():
+            data[f"{name}_calls"] = count
+            data[f"{name}_ms"] = round(ms, 1)
+        return data
+
+
+def db_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.db_wrapper(execute, sql, params, many, context)
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """Receiver de connection_created (ver CoreConfig.ready)."""
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def current() -> RequestMetrics | None:
+    return _current.get()
+
+
+def activate(metrics: RequestMetrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(name: str):
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+def query_budget(max_queries: int):
+    """
+    Declara o máximo de queries SQL de uma view (verificado pelo RequestMetricsMiddleware).
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
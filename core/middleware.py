@@ -0,0 +1,90 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import QueryBudgetExceeded, RequestMetrics, activate, deactivate
+
+logger = logging.getLogger("runwithbroto.metrics")
+
+
+class RequestMetricsMiddleware:
+    """
+    Mede cada pedido (queries, PaySuite, templates, PDFs), escreve uma linha de log
+    estruturada e devolve o resumo no header Server-Timing.
+
+    Orçamentos de queries: @query_budget(n) na view ou settings.QUERY_BUDGETS
+    (por nome de URL, ex.: views do admin). Com QUERY_BUDGET_STRICT o pedido falha.
+
+    Sync e async: em ASGI as views async (ex.: payments:stream) não passam por um
+    thread por causa deste middleware. As queries contam em qualquer thread (ver
+    core.metrics.db_wrapper). Nas respostas em streaming mede até aos headers: o
+    corpo segue para o cliente sem ficar à espera do log.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            deactivate(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            deactivate(token)
+        return self._finish(request, response, metrics, started)
+
+    def _finish(self, request, response, metrics: RequestMetrics, started: float):
+        total_ms = (time.perf_counter() - started) * 1000
+        response["Server-Timing"] = metrics.server_timing(total_ms)
+
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else ""
+        if settings.REQUEST_METRICS_LOG:
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "view": view_name,
+                "status": response.status_code,
+                "ms": round(total_ms, 1),
+                **({"streaming": True} if response.streaming else {}),
+                **metrics.as_dict(),
+            }))
+
+        budget = self._budget(match)
+        if budget is not None and metrics.db_queries > budget:
+            msg = f"{view_name or request.path}: {metrics.db_queries} queries (orçamento {budget})"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(msg)
+            logger.warning("Query budget exceeded: %s", msg)
+
+        return response
+
+    @staticmethod
+    def _budget(match) -> int | None:
+        # lido do resolver_match (sem process_view: em ASGI seria um salto para um thread)
+        if match is None:
+            return None
+        if match.view_name in settings.QUERY_BUDGETS:
+            return settings.QUERY_BUDGETS[match.view_name]
+        return getattr(match.func, "query_budget", None)
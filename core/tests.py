@@ -1,3 +1,68 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import City, Event
+from events.schedule import get_schedule
+
+from .metrics import QueryBudgetExceeded, RequestMetrics
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "core-tests"}}
+
+
+def chatty_schedule(*args):
+    """get_schedule com uma query a mais (a agenda fria já gasta as 2 do orçamento)."""
+    Event.objects.count()
+    return get_schedule(*args)
+
+
+@override_settings(CACHES=LOCMEM)
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("events:event_list")
+        Event.objects.create(
+            title="Sunrise 10K", city=City.MAPUTO, start_at=timezone.now() + timedelta(days=3), meeting_point="Marginal",
+        )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_fails_the_request(self):
+        # dentro do @query_budget(2) do event_list
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        cache.clear()
+        with mock.patch("events.views.schedule.get_schedule", side_effect=chatty_schedule):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "events:event_list: 3 queries (orçamento 2)"):
+                self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_only_warns_by_default(self):
+        with mock.patch("events.views.schedule.get_schedule", side_effect=chatty_schedule):
+            with self.assertLogs("runwithbroto.metrics", "WARNING") as logs:
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("events:event_list: 3 queries", logs.output[-1])
+
+    def test_server_timing_header(self):
+        cold = self.client.get(self.url)["Server-Timing"]
+        self.assertTrue(cold.startswith('db;dur='), cold)
+        self.assertIn('desc="2 queries"', cold)
+        self.assertIn("total;dur=", cold)
+
+        # cache quente: sem queries
+        self.assertIn('desc="0 queries"', self.client.get(self.url)["Server-Timing"])
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def test_server_timing_lists_timed_sections(self):
+        metrics = RequestMetrics()
+        metrics.add("paysuite", 12.34)
+        metrics.add("paysuite", 1.0)
+        self.assertEqual(
+            metrics.server_timing(20),
+            'db;dur=0.0;desc="0 queries", paysuite;dur=13.3;desc="2x", total;dur=20.0',
+        )
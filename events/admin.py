@@ -1,25 +1,148 @@
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin, messages
+from django.db.models import Count, Q, Sum
+from django.http import FileResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils.html import format_html
-from .models import Event, EventRegistration, RegistrationStatus
+
+from core.admin import AutocompleteFilter, AutocompleteFilterMixin
+from .models import (
+    Event, EventRegistration, EventSeries, PaymentStatus, RegistrationStatus, RenderStatus, TicketRenderJob,
+    paid_registrations,
+)
+from .exports import iter_registrations_csv
+from .pdfs import iter_tickets_zip, write_tickets_pdf
+from .recurrence import materialize_series
+
+
+def registrations_csv_response(registrations):
+    resp = StreamingHttpResponse(iter_registrations_csv(registrations), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = 'attachment; filename="inscricoes.csv"'
+    return resp
 
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ("title", "city", "event_type", "start_at", "is_published")
+    list_display = (
+        "title", "city", "event_type", "start_at", "is_published",
+        "paid_count", "pending_count", "cancelled_count", "revenue",
+    )
     list_filter = ("city", "event_type", "is_published")
     search_fields = ("title", "meeting_point")
     prepopulated_fields = {"slug": ("title",)}
     ordering = ("start_at",)
+    actions = ("export_tickets_pdf", "export_tickets_zip", "export_registrations_csv")
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        # só na listagem: o autocomplete dos filtros, as ações (POST) e o change view
+        # também passam por aqui e não precisam do GROUP BY sobre as inscrições
+        match = request.resolver_match
+        changelist = f"{self.opts.app_label}_{self.opts.model_name}_changelist"
+        if request.method != "GET" or match is None or match.url_name != changelist:
+            return qs
+
+        # contagens e receita de todos os eventos da página no mesmo SELECT (GROUP BY);
+        # a receita soma os pagamentos das inscrições contadas em "Pagos"
+        active = Q(registrations__status=RegistrationStatus.ACTIVE)
+        paid = active & Q(registrations__payment_status=PaymentStatus.PAID)
+        # inscrições criadas à espera de pagamento ficam UNPAID (o PENDING não é usado hoje)
+        unpaid = [PaymentStatus.UNPAID, PaymentStatus.PENDING]
+        return qs.annotate(
+            paid_count=Count("registrations", filter=paid),
+            pending_count=Count("registrations", filter=active & Q(registrations__payment_status__in=unpaid)),
+            cancelled_count=Count("registrations", filter=Q(registrations__status=RegistrationStatus.CANCELLED)),
+            revenue=Sum("registrations__payment__amount", filter=paid),
+        )
+
+    @admin.display(description="Pagos", ordering="paid_count")
+    def paid_count(self, obj):
+        return obj.paid_count
+
+    @admin.display(description="Pendentes", ordering="pending_count")
+    def pending_count(self, obj):
+        return obj.pending_count
+
+    @admin.display(description="Cancelados", ordering="cancelled_count")
+    def cancelled_count(self, obj):
+        return obj.cancelled_count
+
+    @admin.display(description="Receita (MZN)", ordering="revenue")
+    def revenue(self, obj):
+        return obj.revenue or 0
+
+    @admin.action(description="Exportar tickets pagos (PDF único)")
+    def export_tickets_pdf(self, request, queryset):
+        regs = paid_registrations(queryset)
+        total = regs.count()
+        if not total:
+            self.message_user(request, "Nenhum ticket pago nos eventos selecionados.", messages.WARNING)
+            return None
+        if total > settings.TICKETS_PDF_MAX:
+            # o ReportLab mantém as páginas em memória até ao save() e tudo corre neste pedido
+            self.message_user(
+                request,
+                f"{total} tickets é demais para um só PDF (máximo {settings.TICKETS_PDF_MAX}). "
+                "Use a exportação em ZIP (reaproveita os PDFs do render_tickets) "
+                "ou o comando export_tickets, fora do pedido.",
+                messages.WARNING,
+            )
+            return None
+
+        # o PDF fica em memória até ao save() (daí o limite acima); o ficheiro final vai
+        # para disco e é servido em streaming, sem uma segunda cópia na resposta
+        tmp = tempfile.TemporaryFile()
+        write_tickets_pdf(regs.iterator(chunk_size=500), tmp)
+        tmp.seek(0)
+        return FileResponse(tmp, as_attachment=True, filename="tickets.pdf", content_type="application/pdf")
+
+    @admin.action(description="Exportar tickets pagos (ZIP, um PDF por ticket)")
+    def export_tickets_zip(self, request, queryset):
+        regs = paid_registrations(queryset)
+        if not regs.exists():
+            self.message_user(request, "Nenhum ticket pago nos eventos selecionados.", messages.WARNING)
+            return None
+
+        resp = StreamingHttpResponse(iter_tickets_zip(regs.iterator(chunk_size=500)), content_type="application/zip")
+        resp["Content-Disposition"] = 'attachment; filename="tickets.zip"'
+        return resp
+
+    @admin.action(description="Exportar inscrições (CSV)")
+    def export_registrations_csv(self, request, queryset):
+        return registrations_csv_response(EventRegistration.objects.filter(event__in=queryset))
+
+
+@admin.register(EventSeries)
+class EventSeriesAdmin(admin.ModelAdmin):
+    list_display = ("title", "city", "event_type", "first_start_at", "every_weeks", "ends_on", "materialized_until", "is_active")
+    list_filter = ("city", "event_type", "is_active")
+    search_fields = ("title", "meeting_point")
+    readonly_fields = ("materialized_until",)
+    actions = ("materialize",)
+
+    @admin.action(description="Criar já os eventos das próximas semanas")
+    def materialize(self, request, queryset):
+        horizon = timedelta(weeks=settings.SERIES_HORIZON_WEEKS)
+        n = sum(materialize_series(series, horizon) for series in queryset.filter(is_active=True))
+        self.message_user(request, f"{n} evento(s) criado(s).", messages.SUCCESS)
 
 
 @admin.register(EventRegistration)
-class EventRegistrationAdmin(admin.ModelAdmin):
-    list_display = ("ticket_code", "full_name", "phone", "event", "created_at", "ticket_link")
-    list_filter = ("event", "payment_status", "status")
-    search_fields = ("full_name", "email", "phone", "ticket_code")
+class EventRegistrationAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ("ticket_code", "full_name", "phone", "event", "payment_state", "created_at", "ticket_link")
+    list_filter = (("event", AutocompleteFilter), "payment_status", "status", "needs_refund")
+    list_select_related = ("event", "payment")
+    search_fields = ("full_name", "phone", "ticket_code")
     readonly_fields = ("created_at", "updated_at")
     ordering = ("-created_at",)
+    actions = ("export_csv",)
+
+    @admin.action(description="Exportar selecionadas (CSV)")
+    def export_csv(self, request, queryset):
+        return registrations_csv_response(queryset)
 
     def ticket_link(self, obj: EventRegistration):
         """
@@ -38,3 +161,28 @@ class EventRegistrationAdmin(admin.ModelAdmin):
         )
 
     ticket_link.short_description = "Ticket"
+
+    @admin.display(description="Pagamento", ordering="payment__status")
+    def payment_state(self, obj: EventRegistration):
+        # vem no mesmo SELECT (list_select_related); inscrições free não têm Payment
+        payment = getattr(obj, "payment", None)
+        if payment is None:
+            return "-"
+        return f"{payment.get_status_display()} • {payment.reference}"
+
+
+@admin.register(TicketRenderJob)
+class TicketRenderJobAdmin(admin.ModelAdmin):
+    list_display = ("registration", "status", "attempts", "next_attempt_at", "render_ms", "created_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("registration__ticket_code",)
+    list_select_related = ("registration",)
+    readonly_fields = (
+        "registration", "attempts", "error", "pdf_name", "next_attempt_at", "render_ms", "created_at", "updated_at",
+    )
+    actions = ("requeue",)
+
+    @admin.action(description="Voltar a pôr na fila")
+    def requeue(self, request, queryset):
+        n = queryset.update(status=RenderStatus.PENDING, attempts=0, next_attempt_at=None)
+        self.message_user(request, f"{n} ingresso(s) na fila para o render_tickets.")
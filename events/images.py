@@ -0,0 +1,88 @@
+"""
+Variantes reduzidas do poster dos eventos (Pillow).
+
+- "pdf": JPEG do tamanho do slot do poster no ticket (20x35 mm a ~300 dpi)
+- "jpeg"/"webp": larguras para srcset nas páginas do evento
+"""
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+POSTER_WIDTHS = (240, 480, 960)
+PDF_SLOT_PX = (240, 420)
+
+DERIVED_DIR = "events/posters/derived"
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        bg = Image.new("RGB", img.size, "white")
+        bg.paste(img, mask=img.getchannel("A"))
+        return bg
+    return img.convert("RGB")
+
+
+def _save(img: Image.Image, name: str, fmt: str, **opts) -> str:
+    buf = BytesIO()
+    img.save(buf, fmt, **opts)
+    return default_storage.save(name, ContentFile(buf.getvalue()))
+
+
+def build_poster_variants(event) -> dict:
+    """
+    Gera as variantes do poster atual e devolve o dict guardado em Event.poster_variants.
+    """
+    if not event.poster:
+        return {}
+
+    with event.poster.open("rb") as f:
+        img = Image.open(f)
+        img.load()
+    img = _to_rgb(img)
+
+    stem = PurePosixPath(event.poster.name).stem
+    base = f"{DERIVED_DIR}/{stem}"
+
+    thumb = img.copy()
+    thumb.thumbnail(PDF_SLOT_PX, Image.LANCZOS)
+
+    variants = {
+        "source": event.poster.name,
+        "pdf": _save(thumb, f"{base}-pdf.jpg", "JPEG", quality=85, optimize=True),
+        "jpeg": {},
+        "webp": {},
+    }
+
+    for width in POSTER_WIDTHS:
+        # nunca aumenta a imagem original
+        w = min(width, img.width)
+        if str(w) in variants["jpeg"]:
+            continue
+        h = round(img.height * w / img.width)
+        resized = img if w == img.width else img.resize((w, h), Image.LANCZOS)
+
+        variants["jpeg"][str(w)] = _save(
+            resized, f"{base}-{w}.jpg", "JPEG", quality=82, optimize=True, progressive=True
+        )
+        variants["webp"][str(w)] = _save(resized, f"{base}-{w}.webp", "WEBP", quality=80, method=4)
+
+    return variants
+
+
+def _names(variants: dict) -> set:
+    names = set()
+    if variants.get("pdf"):
+        names.add(variants["pdf"])
+    for fmt in ("jpeg", "webp"):
+        names.update((variants.get(fmt) or {}).values())
+    return names
+
+
+def delete_poster_variants(variants: dict, keep: dict | None = None):
+    for name in _names(variants or {}) - _names(keep or {}):
+        default_storage.delete(name)
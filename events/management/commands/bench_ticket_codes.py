@@ -0,0 +1,100 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from events.models import City, Event, EventRegistration, EventType, generate_ticket_code
+
+MODES = ("probe", "insert", "batch")
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.n = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.n += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da criação de inscrições com vários threads: probe (SELECT antes do INSERT, "
+        "o método antigo), insert (INSERT e retry na colisão) e batch (create_batch)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--per-thread", type=int, default=200, help="Inscrições por thread.")
+        parser.add_argument("--batch-size", type=int, default=25, help="Tamanho dos lotes no modo batch.")
+        parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+        parser.add_argument("--keep", action="store_true", help="Não apaga o evento e as inscrições de teste.")
+
+    def handle(self, *args, **opts):
+        modes = MODES if opts["mode"] == "all" else (opts["mode"],)
+        self.stdout.write(f"{'modo':<8}{'inscrições':>12}{'s':>8}{'insc/s':>10}{'queries/insc':>14}{'erros':>7}")
+        for mode in modes:
+            self._run(mode, opts)
+
+    def _run(self, mode: str, opts):
+        event = Event.objects.create(
+            title=f"Bench ticket codes {mode}",
+            city=City.MAPUTO,
+            event_type=EventType.WEEKLY,
+            start_at=timezone.now() + timedelta(days=30),
+            meeting_point="Bench",
+            capacity=10**9,
+            is_published=False,
+        )
+        counters, errors = [], []
+        per_thread, batch_size = opts["per_thread"], max(1, opts["batch_size"])
+
+        def worker(t: int):
+            counter = _QueryCounter()
+            counters.append(counter)
+            try:
+                with connection.execute_wrapper(counter):
+                    if mode == "batch":
+                        for start in range(0, per_thread, batch_size):
+                            EventRegistration.create_batch(event, [
+                                EventRegistration(full_name=f"Bench {t}-{i}", phone=f"84{t:02d}{i:05d}")
+                                for i in range(start, min(per_thread, start + batch_size))
+                            ])
+                        return
+                    for i in range(per_thread):
+                        reg = EventRegistration(event=event, full_name=f"Bench {t}-{i}", phone=f"84{t:02d}{i:05d}")
+                        if mode == "probe":
+                            while True:
+                                code = generate_ticket_code()
+                                if not EventRegistration.objects.filter(ticket_code=code).exists():
+                                    reg.ticket_code = code
+                                    break
+                        reg.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(opts["threads"])]
+        started = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - started
+
+        created = EventRegistration.objects.filter(event=event).count()
+        queries = sum(c.n for c in counters)
+        self.stdout.write(
+            f"{mode:<8}{created:>12}{elapsed:>8.2f}{created / elapsed:>10.1f}"
+            f"{queries / created if created else 0:>14.2f}{len(errors):>7}"
+        )
+        for e in errors[:3]:
+            self.stderr.write(f"  {e.__class__.__name__}: {e}")
+
+        if not opts["keep"]:
+            EventRegistration.objects.filter(event=event).delete()
+            event.delete()
@@ -0,0 +1,201 @@
+import json
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+from reportlab.lib.units import mm
+
+from events.models import City, Event, EventRegistration, EventType
+from events.pdfs import TicketCanvas, _draw_qr, build_ticket_pdf, write_tickets_pdf
+
+# (nome, largura, altura, formato, modo): do tamanho do slot do PDF a um poster original
+POSTERS = [
+    ("none", 0, 0, None, None),
+    ("jpeg-slot", 240, 420, "JPEG", "RGB"),
+    ("jpeg-2k", 1200, 2100, "JPEG", "RGB"),
+    ("jpeg-4k", 2400, 4200, "JPEG", "RGB"),
+    ("png-alpha-2k", 1200, 2100, "PNG", "RGBA"),
+]
+
+NAMES = ["Ana Sitoe", "João Mabunda", "Maria da Conceição Nhantumbo Macuácua"]
+
+
+def _make_poster(path: Path, w: int, h: int, fmt: str, mode: str):
+    # gradiente + ruído de baixa frequência: comprime mais ou menos como uma foto
+    img = Image.linear_gradient("L").resize((w, h)).convert(mode)
+    noise = Image.effect_noise((max(1, w // 4), max(1, h // 4)), 64).resize((w, h))
+    img = Image.blend(img, noise.convert(mode), 0.5)
+    if fmt == "JPEG":
+        img.save(path, fmt, quality=85)
+    else:
+        img.save(path, fmt)
+
+
+def _measure(fn, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        fn()
+    times, size = [], None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        out = fn()
+        times.append((time.perf_counter() - started) * 1000)
+        if isinstance(out, (bytes, int)):
+            size = len(out) if isinstance(out, bytes) else out
+    times.sort()
+    mean = statistics.fmean(times)
+    return {
+        "n": iterations,
+        "mean_ms": round(mean, 3),
+        "p50_ms": round(times[len(times) // 2], 3),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+        "per_s": round(1000 / mean, 1) if mean else 0,
+        "bytes": size,
+    }
+
+
+def _blank_pdf(draw=None) -> bytes:
+    buf = BytesIO()
+    c = TicketCanvas(buf)
+    if draw:
+        draw(c)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks dos ingressos PDF: build_ticket_pdf, _draw_qr e embed do poster "
+        "(separados), com posters sintéticos. Pode gravar/comparar um baseline em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--batch", type=int, default=50, help="Tickets por PDF no caso write_tickets_pdf.")
+        parser.add_argument("--only", help="Só corre os casos cujo nome contém este texto.")
+        parser.add_argument("--save", help="Grava os resultados (baseline) neste JSON.")
+        parser.add_argument("--compare", help="Compara com um baseline JSON gravado com --save.")
+        parser.add_argument(
+            "--fail-over", type=float, default=None,
+            help="Falha se algum caso ficar X%% mais lento do que o baseline (com --compare).",
+        )
+
+    def handle(self, *args, **opts):
+        baseline = None
+        if opts["compare"]:
+            try:
+                baseline = json.loads(Path(opts["compare"]).read_text())["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Baseline inválido: {e}")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            results = self._run(Path(media_root), opts)
+
+        self._print(results, baseline)
+
+        if opts["save"]:
+            Path(opts["save"]).write_text(json.dumps({
+                "created_at": timezone.now().isoformat(),
+                "iterations": opts["iterations"],
+                "results": results,
+            }, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Baseline gravado em {opts['save']}"))
+
+        if baseline and opts["fail_over"] is not None:
+            slower = [
+                name for name, r in results.items()
+                if name in baseline and r["mean_ms"] > baseline[name]["mean_ms"] * (1 + opts["fail_over"] / 100)
+            ]
+            if slower:
+                raise CommandError(f"Regressão acima de {opts['fail_over']}%: {', '.join(slower)}")
+
+    def _run(self, media_root: Path, opts) -> dict:
+        it, warmup = opts["iterations"], opts["warmup"]
+        only = opts["only"]
+        results = {}
+
+        def bench(name, fn, iterations=it):
+            if only and only not in name:
+                return
+            results[name] = _measure(fn, iterations, warmup)
+
+        (media_root / "bench").mkdir()
+        posters = {}
+        for name, w, h, fmt, mode in POSTERS:
+            if fmt:
+                path = media_root / "bench" / f"{name}.{fmt.lower()}"
+                _make_poster(path, w, h, fmt, mode)
+                posters[name] = path
+
+        # base: o custo fixo de um PDF de uma página vazia
+        bench("page:blank", _blank_pdf)
+
+        # QR isolado (o valor tem o tamanho de um ticket real)
+        size = 45 * mm
+        bench("qr:draw_qr", lambda: _blank_pdf(lambda c: _draw_qr(c, "RWB|RWB-3F9A1C7E2B", 20 * mm, 20 * mm, size)))
+
+        # poster isolado: embed da imagem num PDF novo (como acontece por ingresso)
+        for name, path in posters.items():
+            bench(
+                f"poster:{name}",
+                lambda p=str(path): _blank_pdf(
+                    lambda c: c.drawImage(p, 20 * mm, 20 * mm, 16 * mm, 31 * mm,
+                                          preserveAspectRatio=True, anchor="c", mask="auto")
+                ),
+            )
+
+        # ingresso completo, por tipo de poster
+        now = timezone.now()
+        for i, (name, *_) in enumerate(POSTERS, start=1):
+            event = Event(
+                id=i,
+                title="Weekly Run • Marginal de Maputo",
+                slug=f"bench-{name}",
+                city=City.MAPUTO,
+                event_type=EventType.WEEKLY,
+                start_at=now + timedelta(days=3),
+                meeting_point="Praça dos Trabalhadores",
+                price=Decimal("750.00"),
+            )
+            if name in posters:
+                event.poster = f"bench/{posters[name].name}"
+            regs = [
+                EventRegistration(event=event, full_name=NAMES[i % len(NAMES)], ticket_code=f"RWB-{i:010X}")
+                for i in range(max(1, opts["batch"]))
+            ]
+
+            bench(f"ticket:{name}", lambda r=regs[0]: build_ticket_pdf(r))
+
+            def batch(regs=regs):
+                buf = BytesIO()
+                write_tickets_pdf(regs, buf)
+                return buf.getvalue()
+
+            bench(f"batch{len(regs)}:{name}", batch, iterations=max(3, it // 10))
+
+        return results
+
+    def _print(self, results: dict, baseline: dict | None):
+        w = self.stdout.write
+        header = f"{'caso':<24}{'n':>5}{'média ms':>11}{'p50':>10}{'p95':>10}{'ops/s':>9}{'bytes':>11}"
+        w(header + ("   vs baseline" if baseline else ""))
+        for name, r in results.items():
+            line = (
+                f"{name:<24}{r['n']:>5}{r['mean_ms']:>11}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+                f"{r['per_s']:>9}{r['bytes'] if r['bytes'] is not None else '-':>11}"
+            )
+            if baseline and name in baseline and baseline[name]["mean_ms"]:
+                delta = (r["mean_ms"] / baseline[name]["mean_ms"] - 1) * 100
+                style = self.style.ERROR if delta > 10 else (self.style.SUCCESS if delta < -10 else str)
+                line += "   " + style(f"{delta:+.1f}%")
+            w(line)
+        w("batchN: um PDF com N páginas (write_tickets_pdf); o poster é embutido uma vez por documento.")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Gera as variantes reduzidas dos posters (PDF + srcset) para eventos que ainda não as têm."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenera mesmo que já existam.")
+
+    def handle(self, *args, **opts):
+        done = 0
+        for event in Event.objects.exclude(poster="").exclude(poster__isnull=True).iterator():
+            if not opts["force"] and (event.poster_variants or {}).get("source") == event.poster.name:
+                continue
+            event.refresh_poster_variants()
+            done += 1
+            self.stdout.write(f"{event.slug}: {len(event.poster_variants.get('jpeg', {}))} tamanho(s)")
+        self.stdout.write(self.style.SUCCESS(f"{done} poster(s) processado(s)."))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+from events.tickets import OfflineValidator, build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o snapshot de check-in de um evento (chave do evento + ingressos válidos) "
+        "para validação offline dos QR. Com --verify, valida tokens contra um snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="Slug do evento.")
+        parser.add_argument("-o", "--output", help="Ficheiro de saída (por omissão: checkin-<slug>.json).")
+        parser.add_argument("--verify", nargs="+", metavar="TOKEN", help="Valida estes QR com o snapshot gravado.")
+
+    def handle(self, *args, **opts):
+        output = opts["output"] or f"checkin-{opts['slug']}.json"
+
+        if opts["verify"]:
+            validator = OfflineValidator.load(output)
+            for token in opts["verify"]:
+                result, code, detail = validator.check(token)
+                self.stdout.write(f"{result:<10} {code or '-':<14} {detail}")
+            return
+
+        event = Event.objects.filter(slug=opts["slug"]).first()
+        if not event:
+            raise CommandError(f"Evento '{opts['slug']}' não encontrado.")
+
+        snapshot = build_snapshot(event)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+
+        self.stdout.write(self.style.SUCCESS(f"{len(snapshot['tickets'])} ingresso(s) válidos em {output}."))
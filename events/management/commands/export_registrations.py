@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.exports import iter_registrations_csv
+from events.models import Event, EventRegistration, PaymentStatus, RegistrationStatus
+
+
+class Command(BaseCommand):
+    help = "Exporta as inscrições (com referência, método, valor e data do pagamento) em CSV, em streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument("events", nargs="*", help="Slugs dos eventos (por omissão: todos).")
+        parser.add_argument("-o", "--output", help="Ficheiro de saída (por omissão: stdout).")
+        parser.add_argument("--paid", action="store_true", help="Só inscrições ativas e pagas.")
+
+    def handle(self, *args, **opts):
+        regs = EventRegistration.objects.all()
+        if opts["events"]:
+            events = list(Event.objects.filter(slug__in=opts["events"]).values_list("slug", flat=True))
+            missing = set(opts["events"]) - set(events)
+            if missing:
+                raise CommandError(f"Evento(s) não encontrado(s): {', '.join(sorted(missing))}")
+            regs = regs.filter(event__slug__in=events)
+        if opts["paid"]:
+            regs = regs.filter(payment_status=PaymentStatus.PAID, status=RegistrationStatus.ACTIVE)
+
+        if not opts["output"]:
+            for chunk in iter_registrations_csv(regs):
+                sys.stdout.write(chunk)
+            return
+
+        with open(opts["output"], "w", encoding="utf-8", newline="") as f:
+            for chunk in iter_registrations_csv(regs):
+                f.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"{regs.count()} inscrição(ões) exportada(s) para {opts['output']}"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event, paid_registrations
+from events.pdfs import iter_tickets_zip, write_tickets_pdf
+
+
+class Command(BaseCommand):
+    help = "Exporta os tickets pagos de um evento num único PDF (ou ZIP com um PDF por ticket)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="Slug do evento.")
+        parser.add_argument("-o", "--output", help="Ficheiro de saída (por omissão: tickets-<slug>.pdf/.zip).")
+        parser.add_argument("--zip", action="store_true", help="ZIP com um PDF por ticket.")
+
+    def handle(self, *args, **opts):
+        events = Event.objects.filter(slug=opts["slug"])
+        if not events.exists():
+            raise CommandError(f"Evento '{opts['slug']}' não encontrado.")
+
+        ext = "zip" if opts["zip"] else "pdf"
+        output = opts["output"] or f"tickets-{opts['slug']}.{ext}"
+        regs = paid_registrations(events)
+        count = regs.count()
+
+        started = time.perf_counter()
+        with open(output, "wb") as f:
+            if opts["zip"]:
+                for chunk in iter_tickets_zip(regs.iterator(chunk_size=500)):
+                    f.write(chunk)
+            else:
+                write_tickets_pdf(regs.iterator(chunk_size=500), f)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f"{count} ticket(s) em {output} ({elapsed:.1f}s)."))
@@ -0,0 +1,53 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from events.models import City, Event
+from events.recurrence import create_events, occurrences
+
+
+def _date(value: str, *, end: bool = False) -> datetime:
+    d = parse_date(value)
+    if d is None:
+        raise CommandError(f"Data inválida: {value} (usa AAAA-MM-DD).")
+    return timezone.make_aware(datetime.combine(d, time.max if end else time.min))
+
+
+class Command(BaseCommand):
+    help = "Cria as próximas ocorrências de um evento-modelo (ex.: a Weekly Run de cada semana até ao fim da época)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("template", help="Slug do evento-modelo.")
+        parser.add_argument("--until", required=True, help="Última data (AAAA-MM-DD), inclusive.")
+        parser.add_argument("--start", help="Primeira data (por omissão: a semana a seguir ao modelo).")
+        parser.add_argument("--every-weeks", type=int, default=1)
+        parser.add_argument("--cities", nargs="+", choices=City.values, help="Cidades (por omissão: a do modelo).")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        template = Event.objects.filter(slug=opts["template"]).first()
+        if not template:
+            raise CommandError(f"Evento '{opts['template']}' não encontrado.")
+        if opts["every_weeks"] < 1:
+            raise CommandError("--every-weeks tem de ser >= 1.")
+
+        events = occurrences(
+            template,
+            until=_date(opts["until"], end=True),
+            start=_date(opts["start"]) if opts["start"] else None,
+            every_weeks=opts["every_weeks"],
+            cities=opts["cities"],
+        )
+
+        if opts["dry_run"]:
+            for e in events:
+                self.stdout.write(f"{timezone.localtime(e.start_at):%Y-%m-%d %H:%M}  {e.city}  {e.title}")
+            self.stdout.write(f"{len(events)} evento(s) por criar.")
+            return
+
+        created = create_events(events)
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} evento(s) criados."))
+        if template.poster:
+            self.stdout.write("Gera as variantes do poster com: python manage.py build_poster_variants")
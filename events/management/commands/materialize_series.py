@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from events.models import EventSeries
+from events.recurrence import materialize_series
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria os Event das séries ativas (EventSeries) para as próximas semanas. "
+        "Idempotente: pode correr quantas vezes for preciso (ex.: cron diário)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--weeks", type=int, default=settings.SERIES_HORIZON_WEEKS,
+            help="Horizonte em semanas (por omissão: SERIES_HORIZON_WEEKS).",
+        )
+        parser.add_argument("--series", type=int, nargs="+", help="Só estas séries (ids).")
+        parser.add_argument("--loop", action="store_true", help="Corre continuamente (worker).")
+        parser.add_argument("--interval", type=float, default=3600, help="Pausa (s) entre passagens com --loop.")
+
+    def handle(self, *args, **opts):
+        horizon = timedelta(weeks=max(0, opts["weeks"]))
+        while True:
+            qs = EventSeries.objects.filter(is_active=True)
+            if opts["series"]:
+                qs = qs.filter(pk__in=opts["series"])
+
+            total = 0
+            for series in qs:
+                n = materialize_series(series, horizon)
+                total += n
+                if n:
+                    self.stdout.write(f"{series}: {n} evento(s) criado(s).")
+            self.stdout.write(f"{total} evento(s) criado(s) até {opts['weeks']} semana(s).")
+
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
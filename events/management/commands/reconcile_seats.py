@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from events.models import Event, EventRegistration, RegistrationStatus
+
+
+class Command(BaseCommand):
+    help = "Recalcula Event.seats_taken a partir das inscrições não canceladas e corrige divergências."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", help="Slug de um evento específico (por omissão: todos).")
+        parser.add_argument("--dry-run", action="store_true", help="Só mostra as divergências, não grava.")
+
+    def handle(self, *args, **opts):
+        events = Event.objects.only("id", "slug", "seats_taken")
+        active = EventRegistration.objects.exclude(status=RegistrationStatus.CANCELLED)
+
+        if opts["event"]:
+            events = events.filter(slug=opts["event"])
+            if not events.exists():
+                raise CommandError(f"Evento '{opts['event']}' não encontrado.")
+            active = active.filter(event__slug=opts["event"])
+
+        # uma única agregação para todos os eventos
+        counts = dict(active.values("event_id").annotate(n=Count("id")).values_list("event_id", "n"))
+
+        fixed = 0
+        for event in events.iterator():
+            real = counts.get(event.id, 0)
+            if event.seats_taken == real:
+                continue
+
+            if opts["dry_run"]:
+                self.stdout.write(f"{event.slug}: seats_taken={event.seats_taken} real={real}")
+                fixed += 1
+                continue
+
+            # reconta com o evento bloqueado para não competir com inscrições em curso
+            with transaction.atomic():
+                locked = Event.objects.select_for_update().only("id", "seats_taken").get(pk=event.pk)
+                real = active.filter(event_id=event.pk).count()
+                if locked.seats_taken != real:
+                    Event.objects.filter(pk=event.pk).update(seats_taken=real)
+                    self.stdout.write(f"{event.slug}: {locked.seats_taken} -> {real}")
+                    fixed += 1
+
+        verb = "divergentes" if opts["dry_run"] else "corrigidos"
+        self.stdout.write(self.style.SUCCESS(f"{fixed} evento(s) {verb}."))
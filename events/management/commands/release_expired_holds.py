@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from events.models import Event, EventRegistration, PaymentStatus, RegistrationStatus
+
+
+class Command(BaseCommand):
+    help = "Cancela inscrições pagas cuja reserva de lugar expirou sem pagamento e liberta os lugares."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Só conta as reservas expiradas.")
+        parser.add_argument("--loop", action="store_true", help="Corre continuamente.")
+        parser.add_argument("--interval", type=float, default=60.0, help="Segundos entre passagens com --loop.")
+
+    def handle(self, *args, **opts):
+        while True:
+            released = self.sweep(opts["batch_size"], opts["dry_run"])
+            verb = "expiradas" if opts["dry_run"] else "libertadas"
+            self.stdout.write(f"{released} reserva(s) {verb}.")
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
+
+    def sweep(self, batch_size: int, dry_run: bool) -> int:
+        now = timezone.now()
+        expired = (
+            EventRegistration.objects
+            .filter(status=RegistrationStatus.ACTIVE, hold_expires_at__lte=now)
+            .exclude(payment_status=PaymentStatus.PAID)
+        )
+        if dry_run:
+            return expired.count()
+
+        released = 0
+        event_ids = list(expired.values_list("event_id", flat=True).distinct())
+        for event_id in event_ids:
+            while True:
+                ids = list(expired.filter(event_id=event_id).values_list("id", flat=True)[:batch_size])
+                if not ids:
+                    break
+                with transaction.atomic():
+                    # repete as condições no UPDATE: um pagamento confirmado entretanto não é cancelado
+                    n = expired.filter(pk__in=ids).update(status=RegistrationStatus.CANCELLED)
+                    Event.adjust_seats(event_id, -n)
+                released += n
+                if len(ids) < batch_size:
+                    break
+        return released
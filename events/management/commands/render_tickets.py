@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from events.models import RenderStatus, TicketRenderJob
+from events.rendering import claim_jobs, enqueue_missing, init_worker, render_job
+
+
+class Command(BaseCommand):
+    help = "Pré-gera os PDFs dos ingressos pagos (TicketRenderJob) num pool de processos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos de render.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Jobs por lote (por omissão: 4 x workers).")
+        parser.add_argument("--loop", action="store_true", help="Corre continuamente (worker).")
+        parser.add_argument("--interval", type=float, default=1.0, help="Pausa (s) quando a fila está vazia.")
+        parser.add_argument("--retry-failed", action="store_true", help="Volta a pôr os FAILED na fila antes de começar.")
+        parser.add_argument("--backfill", action="store_true", help="Põe na fila os ingressos pagos ainda sem job.")
+
+    def handle(self, *args, **opts):
+        if opts["retry_failed"]:
+            n = TicketRenderJob.objects.filter(status=RenderStatus.FAILED).update(
+                status=RenderStatus.PENDING, attempts=0, next_attempt_at=None
+            )
+            self.stdout.write(f"{n} job(s) FAILED de volta à fila.")
+
+        if opts["backfill"]:
+            self.stdout.write(f"{enqueue_missing()} ingresso(s) pago(s) posto(s) na fila.")
+
+        workers = max(1, opts["workers"])
+        batch_size = opts["batch_size"] or workers * 4
+
+        # spawn: os processos não herdam as ligações à BD deste processo
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+        try:
+            while True:
+                ids = claim_jobs(batch_size)
+                if ids:
+                    started = time.perf_counter()
+                    results = Counter(pool.map(render_job, ids))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{len(ids)} ingresso(s) em {elapsed:.2f}s ({len(ids) / elapsed:.1f}/s): "
+                        + ", ".join(f"{n} {status}" for status, n in sorted(results.items()))
+                    )
+                    continue
+
+                if not opts["loop"]:
+                    break
+                time.sleep(opts["interval"])
+        finally:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:49
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_seats_taken(apps, schema_editor):
+    Event = apps.get_model("events", "Event")
+    EventRegistration = apps.get_model("events", "EventRegistration")
+    counts = (
+        EventRegistration.objects
+        .exclude(status="cancelled")
+        .values("event_id")
+        .annotate(n=Count("id"))
+        .values_list("event_id", "n")
+    )
+    for event_id, n in counts:
+        Event.objects.filter(pk=event_id).update(seats_taken=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_remove_eventregistration_uniq_order_event_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_seats_taken, migrations.RunPython.noop),
+    ]
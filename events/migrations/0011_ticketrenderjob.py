@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_poster_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('pdf_name', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('render_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('registration', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='render_job', to='events.eventregistration')),
+            ],
+            options={
+                'ordering': ('updated_at',),
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='events_tick_status_8816d9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:28
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_ticketrenderjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=220)),
+                ('city', models.CharField(choices=[('MAPUTO', 'Maputo'), ('MATOLA', 'Matola')], max_length=20)),
+                ('event_type', models.CharField(choices=[('WEEKLY', 'Weekly Run'), ('LONG', 'Long Run'), ('COLLAB', 'Collab')], default='WEEKLY', max_length=20)),
+                ('first_start_at', models.DateTimeField()),
+                ('every_weeks', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('ends_on', models.DateField(blank=True, help_text='Última data (inclusive). Vazio = sem fim.', null=True)),
+                ('meeting_point', models.CharField(max_length=220)),
+                ('distance_min_km', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, help_text='Deixe vazio para evento free. Ex: 500.00', max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name='Preço do ticket (MZN)')),
+                ('capacity', models.PositiveIntegerField(default=150)),
+                ('is_published', models.BooleanField(default=True)),
+                ('is_active', models.BooleanField(db_index=True, default=True)),
+                ('materialized_until', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'event series',
+                'verbose_name_plural': 'event series',
+                'ordering': ('title',),
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='events.eventseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('series', 'start_at'), name='uniq_event_series_start_at'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_eventseries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketrenderjob',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_ticketrenderjob_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventregistration',
+            name='needs_refund',
+            field=models.BooleanField(default=False, help_text='Pagamento confirmado depois de a inscrição ter sido cancelada e sem lugar recuperado.', verbose_name='Reembolsar'),
+        ),
+    ]
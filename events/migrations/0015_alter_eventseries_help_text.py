@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:50
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_eventregistration_needs_refund'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventseries',
+            name='every_weeks',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Só afeta os eventos ainda não criados.', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='eventseries',
+            name='first_start_at',
+            field=models.DateTimeField(help_text='Define o dia da semana e a hora. Alterar a série só afeta os eventos ainda não criados: os que já existem (até "materialized until") editam-se em Events.'),
+        ),
+    ]
@@ -1,18 +1,85 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import RegexValidator
 from decimal import Decimal
 from django.core.validators import MinValueValidator
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from datetime import datetime, timedelta
+import logging
 import secrets
 import string
 
+from .images import build_poster_variants, delete_poster_variants
+
+logger = logging.getLogger(__name__)
+
 
 def generate_ticket_code():
     alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # sem O, 0, I, 1
     return "RWB-" + "".join(secrets.choice(alphabet) for _ in range(8))
 
 
+# 32^8 códigos: uma colisão já é rara, várias seguidas indicam outro problema
+TICKET_CODE_ATTEMPTS = 5
+
+
+def _ticket_code_taken(code: str) -> bool:
+    return EventRegistration.objects.filter(ticket_code=code).exists()
+
+
+SLUG_ATTEMPTS = 5
+
+
+def _slug_base(title: str) -> str:
+    return slugify(title)[:200] or "event"
+
+
+def allocate_slugs(titles: list[str], exclude_pk=None) -> list[str]:
+    """
+    Slugs livres para estes títulos ("weekly-run", "weekly-run-2", ...), com uma só
+    query: os slugs já usados com os mesmos prefixos. Títulos repetidos na lista
+    recebem sufixos seguidos.
+    """
+    bases = [_slug_base(t) for t in titles]
+    if not bases:
+        return []
+
+    prefixes = Q()
+    for base in set(bases):
+        prefixes |= Q(slug__startswith=base)
+    taken = Event.objects.filter(prefixes)
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+
+    # por base: se o slug sem sufixo está livre e o maior sufixo numérico usado
+    base_free = dict.fromkeys(bases, True)
+    last = dict.fromkeys(bases, 1)
+    for slug in taken.values_list("slug", flat=True):
+        for base in last:
+            if slug == base:
+                base_free[base] = False
+            elif slug.startswith(base + "-") and slug[len(base) + 1:].isdigit():
+                last[base] = max(last[base], int(slug[len(base) + 1:]))
+
+    slugs = []
+    for base in bases:
+        if base_free[base]:
+            base_free[base] = False
+            slugs.append(base)
+        else:
+            last[base] += 1
+            slugs.append(f"{base}-{last[base]}")
+    return slugs
+
+
+class EventSoldOut(Exception):
+    """Não há lugar livre para criar a inscrição."""
+
+
 class City(models.TextChoices):
     MAPUTO = "MAPUTO", "Maputo"
     MATOLA = "MATOLA", "Matola"
@@ -24,6 +91,98 @@ class EventType(models.TextChoices):
     COLLAB = "COLLAB", "Collab"
 
 
+class EventSeries(models.Model):
+    """
+    Evento recorrente (ex.: a Weekly Run de todas as quartas). Os Event concretos só são
+    criados para as próximas semanas (materialize_series); as datas mais à frente
+    aparecem na agenda como ocorrências virtuais.
+    """
+    title = models.CharField(max_length=220)
+    city = models.CharField(max_length=20, choices=City.choices)
+    event_type = models.CharField(max_length=20, choices=EventType.choices, default=EventType.WEEKLY)
+
+    # primeira ocorrência: define o dia da semana e a hora
+    first_start_at = models.DateTimeField(
+        help_text="Define o dia da semana e a hora. Alterar a série só afeta os eventos ainda não criados: "
+                  "os que já existem (até \"materialized until\") editam-se em Events.",
+    )
+    every_weeks = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="Só afeta os eventos ainda não criados.",
+    )
+    ends_on = models.DateField(null=True, blank=True, help_text="Última data (inclusive). Vazio = sem fim.")
+
+    meeting_point = models.CharField(max_length=220)
+    distance_min_km = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    description = models.TextField(blank=True)
+    price = models.DecimalField(
+        "Preço do ticket (MZN)",
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal("0.00"))],
+        help_text="Deixe vazio para evento free. Ex: 500.00",
+    )
+    capacity = models.PositiveIntegerField(default=150)
+    is_published = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True, db_index=True)
+
+    # os Event já existem até esta data (exclusive para a próxima materialização)
+    materialized_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("title",)
+        verbose_name = "event series"
+        verbose_name_plural = "event series"
+
+    def __str__(self):
+        return f"{self.title} ({self.get_city_display()})"
+
+    def pending_after(self, now: datetime) -> datetime:
+        """Instante a partir do qual as ocorrências ainda não são Event (exclusive)."""
+        start = self.materialized_until or self.first_start_at - timedelta(microseconds=1)
+        return max(start, now)
+
+    def occurrences(self, after: datetime, until: datetime) -> list[datetime]:
+        """Datas das ocorrências em ]after, until]. Calculadas na hora local (DST)."""
+        first = timezone.localtime(self.first_start_at)
+        step = timedelta(weeks=self.every_weeks)
+        if self.ends_on:
+            until = min(until, timezone.make_aware(datetime.combine(self.ends_on, datetime.max.time())))
+
+        # salta direto para a primeira ocorrência perto de `after`
+        k = max(0, (after - self.first_start_at) // step - 1)
+        dates = []
+        while True:
+            naive = first.replace(tzinfo=None) + k * step
+            when = timezone.make_aware(naive)
+            if when > until:
+                return dates
+            if when > after:
+                dates.append(when)
+            k += 1
+
+    def build_event(self, when: datetime) -> "Event":
+        """Event (por gravar) desta série na data dada."""
+        return Event(
+            series=self,
+            title=self.title,
+            city=self.city,
+            event_type=self.event_type,
+            start_at=when,
+            meeting_point=self.meeting_point,
+            distance_min_km=self.distance_min_km,
+            description=self.description,
+            price=self.price,
+            capacity=self.capacity,
+            is_published=self.is_published,
+        )
+
+
 class Event(models.Model):
     title = models.CharField(max_length=220)
     slug = models.SlugField(max_length=240, unique=True, db_index=True, blank=True)
@@ -51,10 +210,18 @@ class Event(models.Model):
     )
 
     capacity = models.PositiveIntegerField(default=150)
+    # contador denormalizado de inscrições não canceladas (ver EventRegistration.save)
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
 
     is_published = models.BooleanField(default=True, db_index=True)
 
     poster = models.ImageField(upload_to="events/posters/", blank=True, null=True)
+    # variantes reduzidas do poster (ver events.images)
+    poster_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    series = models.ForeignKey(
+        EventSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name="events"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -64,20 +231,76 @@ class Event(models.Model):
             models.Index(fields=["city", "start_at"]),
             models.Index(fields=["event_type", "start_at"]),
         ]
+        constraints = [
+            # uma ocorrência por data: a materialização pode correr em paralelo/repetida
+            models.UniqueConstraint(fields=["series", "start_at"], name="uniq_event_series_start_at"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_city_display()})"
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base = slugify(self.title)[:200] or "event"
-            slug = base
-            i = 2
-            while Event.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base}-{i}"
-                i += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        source = self.poster.name if self.poster else ""
+        poster_changed = (self.poster_variants or {}).get("source", "") != source
+
+        # seats_taken só muda por UPDATE atómico (claim_seat/adjust_seats): gravar o valor
+        # lido antes (ex.: o admin a mudar a capacidade a meio de uma venda) apagaria lugares
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "seats_taken"
+            ]
+
+        # slug: uma query pelo próximo sufixo livre; se outro save o apanhou entretanto,
+        # a constraint única falha e volta a calcular
+        auto_slug = not self.slug
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            if auto_slug:
+                self.slug = allocate_slugs([self.title], exclude_pk=self.pk)[0]
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                break
+            except IntegrityError:
+                taken = Event.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not auto_slug or attempt == SLUG_ATTEMPTS or not taken:
+                    raise
+
+        if poster_changed:
+            self.refresh_poster_variants()
+
+    def refresh_poster_variants(self):
+        """
+        (Re)gera as variantes do poster e apaga as da versão anterior.
+        """
+        old = self.poster_variants or {}
+        try:
+            variants = build_poster_variants(self)
+        except Exception:
+            logger.exception("Falha ao gerar variantes do poster: event=%s", self.pk)
+            variants = {}
+
+        delete_poster_variants(old, keep=variants)
+        Event.objects.filter(pk=self.pk).update(poster_variants=variants)
+        self.poster_variants = variants
+
+    def _poster_variant_urls(self, fmt: str) -> list[tuple[int, str]]:
+        sizes = (self.poster_variants or {}).get(fmt) or {}
+        return sorted((int(w), default_storage.url(name)) for w, name in sizes.items())
+
+    @property
+    def poster_src(self) -> str:
+        urls = self._poster_variant_urls("jpeg")
+        if urls:
+            return urls[-1][1]
+        return self.poster.url if self.poster else ""
+
+    @property
+    def poster_srcset_jpeg(self) -> str:
+        return ", ".join(f"{url} {w}w" for w, url in self._poster_variant_urls("jpeg"))
+
+    @property
+    def poster_srcset_webp(self) -> str:
+        return ", ".join(f"{url} {w}w" for w, url in self._poster_variant_urls("webp"))
 
     @property
     def is_upcoming(self):
@@ -93,13 +316,33 @@ class Event(models.Model):
             return "Free"
         return f"{self.price:.2f} MZN"
 
+    @classmethod
+    def adjust_seats(cls, event_id, delta: int):
+        """
+        Soma `delta` ao contador seats_taken com um UPDATE atómico (nunca abaixo de zero).
+        """
+        if not delta:
+            return
+        cls.objects.filter(pk=event_id).update(seats_taken=Greatest(F("seats_taken") + delta, 0))
+
+    @classmethod
+    def claim_seat(cls, event_id, n: int = 1) -> bool:
+        """
+        Ocupa `n` lugares só se ainda houver capacidade para todos (UPDATE condicional, sem lock global).
+        """
+        return bool(
+            cls.objects
+            .filter(pk=event_id, seats_taken__lte=F("capacity") - n)
+            .update(seats_taken=F("seats_taken") + n)
+        )
+
     @property
     def registrations_count(self) -> int:
-        return self.registrations.exclude(status=RegistrationStatus.CANCELLED).count()
+        return self.seats_taken
 
     @property
     def is_sold_out(self) -> bool:
-        return self.registrations_count >= self.capacity
+        return self.seats_taken >= self.capacity
 
 
 phone_validator = RegexValidator(
@@ -146,6 +389,14 @@ class EventRegistration(models.Model):
         default=PaymentStatus.UNPAID,
         db_index=True
     )
+    # reserva de lugar para inscrições pagas: expira se o pagamento não for confirmado.
+    # O release_expired_holds cancela sem a limpar; um cancelamento manual limpa-a.
+    hold_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    needs_refund = models.BooleanField(
+        "Reembolsar",
+        default=False,
+        help_text="Pagamento confirmado depois de a inscrição ter sido cancelada e sem lugar recuperado.",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -160,16 +411,217 @@ class EventRegistration(models.Model):
     def __str__(self):
         return f"{self.ticket_code} • {self.full_name} • {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # guarda o status lido da BD para saber se o save() ocupa/liberta um lugar
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def _seat_delta(self, update_fields=None) -> int:
+        def takes_seat(status):
+            return status is not None and status != RegistrationStatus.CANCELLED
+
+        if self._state.adding:
+            return 1 if takes_seat(self.status) else 0
+        if update_fields is not None and "status" not in update_fields:
+            return 0
+        old = getattr(self, "_loaded_status", None)
+        if old is None:
+            return 0
+        return int(takes_seat(self.status)) - int(takes_seat(old))
+
     def save(self, *args, **kwargs):
-        if not self.ticket_code:
-            while True:
-                code = generate_ticket_code()
-                if not EventRegistration.objects.filter(ticket_code=code).exists():
-                    self.ticket_code = code
-                    break
-        super().save(*args, **kwargs)
+        if self.status == RegistrationStatus.CANCELLED and self._seat_delta(kwargs.get("update_fields")) < 0:
+            # cancelamento manual: um pagamento que chegue depois não a reativa (ver reclaim_seat)
+            self.hold_expires_at = None
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "hold_expires_at"}
+        # o ticket_code é gerado sem SELECT prévio: a constraint única deteta a
+        # colisão (rara) e o bloco inteiro (lugar + INSERT) é repetido com outro código
+        generate = not self.ticket_code
+        for attempt in range(1, TICKET_CODE_ATTEMPTS + 1):
+            if generate:
+                self.ticket_code = generate_ticket_code()
+            try:
+                self._save_claiming_seat(*args, **kwargs)
+                break
+            except IntegrityError:
+                if not generate or attempt == TICKET_CODE_ATTEMPTS or not _ticket_code_taken(self.ticket_code):
+                    raise
+                logger.info("ticket_code %s já existe, a gerar outro", self.ticket_code)
+        self._loaded_status = self.status
+
+    def _save_claiming_seat(self, *args, **kwargs):
+        with transaction.atomic():
+            delta = self._seat_delta(kwargs.get("update_fields"))
+            if self._state.adding and delta > 0:
+                if not Event.claim_seat(self.event_id):
+                    raise EventSoldOut(self.event_id)
+                delta = 0
+            super().save(*args, **kwargs)
+            Event.adjust_seats(self.event_id, delta)
+
+    @classmethod
+    def create_batch(cls, event, registrations: list["EventRegistration"]) -> list["EventRegistration"]:
+        """
+        Inscrições em grupo/lote no mesmo evento: ocupa os lugares todos de uma vez
+        (ou nenhum: EventSoldOut) e grava-as num só INSERT, com ticket_codes gerados.
+        Não envia sinais de save nem passa pelo save() de cada inscrição.
+        """
+        if not registrations:
+            return []
+        active = sum(r.status != RegistrationStatus.CANCELLED for r in registrations)
+
+        for attempt in range(1, TICKET_CODE_ATTEMPTS + 1):
+            codes = set()
+            while len(codes) < len(registrations):
+                codes.add(generate_ticket_code())
+            for reg, code in zip(registrations, codes):
+                reg.event = event
+                reg.ticket_code = code
+            try:
+                with transaction.atomic():
+                    if active and not Event.claim_seat(event.pk, active):
+                        raise EventSoldOut(event.pk)
+                    created = cls.objects.bulk_create(registrations)
+                break
+            except IntegrityError:
+                if attempt == TICKET_CODE_ATTEMPTS or not cls.objects.filter(ticket_code__in=codes).exists():
+                    raise
+
+        for reg in created:
+            reg._loaded_status = reg.status
+        return created
+
+    def clean(self):
+        super().clean()
+        if (
+            self._state.adding
+            and self.event_id
+            and self.status != RegistrationStatus.CANCELLED
+            and self.event.is_sold_out
+        ):
+            raise ValidationError("Este evento está esgotado.")
+
+    @property
+    def hold_expired(self) -> bool:
+        return bool(self.hold_expires_at and self.hold_expires_at <= timezone.now())
+
+    def reclaim_seat(self) -> bool:
+        """
+        Pagamento confirmado numa inscrição cancelada. Só volta a ACTIVE se foi o
+        release_expired_holds que a cancelou (reserva expirada) e ainda há lugar
+        (claim_seat condicional); senão fica cancelada e marcada para reembolso.
+        Só altera a instância (e o contador do evento): quem chama grava a inscrição.
+        """
+        if self.hold_expired and Event.claim_seat(self.event_id):
+            self.status = RegistrationStatus.ACTIVE
+            return True
+        self.needs_refund = True
+        logger.warning("Pagamento de inscrição cancelada, a reembolsar: %s", self.ticket_code)
+        return False
+
+    def mark_paid(self):
+        """
+        Confirma o pagamento e liberta a reserva temporária.
+        Se entretanto foi cancelada, tenta recuperar o lugar (ver reclaim_seat).
+        """
+        with transaction.atomic():
+            # relê com lock: o release_expired_holds pode tê-la cancelado depois de carregada
+            self.status, self.hold_expires_at = (
+                EventRegistration.objects
+                .select_for_update()
+                .values_list("status", "hold_expires_at")
+                .get(pk=self.pk)
+            )
+            if self.status == RegistrationStatus.CANCELLED:
+                self.reclaim_seat()
+            self.payment_status = PaymentStatus.PAID
+            self.hold_expires_at = None
+            self.updated_at = timezone.now()
+            EventRegistration.objects.filter(pk=self.pk).update(
+                status=self.status,
+                payment_status=self.payment_status,
+                hold_expires_at=None,
+                needs_refund=self.needs_refund,
+                updated_at=self.updated_at,
+            )
+            self._loaded_status = self.status
+
+            if self.status == RegistrationStatus.ACTIVE:
+                # o PDF é pré-gerado pelo render_tickets, fora do pedido
+                transaction.on_commit(lambda: TicketRenderJob.enqueue([self.pk]))
 
     @property
     def amount_due(self):
         return self.event.price if self.status == RegistrationStatus.ACTIVE else 0
 
+
+class RenderStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    FAILED = "FAILED", "Failed"
+
+
+class TicketRenderJob(models.Model):
+    """
+    Pedido de pré-geração do PDF de um ingresso (um por inscrição), criado quando
+    a inscrição fica paga. Processado pelo comando render_tickets.
+    """
+    registration = models.OneToOneField(
+        "EventRegistration", on_delete=models.CASCADE, related_name="render_job"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=RenderStatus.choices,
+        default=RenderStatus.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    pdf_name = models.CharField(max_length=200, blank=True)
+    # depois de uma falha só volta a ser reclamado a partir daqui (backoff)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    render_ms = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ("updated_at",)
+        indexes = [
+            models.Index(fields=["status", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.registration_id} • {self.status}"
+
+    @classmethod
+    def enqueue(cls, registration_ids):
+        """
+        Põe (ou volta a pôr) os ingressos na fila numa só query.
+        Pedidos repetidos para o mesmo ingresso ficam num único job.
+        """
+        ids = list(dict.fromkeys(registration_ids))
+        if not ids:
+            return
+        cls.objects.bulk_create(
+            [cls(registration_id=pk) for pk in ids],
+            update_conflicts=True,
+            unique_fields=["registration"],
+            update_fields=["status", "attempts", "error", "next_attempt_at", "updated_at"],
+        )
+
+
+def paid_registrations(events):
+    """
+    Inscrições ativas e pagas dos eventos dados (tickets válidos), agrupadas por evento.
+    """
+    return (
+        EventRegistration.objects
+        .filter(event__in=events, payment_status=PaymentStatus.PAID, status=RegistrationStatus.ACTIVE)
+        .select_related("event")
+        .order_by("event__start_at", "event_id", "full_name")
+    )
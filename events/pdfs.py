@@ -1,25 +1,116 @@
+import hashlib
+import io
+import itertools
+import zipfile
 from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
 from django.utils import timezone
 
+from core.metrics import timed
+
+from .tickets import ticket_token
+
+from reportlab.lib.utils import _digester
+from reportlab.pdfbase import pdfdoc, pdfutils
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib import colors
 
-from reportlab.graphics.barcode import qr
-from reportlab.graphics import renderPDF
-from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.barcode import qrencoder
+
+
+# muda sempre que o layout do PDF mudar, para invalidar os PDFs já gerados
+TICKET_LAYOUT_VERSION = "4"
+
+# máscara fixa: o qrencoder testaria as 8 (8 codificações por QR) só para escolher a
+# de melhor contraste; qualquer máscara é um QR válido
+QR_MASK_PATTERN = 0
+QR_BORDER = 4
+
+
+class _JpegXObject(pdfdoc.PDFImageXObject):
+    """Imagem JPEG embutida tal como está no ficheiro (só DCTDecode)."""
+
+    def __init__(self, name: str, path: str):
+        super().__init__(name)
+        with open(path, "rb") as f:
+            width, height, components, _ = pdfutils.readJPEGInfo(f)
+            f.seek(0)
+            self.streamContent = f.read()
+        self.width, self.height = width, height
+        self.bitsPerComponent = 8
+        self.colorSpace = {1: "DeviceGray", 3: "DeviceRGB"}.get(components, "DeviceCMYK")
+        self._dotrans = self.colorSpace == "DeviceCMYK"
+        self._filters = ("DCTDecode",)
+
+
+class TicketCanvas(canvas.Canvas):
+    """
+    Canvas dos PDFs de ingressos, com as opções no próprio canvas (o rl_config é global
+    ao processo): páginas comprimidas com zlib, saída invariante (a mesma versão de um
+    ingresso dá sempre os mesmos bytes) e posters JPEG embutidos sem a passagem ASCII85
+    que o ReportLab faz por omissão (+25% no tamanho e o grosso do tempo de um ticket
+    com poster).
+    """
+
+    def __init__(self, fileobj):
+        super().__init__(fileobj, pagesize=A4, pageCompression=1, invariant=1)
+
+    def drawImage(self, image, *args, mask=None, **kwargs):
+        if isinstance(image, str) and image.lower().endswith((".jpg", ".jpeg")):
+            self._add_jpeg(image, mask)
+        return super().drawImage(image, *args, mask=mask, **kwargs)
+
+    def _add_jpeg(self, path: str, mask):
+        # regista o XObject com o nome que o drawImage dá ao ficheiro: ele encontra-o e só o desenha
+        name = _digester(f"{path}{mask}".encode("utf-8"))
+        reg_name = self._doc.getXObjectName(name)
+        if reg_name in self._doc.idToObject:
+            return
+        try:
+            img = _JpegXObject(name, path)
+        except Exception:
+            # ficheiro em falta ou JPEG que não dá para embutir assim: fica com o drawImage normal
+            return
+        img.name = name
+        self._setXObjects(img)
+        self._doc.Reference(img, reg_name)
+        self._doc.addForm(name, img)
+
+
+def qr_matrix(value: str) -> list[list[bool]]:
+    """Matriz de módulos do QR (nível L), True = módulo escuro."""
+    code = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.L)
+    code.addData(value)
+    code.version = code.calculate_version()
+    code.makeImpl(False, QR_MASK_PATTERN)
+    return code.modules
 
 
 def _draw_qr(c, value: str, x: float, y: float, size: float):
-    widget = qr.QrCodeWidget(value)
-    bounds = widget.getBounds()
-    w = bounds[2] - bounds[0]
-    h = bounds[3] - bounds[1]
+    """
+    Desenha o QR como um único path: um retângulo por sequência de módulos escuros
+    em cada linha (sem Drawing/Widget do reportlab.graphics).
+    """
+    modules = qr_matrix(value)
+    box = size / (len(modules) + 2 * QR_BORDER)
+    top = y + size
+
+    p = c.beginPath()
+    for r, row in enumerate(modules):
+        cy = top - (r + QR_BORDER + 1) * box
+        col = 0
+        for dark, run in itertools.groupby(row):
+            n = sum(1 for _ in run)
+            if dark:
+                p.rect(x + (col + QR_BORDER) * box, cy, n * box, box)
+            col += n
 
-    d = Drawing(size, size, transform=[size / w, 0, 0, size / h, 0, 0])
-    d.add(widget)
-    renderPDF.draw(d, c, x, y)
+    c.setFillColor(colors.black)
+    c.drawPath(p, stroke=0, fill=1)
 
 
 def _event_location(event) -> str:
@@ -31,149 +122,311 @@ def _event_location(event) -> str:
     return "—"
 
 
-def build_ticket_pdf(reg) -> bytes:
+def _poster_name(event) -> str:
+    # usa a miniatura do tamanho do slot quando existe (ver events.images)
+    return (event.poster_variants or {}).get("pdf") or (event.poster.name if event.poster else "")
+
+
+# Paleta
+INK = colors.HexColor("#0B0B0B")
+MUTED = colors.HexColor("#444444")
+PAPER = colors.white
+BRAND = colors.HexColor("#C98B56")
+
+TERMS = [
+    "1. O ingresso é pessoal e válido apenas para o evento descrito.",
+    "2. O acesso ao evento depende da confirmação de pagamento e validação no check-in.",
+    "3. Guarde este PDF/QR para apresentação na entrada.",
+    "4. Em caso de cancelamento do evento, a política aplicável será comunicada pelo organizador.",
+    "5. Os dados pessoais recolhidos são usados apenas para gestão de inscrições e controlo de acesso.",
+]
+
+
+class TicketLayout:
     """
-    Gera PDF A4 do ingresso (EventRegistration).
+    Geometria e textos do evento, calculados uma vez e reutilizados em todas as
+    páginas (tickets) do mesmo evento. Tudo o que não depende da inscrição vai
+    para um form XObject, definido uma vez por documento e carimbado por página.
     """
-    event = reg.event
 
-    # Paleta
-    INK = colors.HexColor("#0B0B0B")
-    MUTED = colors.HexColor("#444444")
-    PAPER = colors.white
-    BRAND = colors.HexColor("#C98B56")
+    def __init__(self, event):
+        self.event = event
+        W, H = A4
+        self.W, self.H = W, H
+
+        self.band_h = 72 * mm
+        self.band_y = H - self.band_h - 20 * mm
+        self.band_x = 18 * mm
+        self.band_w = W - 36 * mm
+
+        self.pad = 8 * mm
+        self.qr_size = 45 * mm
+        self.qr_x = self.band_x + self.pad
+        self.qr_y = self.band_y + (self.band_h - self.qr_size) / 2
+
+        self.poster_w = 20 * mm
+        self.poster_h = 35 * mm
+        self.poster_x = self.band_x + self.band_w - self.pad - self.poster_w
+        self.poster_y = self.band_y + (self.band_h - self.poster_h) / 2
+        self.poster_path = default_storage.path(_poster_name(event)) if _poster_name(event) else ""
+
+        text_x = self.qr_x + self.qr_size + 10 * mm
+        text_right_limit = self.poster_x - 8 * mm
+        col_w = (text_right_limit - text_x) / 2
+
+        self.left_col_x = text_x
+        self.right_col_x = text_x + col_w + 6 * mm
+        self.top_line_y = self.band_y + self.band_h - 16 * mm
+        self.gap = 14 * mm
+        self.price_y = self.band_y + 12 * mm
+
+        start_local = timezone.localtime(event.start_at)
+        self.start_str = start_local.strftime("%d-%m-%Y %H:%M")
+        self.title = (event.title or "")[:32]
+        self.city = getattr(event, "get_city_display", lambda: str(event.city))()
+        self.location = _event_location(event)[:32]
+
+        price = getattr(event, "price", 0) or 0
+        currency = getattr(event, "currency", "MZN")
+        self.price_str = f"{price:,.2f} {currency}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+        self.form_name = f"ticket-{event.pk or id(event)}"
+        self._form_canvas = None
+
+    def stamp_static(self, c):
+        """Desenha a parte fixa da página (definindo o form na 1ª vez neste canvas)."""
+        if self._form_canvas is not c:
+            c.beginForm(self.form_name, 0, 0, self.W, self.H)
+            _draw_static(c, self)
+            c.endForm()
+            self._form_canvas = c
+        c.doForm(self.form_name)
+
+
+def _draw_pair(c, label, value, cx, cy):
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(cx, cy, label)
+    c.setFont("Helvetica", 9)
+    c.drawString(cx, cy - 11, value)
 
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    W, H = A4
+
+def _draw_static(c, L: TicketLayout):
+    W, H = L.W, L.H
 
     # fundo
     c.setFillColor(PAPER)
     c.rect(0, 0, W, H, stroke=0, fill=1)
 
     # ====== TICKET BAND ======
-    band_h = 72 * mm
-    band_y = H - band_h - 20 * mm
-    band_x = 18 * mm
-    band_w = W - 36 * mm
-
     c.setFillColor(BRAND)
-    c.roundRect(band_x, band_y, band_w, band_h, 0, stroke=0, fill=1)
-
-    pad = 8 * mm
-    qr_size = 45 * mm
-    qr_x = band_x + pad
-    qr_y = band_y + (band_h - qr_size) / 2
+    c.roundRect(L.band_x, L.band_y, L.band_w, L.band_h, 0, stroke=0, fill=1)
 
     # caixa branca do QR
     c.setFillColor(colors.white)
-    c.roundRect(qr_x - 5, qr_y - 5, qr_size + 10, qr_size + 10, 0, stroke=0, fill=1)
-
-    # QR: recomendo usar ticket_code puro ou URL de validação
-    # Ex: https://runwithbroto.co.mz/t/<ticket_code>
-    qr_value = f"RWB|{reg.ticket_code}"
-    _draw_qr(c, qr_value, qr_x, qr_y, qr_size)
+    c.roundRect(L.qr_x - 5, L.qr_y - 5, L.qr_size + 10, L.qr_size + 10, 0, stroke=0, fill=1)
 
     # Poster (direita)
-    poster_w = 20 * mm
-    poster_h = 35 * mm
-    poster_x = band_x + band_w - pad - poster_w
-    poster_y = band_y + (band_h - poster_h) / 2
-
-    if getattr(event, "poster", None) and getattr(event.poster, "path", None):
+    if L.poster_path:
         try:
             c.drawImage(
-                event.poster.path,
-                poster_x + 2,
-                poster_y + 2,
-                poster_w - 4,
-                poster_h - 4,
+                L.poster_path,
+                L.poster_x + 2,
+                L.poster_y + 2,
+                L.poster_w - 4,
+                L.poster_h - 4,
                 preserveAspectRatio=True,
                 anchor="c",
                 mask="auto",
             )
         except Exception:
             c.setFillColor(colors.HexColor("#f3f3f3"))
-            c.rect(poster_x + 2, poster_y + 2, poster_w - 4, poster_h - 4, stroke=0, fill=1)
+            c.rect(L.poster_x + 2, L.poster_y + 2, L.poster_w - 4, L.poster_h - 4, stroke=0, fill=1)
             c.setFillColor(MUTED)
             c.setFont("Helvetica", 8)
-            c.drawCentredString(poster_x + poster_w / 2, poster_y + poster_h / 2, "POSTER")
-
-    # textos (centro)
-    text_x = qr_x + qr_size + 10 * mm
-    text_right_limit = poster_x - 8 * mm
-    col_w = (text_right_limit - text_x) / 2
-
-    def draw_pair(label, value, cx, cy):
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(cx, cy, label)
-        c.setFont("Helvetica", 9)
-        c.drawString(cx, cy - 11, value)
-
-    start_local = timezone.localtime(event.start_at)
-    start_str = start_local.strftime("%d-%m-%Y %H:%M")
-
-    left_col_x = text_x
-    right_col_x = text_x + col_w + 6 * mm
-    top_line_y = band_y + band_h - 16 * mm
-    gap = 14 * mm
+            c.drawCentredString(L.poster_x + L.poster_w / 2, L.poster_y + L.poster_h / 2, "POSTER")
 
     # esquerda (evento)
-    draw_pair("EVENTO", (event.title or "")[:32], left_col_x, top_line_y)
-    draw_pair("CIDADE", getattr(event, "get_city_display", lambda: str(event.city))(), left_col_x, top_line_y - gap)
-    draw_pair("LOCAL", _event_location(event)[:32], left_col_x, top_line_y - 2 * gap)
-    draw_pair("DATA / HORA", start_str, left_col_x, top_line_y - 3 * gap)
+    _draw_pair(c, "EVENTO", L.title, L.left_col_x, L.top_line_y)
+    _draw_pair(c, "CIDADE", L.city, L.left_col_x, L.top_line_y - L.gap)
+    _draw_pair(c, "LOCAL", L.location, L.left_col_x, L.top_line_y - 2 * L.gap)
+    _draw_pair(c, "DATA / HORA", L.start_str, L.left_col_x, L.top_line_y - 3 * L.gap)
 
-    # direita (participante)
-    draw_pair("NOME", (reg.full_name or "")[:32], right_col_x, top_line_y)
-    draw_pair("TIPO", "ENTRADA", right_col_x, top_line_y - gap)
-    draw_pair("TICKET", str(reg.ticket_code)[:32], right_col_x, top_line_y - 2 * gap)
+    # direita: só os rótulos, os valores são da inscrição
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(L.right_col_x, L.top_line_y, "NOME")
+    c.drawString(L.right_col_x, L.top_line_y - 2 * L.gap, "TICKET")
+    _draw_pair(c, "TIPO", "ENTRADA", L.right_col_x, L.top_line_y - L.gap)
 
     # preço
-    price_y = band_y + 12 * mm
     c.setFillColor(colors.white)
     c.setFont("Helvetica-Bold", 9)
-    c.drawString(right_col_x, price_y + 10, "PRECO")
+    c.drawString(L.right_col_x, L.price_y + 10, "PRECO")
     c.setFont("Helvetica", 9)
-
-    price = getattr(event, "price", 0)
-    currency = getattr(event, "currency", "MZN")
-    price_str = f"{price:,.2f} {currency}".replace(",", "X").replace(".", ",").replace("X", ".")
-    c.drawString(right_col_x, price_y, price_str)
+    c.drawString(L.right_col_x, L.price_y, L.price_str)
 
     # footer logo
     c.setFillColor(MUTED)
     c.setFont("Helvetica", 9)
-    c.drawCentredString(W / 2, band_y - 10 * mm, "Powered by RunWithBroto")
+    c.drawCentredString(W / 2, L.band_y - 10 * mm, "Powered by RunWithBroto")
 
     # ====== Termos ======
-    tc_top = band_y - 22 * mm
+    tc_top = L.band_y - 22 * mm
     c.setFillColor(INK)
     c.setFont("Helvetica-Bold", 10)
     c.drawCentredString(W / 2, tc_top, "TERMOS E CONDIÇÕES")
 
-    terms = [
-        "1. O ingresso é pessoal e válido apenas para o evento descrito.",
-        "2. O acesso ao evento depende da confirmação de pagamento e validação no check-in.",
-        "3. Guarde este PDF/QR para apresentação na entrada.",
-        "4. Em caso de cancelamento do evento, a política aplicável será comunicada pelo organizador.",
-        "5. Os dados pessoais recolhidos são usados apenas para gestão de inscrições e controlo de acesso.",
-    ]
-
     c.setFillColor(MUTED)
     c.setFont("Helvetica", 8.5)
 
     x = 22 * mm
     y = tc_top - 10 * mm
     line_h = 5.2 * mm
-    for t in terms:
+    for t in TERMS:
         c.drawString(x, y, t)
         y -= line_h
 
-    c.showPage()
-    c.save()
+
+def draw_ticket_page(c, reg, layout: TicketLayout):
+    """
+    Desenha um ingresso na página atual do canvas (sem showPage): carimba a
+    parte fixa do evento e escreve só os campos da inscrição.
+    """
+    L = layout
+    L.stamp_static(c)
+
+    # QR: token assinado, validável offline no check-in (events.tickets)
+    _draw_qr(c, ticket_token(reg), L.qr_x, L.qr_y, L.qr_size)
+
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica", 9)
+    c.drawString(L.right_col_x, L.top_line_y - 11, (reg.full_name or "")[:32])
+    c.drawString(L.right_col_x, L.top_line_y - 2 * L.gap - 11, str(reg.ticket_code)[:32])
+
+
+def build_ticket_pdf(reg) -> bytes:
+    """
+    Gera PDF A4 do ingresso (EventRegistration).
+    """
+    buf = BytesIO()
+    with timed("pdf"):
+        c = TicketCanvas(buf)
+
+        draw_ticket_page(c, reg, TicketLayout(reg.event))
+
+        c.showPage()
+        c.save()
 
     pdf = buf.getvalue()
     buf.close()
-    return pdf
\ No newline at end of file
+    return pdf
+
+
+def write_tickets_pdf(registrations, fileobj) -> int:
+    """
+    Escreve um único PDF (uma página por ingresso) em `fileobj`.
+    O layout de cada evento é calculado uma vez; devolve o nº de páginas.
+    O canvas guarda todas as páginas em memória até ao save(): a memória cresce com
+    o nº de ingressos (ver TICKETS_PDF_MAX no admin).
+    """
+    c = TicketCanvas(fileobj)
+    layouts = {}
+    pages = 0
+
+    for reg in registrations:
+        layout = layouts.get(reg.event_id)
+        if layout is None:
+            layout = layouts[reg.event_id] = TicketLayout(reg.event)
+        draw_ticket_page(c, reg, layout)
+        c.showPage()
+        pages += 1
+
+    c.save()
+    return pages
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Destino não-seekable para o ZipFile: acumula bytes até serem consumidos."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_tickets_zip(registrations):
+    """
+    Gera um ZIP (um PDF por ingresso) em pedaços, para StreamingHttpResponse.
+    Usa/aquece a cache de PDFs (get_ticket_pdf).
+    """
+    out = _ChunkWriter()
+    storage = storages["tickets"]
+    # PDFs já vêm comprimidos
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for reg in registrations:
+            with storage.open(get_ticket_pdf(reg), "rb") as f:
+                zf.writestr(f"ticket-{reg.ticket_code}.pdf", f.read())
+            yield out.pop()
+    yield out.pop()
+
+
+def ticket_pdf_version(reg) -> str:
+    """
+    Hash dos campos do evento/inscrição (e do poster) que aparecem no PDF.
+    """
+    event = reg.event
+    poster = _poster_name(event)
+    parts = [
+        TICKET_LAYOUT_VERSION,
+        ticket_token(reg),
+        reg.full_name,
+        event.title,
+        event.city,
+        _event_location(event),
+        event.start_at.isoformat(),
+        str(event.price),
+        poster,
+    ]
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:16]
+
+
+def ticket_pdf_name(reg) -> str:
+    return f"{reg.ticket_code}/{ticket_pdf_version(reg)}.pdf"
+
+
+def get_ticket_pdf(reg) -> str:
+    """
+    Devolve o nome (no storage "tickets") do PDF do ingresso, gerando-o só se
+    ainda não existir para a versão atual do evento/inscrição.
+    """
+    storage = storages["tickets"]
+    name = ticket_pdf_name(reg)
+    if storage.exists(name):
+        return name
+
+    started = timezone.now()
+    saved = storage.save(name, ContentFile(build_ticket_pdf(reg)))
+    if saved != name:
+        # outro worker gerou o mesmo ficheiro entretanto
+        storage.delete(saved)
+
+    # remove as versões gravadas antes deste render começar: uma gravada entretanto pode
+    # ser de um render em paralelo com dados mais recentes (e seria a versão atual)
+    _, files = storage.listdir(reg.ticket_code)
+    for filename in files:
+        old = f"{reg.ticket_code}/{filename}"
+        if old != name and storage.get_modified_time(old) < started:
+            storage.delete(old)
+
+    return name
@@ -0,0 +1,129 @@
+"""
+Geração de eventos recorrentes (ex.: todas as Weekly Runs da época), com os slugs
+alocados de uma vez e um só bulk_create:
+- occurrences/create_events: cópias de um evento-modelo (generate_recurring_events)
+- materialize_series: os Event de cada EventSeries para as próximas semanas (materialize_series)
+"""
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import schedule
+from .models import SLUG_ATTEMPTS, Event, EventSeries, allocate_slugs
+
+# campos que não passam do modelo para as cópias
+SKIP_FIELDS = {"id", "slug", "start_at", "seats_taken", "poster_variants", "series_id", "created_at"}
+
+
+def occurrences(template: Event, *, until: datetime, start: datetime | None = None,
+                every_weeks: int = 1, cities: list[str] | None = None) -> list[Event]:
+    """
+    Cópias (por gravar) do evento-modelo, de `every_weeks` em `every_weeks` semanas
+    a partir da semana seguinte ao modelo (ou de `start`) até `until`, em cada cidade.
+    As datas que já têm um evento com o mesmo título e cidade são saltadas.
+    """
+    step = timedelta(weeks=every_weeks)
+    first = template.start_at + step
+    if start is not None:
+        while first < start:
+            first += step
+
+    dates = []
+    when = first
+    while when <= until:
+        dates.append(when)
+        when += step
+
+    cities = cities or [template.city]
+    existing = set(
+        Event.objects
+        .filter(title=template.title, city__in=cities, start_at__in=dates)
+        .values_list("city", "start_at")
+    )
+
+    fields = [f.attname for f in Event._meta.concrete_fields if f.attname not in SKIP_FIELDS]
+    events = []
+    for city in cities:
+        for when in dates:
+            if (city, when) in existing:
+                continue
+            event = Event(**{name: getattr(template, name) for name in fields})
+            event.city = city
+            event.start_at = when
+            events.append(event)
+    return events
+
+
+def create_events(events: list[Event], batch_size: int = 500) -> list[Event]:
+    """
+    Grava os eventos num só passo: slugs por allocate_slugs (uma query) e bulk_create.
+    Não corre Event.save(): as variantes do poster geram-se depois com build_poster_variants.
+    """
+    if not events:
+        return []
+
+    auto = [e for e in events if not e.slug]
+    for attempt in range(1, SLUG_ATTEMPTS + 1):
+        for event, slug in zip(auto, allocate_slugs([e.title for e in auto])):
+            event.slug = slug
+        try:
+            with transaction.atomic():
+                created = Event.objects.bulk_create(events, batch_size=batch_size)
+                # bulk_create não envia post_save
+                transaction.on_commit(schedule.invalidate)
+            return created
+        except IntegrityError:
+            if attempt == SLUG_ATTEMPTS or not auto:
+                raise
+
+
+def materialize_series(series: EventSeries, horizon: timedelta, now: datetime | None = None) -> int:
+    """
+    Cria os Event da série em falta até now + horizon e avança materialized_until.
+    Idempotente: as datas que já têm Event (constraint series+start_at) são saltadas,
+    e as datas antes de materialized_until não voltam a ser criadas (ex.: uma semana
+    cancelada apagando o Event). Devolve o número de eventos criados por esta chamada.
+    Os Event já criados não são alterados se a série for editada depois.
+    """
+    now = now or timezone.now()
+    until = now + horizon
+
+    with transaction.atomic():
+        # lock na série: materializações paralelas da mesma série esperam umas pelas
+        # outras, por isso as linhas que aparecem abaixo são as desta chamada
+        series.materialized_until = (
+            EventSeries.objects.select_for_update().values_list("materialized_until", flat=True).get(pk=series.pk)
+        )
+        dates = series.occurrences(series.pending_after(now), until)
+
+        before = None
+        for attempt in range(1, SLUG_ATTEMPTS + 2):
+            existing = set(
+                Event.objects.filter(series=series, start_at__in=dates).values_list("start_at", flat=True)
+            )
+            if before is None:
+                before = len(existing)
+            missing = [when for when in dates if when not in existing]
+            if not missing:
+                break
+            if attempt > SLUG_ATTEMPTS:
+                raise IntegrityError(f"Não foi possível criar {len(missing)} ocorrência(s) da série {series.pk}.")
+
+            events = [series.build_event(when) for when in missing]
+            for event, slug in zip(events, allocate_slugs([e.title for e in events])):
+                event.slug = slug
+            # um slug apanhado entretanto (outro evento com o mesmo título) só salta a
+            # linha; a volta seguinte confirma o que ficou gravado
+            Event.objects.bulk_create(events, ignore_conflicts=True)
+        created = len(dates) - before
+
+        EventSeries.objects.filter(pk=series.pk).filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=until)
+        ).update(materialized_until=until)
+        # bulk_create e update não enviam post_save
+        transaction.on_commit(schedule.invalidate)
+
+    series.materialized_until = max(until, series.materialized_until or until)
+    return created
@@ -0,0 +1,110 @@
+"""
+Fila de pré-geração dos PDFs dos ingressos (TicketRenderJob).
+
+O comando render_tickets reclama lotes de jobs e gera os PDFs num ProcessPoolExecutor
+(o ReportLab é CPU-bound e não larga o GIL). Os modelos são importados dentro das
+funções: este módulo também é carregado pelos processos do pool antes do django.setup().
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# tentativas antes de um job ficar FAILED
+MAX_ATTEMPTS = 3
+# um job RUNNING há mais do que isto é de um worker que morreu
+STALE_AFTER = timedelta(minutes=10)
+# pausa depois da 1.ª falha; dobra a cada tentativa
+RETRY_BACKOFF = timedelta(seconds=30)
+
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+def claim_jobs(batch_size: int = 20) -> list[int]:
+    """
+    Marca como RUNNING até `batch_size` jobs pendentes (ou esquecidos por um worker
+    que morreu) e devolve os ids. Jobs que falharam só voltam depois do next_attempt_at.
+    Com Postgres, vários workers podem correr em paralelo.
+    """
+    from .models import RenderStatus, TicketRenderJob
+
+    now = timezone.now()
+    due = Q(status=RenderStatus.PENDING) & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+    with transaction.atomic():
+        ids = list(
+            TicketRenderJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(due | Q(status=RenderStatus.RUNNING, updated_at__lt=now - STALE_AFTER))
+            .order_by("updated_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if ids:
+            TicketRenderJob.objects.filter(id__in=ids).update(
+                status=RenderStatus.RUNNING, attempts=F("attempts") + 1, updated_at=now
+            )
+    return ids
+
+
+def render_job(job_id: int) -> str:
+    """
+    Gera (ou reaproveita) o PDF do job e grava o resultado. Corre num processo do pool.
+    Devolve o estado final do job.
+    """
+    from .models import PaymentStatus, RegistrationStatus, RenderStatus, TicketRenderJob
+    from .pdfs import get_ticket_pdf
+
+    job = TicketRenderJob.objects.select_related("registration__event").get(pk=job_id)
+    reg = job.registration
+    # só atualiza se ninguém voltou a pôr o job na fila entretanto
+    running = TicketRenderJob.objects.filter(pk=job_id, status=RenderStatus.RUNNING)
+
+    if reg.payment_status != PaymentStatus.PAID or reg.status != RegistrationStatus.ACTIVE:
+        running.update(status=RenderStatus.DONE, error="Inscrição não está paga.", updated_at=timezone.now())
+        return RenderStatus.DONE
+
+    started = time.perf_counter()
+    try:
+        name = get_ticket_pdf(reg)
+    except Exception as e:
+        logger.exception("Ticket render failed: registration=%s", reg.pk)
+        now = timezone.now()
+        if job.attempts >= MAX_ATTEMPTS:
+            status, next_attempt_at = RenderStatus.FAILED, None
+        else:
+            status, next_attempt_at = RenderStatus.PENDING, now + RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        running.update(
+            status=status, error=f"{e.__class__.__name__}: {e}", next_attempt_at=next_attempt_at, updated_at=now
+        )
+        return status
+
+    running.update(
+        status=RenderStatus.DONE,
+        pdf_name=name,
+        error="",
+        next_attempt_at=None,
+        render_ms=int((time.perf_counter() - started) * 1000),
+        updated_at=timezone.now(),
+    )
+    return RenderStatus.DONE
+
+
+def enqueue_missing() -> int:
+    """Põe na fila os ingressos pagos que ainda não têm job (ex.: inscrições anteriores à fila)."""
+    from .models import PaymentStatus, RegistrationStatus, EventRegistration, TicketRenderJob
+
+    ids = list(
+        EventRegistration.objects
+        .filter(payment_status=PaymentStatus.PAID, status=RegistrationStatus.ACTIVE, render_job__isnull=True)
+        .values_list("id", flat=True)
+    )
+    TicketRenderJob.enqueue(ids)
+    return len(ids)
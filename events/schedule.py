@@ -0,0 +1,99 @@
+"""
+Cache do schedule (event_list / core:home).
+
+O fragmento HTML da lista é guardado por combinação de filtros (city/type) junto com
+ETag e Last-Modified. As entradas ficam presas a uma "versão" global que muda quando
+um Event é gravado/apagado (ver signals), e expiram sozinhas quando o próximo evento
+da lista começa (deixa de ser upcoming).
+
+Depois dos Event já criados, a lista mostra as próximas datas das EventSeries como
+ocorrências virtuais (Event por gravar, sem link), até SERIES_PREVIEW_WEEKS semanas.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Event, EventSeries
+
+VERSION_KEY = "events:schedule:version"
+
+
+def _version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = f"{time.time():.6f}"
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate():
+    cache.set(VERSION_KEY, f"{time.time():.6f}", timeout=None)
+
+
+def upcoming_events(city: str = "", etype: str = ""):
+    qs = Event.objects.filter(is_published=True, start_at__gte=timezone.now()).order_by("start_at")
+    if city:
+        qs = qs.filter(city=city)
+    if etype:
+        qs = qs.filter(event_type=etype)
+    return qs
+
+
+def virtual_occurrences(city: str = "", etype: str = "") -> list[Event]:
+    """
+    Ocorrências futuras das séries ativas que ainda não são Event (depois de
+    materialized_until). Uma query, sem gravar nada.
+    """
+    now = timezone.now()
+    until = now + timedelta(weeks=settings.SERIES_PREVIEW_WEEKS)
+    qs = EventSeries.objects.filter(is_active=True, is_published=True)
+    if city:
+        qs = qs.filter(city=city)
+    if etype:
+        qs = qs.filter(event_type=etype)
+
+    return [
+        series.build_event(when)
+        for series in qs
+        for when in series.occurrences(series.pending_after(now), until)
+    ]
+
+
+def get_schedule(city: str = "", etype: str = "") -> dict:
+    """
+    Devolve {"html", "etag", "last_modified"} para os filtros dados.
+    Em cache quente não faz nenhuma query.
+    """
+    version = _version()
+    key = f"events:schedule:{version}:{city or '-'}:{etype or '-'}"
+
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    events = list(upcoming_events(city, etype))
+    events += virtual_occurrences(city, etype)
+    events.sort(key=lambda e: e.start_at)
+    html = render_to_string("events/includes/agenda_list.html", {"events": events})
+
+    entry = {
+        "html": html,
+        "etag": '"%s"' % hashlib.md5(f"{key}:{html}".encode("utf-8")).hexdigest(),
+        # a versão é o instante da última alteração de um Event
+        "last_modified": int(float(version)),
+    }
+
+    timeout = settings.SCHEDULE_CACHE_TTL
+    if events:
+        # o primeiro evento sai da lista quando começa
+        until_start = (events[0].start_at - timezone.now()).total_seconds()
+        timeout = max(1, min(timeout, int(until_start) + 1))
+
+    cache.set(key, entry, timeout=timeout)
+    return entry
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import schedule
+from .models import Event, EventRegistration, EventSeries, RegistrationStatus
+
+
+@receiver(post_delete, sender=EventRegistration)
+def release_seat_on_delete(sender, instance, **kwargs):
+    # corre dentro da transação do delete (inclusive no "delete selected" do admin)
+    if instance.status != RegistrationStatus.CANCELLED:
+        Event.adjust_seats(instance.event_id, -1)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventSeries)
+@receiver(post_delete, sender=EventSeries)
+def invalidate_schedule(sender, instance, **kwargs):
+    # só depois do commit, para ninguém voltar a pôr em cache o estado antigo
+    transaction.on_commit(schedule.invalidate)
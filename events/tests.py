@@ -1,3 +1,481 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from reportlab import rl_config
+
+from payments.models import Payment, PaymentStatus as PayPaymentStatus
+
+from . import schedule
+from .exports import iter_registrations_csv
+from .models import (
+    City, Event, EventRegistration, EventSeries, EventSoldOut, EventType, PaymentStatus, RegistrationStatus,
+    RenderStatus, TicketRenderJob, allocate_slugs,
+)
+from .pdfs import build_ticket_pdf, get_ticket_pdf, ticket_pdf_name, ticket_pdf_version
+from .recurrence import materialize_series
+from .rendering import RETRY_BACKOFF, claim_jobs, render_job
+
+
+def make_event(capacity=10, **kwargs) -> Event:
+    defaults = dict(
+        title="Weekly Run",
+        city=City.MAPUTO,
+        event_type=EventType.WEEKLY,
+        start_at=timezone.now() + timedelta(days=3),
+        meeting_point="Marginal",
+        price=Decimal("500.00"),
+        capacity=capacity,
+    )
+    defaults.update(kwargs)
+    return Event.objects.create(**defaults)
+
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "events-tests"}}
+
+
+def make_registration(event, **kwargs) -> EventRegistration:
+    kwargs.setdefault("full_name", "Ana Sitoe")
+    kwargs.setdefault("phone", "841234567")
+    return EventRegistration.objects.create(event=event, **kwargs)
+
+
+def expire_hold(reg):
+    """Como o release_expired_holds: cancela e liberta o lugar, sem limpar a reserva."""
+    EventRegistration.objects.filter(pk=reg.pk).update(
+        status=RegistrationStatus.CANCELLED, hold_expires_at=timezone.now() - timedelta(minutes=1)
+    )
+    Event.adjust_seats(reg.event_id, -1)
+    return EventRegistration.objects.get(pk=reg.pk)
+
+
+class SeatTests(TestCase):
+    def test_claim_seat_stops_at_capacity(self):
+        event = make_event(capacity=2)
+        self.assertTrue(Event.claim_seat(event.pk))
+        self.assertFalse(Event.claim_seat(event.pk, 2))
+        self.assertTrue(Event.claim_seat(event.pk))
+        self.assertFalse(Event.claim_seat(event.pk))
+        event.refresh_from_db()
+        self.assertEqual(event.seats_taken, 2)
+
+    def test_registration_beyond_capacity_is_sold_out(self):
+        event = make_event(capacity=1)
+        make_registration(event)
+        with self.assertRaises(EventSoldOut):
+            make_registration(event, phone="841111111")
+        self.assertEqual(event.registrations.count(), 1)
+
+    def test_admin_edit_keeps_seats_claimed_meanwhile(self):
+        event = make_event(capacity=2)
+        request = RequestFactory().post("/")
+        request.user = User.objects.create_superuser("admin", "admin@example.com", "pass")
+        model_admin = site._registry[Event]
+
+        loaded = Event.objects.get(pk=event.pk)
+        start = timezone.localtime(loaded.start_at)
+        form = model_admin.get_form(request, loaded)({
+            "title": loaded.title, "slug": loaded.slug, "city": loaded.city, "event_type": loaded.event_type,
+            "start_at_0": start.strftime("%Y-%m-%d"), "start_at_1": start.strftime("%H:%M:%S"),
+            "meeting_point": loaded.meeting_point, "price": "500.00", "capacity": 3, "is_published": "on",
+        }, instance=loaded)
+        self.assertTrue(form.is_valid(), form.errors)
+        # uma inscrição entra enquanto o admin tem o formulário aberto
+        self.assertTrue(Event.claim_seat(event.pk))
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        event.refresh_from_db()
+        self.assertEqual((event.capacity, event.seats_taken), (3, 1))
+
+    def test_counter_follows_cancel_reactivate_and_delete(self):
+        event = make_event()
+        reg = make_registration(event)
+        make_registration(event, phone="841111111")
+
+        reg.status = RegistrationStatus.CANCELLED
+        reg.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_taken, 1)
+        reg.status = RegistrationStatus.ACTIVE
+        reg.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_taken, 2)
+        reg.delete()
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_taken, 1)
+
+    def test_reconcile_seats_fixes_drift(self):
+        event = make_event()
+        make_registration(event)
+        Event.objects.filter(pk=event.pk).update(seats_taken=7)
+        call_command("reconcile_seats", stdout=StringIO())
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_taken, 1)
+
+    def test_sweeper_releases_only_unpaid_expired_holds(self):
+        event = make_event()
+        past = timezone.now() - timedelta(minutes=1)
+        expired = make_registration(event, hold_expires_at=past)
+        paid = make_registration(event, phone="841111111", hold_expires_at=past, payment_status=PaymentStatus.PAID)
+        held = make_registration(event, phone="842222222", hold_expires_at=timezone.now() + timedelta(minutes=5))
+
+        call_command("release_expired_holds", stdout=StringIO())
+        statuses = dict(EventRegistration.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[expired.pk], RegistrationStatus.CANCELLED)
+        self.assertEqual(statuses[paid.pk], RegistrationStatus.ACTIVE)
+        self.assertEqual(statuses[held.pk], RegistrationStatus.ACTIVE)
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_taken, 2)
+        # mantém a reserva: é o que permite recuperar o lugar num pagamento tardio
+        self.assertIsNotNone(EventRegistration.objects.get(pk=expired.pk).hold_expires_at)
+
+    def test_mark_paid_revives_expired_hold_when_there_is_room(self):
+        event = make_event(capacity=1)
+        reg = expire_hold(make_registration(event))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reg.mark_paid()
+        reg.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual((reg.status, reg.payment_status), (RegistrationStatus.ACTIVE, PaymentStatus.PAID))
+        self.assertFalse(reg.needs_refund)
+        self.assertEqual(event.seats_taken, 1)
+        self.assertTrue(TicketRenderJob.objects.filter(registration=reg).exists())
+
+    def test_mark_paid_on_expired_hold_without_room_flags_refund(self):
+        event = make_event(capacity=1)
+        reg = expire_hold(make_registration(event))
+        make_registration(event, phone="841111111")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reg.mark_paid()
+        reg.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(reg.status, RegistrationStatus.CANCELLED)
+        self.assertTrue(reg.needs_refund)
+        self.assertEqual(event.seats_taken, 1)
+        self.assertFalse(TicketRenderJob.objects.filter(registration=reg).exists())
+
+    def test_mark_paid_does_not_revive_manual_cancellation(self):
+        event = make_event()
+        reg = make_registration(event, hold_expires_at=timezone.now() + timedelta(minutes=15))
+        reg.status = RegistrationStatus.CANCELLED
+        reg.save(update_fields=["status"])
+        self.assertIsNone(reg.hold_expires_at)
+
+        reg.mark_paid()
+        reg.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(reg.status, RegistrationStatus.CANCELLED)
+        self.assertTrue(reg.needs_refund)
+        self.assertEqual(event.seats_taken, 0)
+
+
+class CodeAllocationTests(TestCase):
+    def test_slugs_for_repeated_titles(self):
+        make_event(title="Run 2024")
+        self.assertEqual(allocate_slugs(["Run", "Run", "Weekly Run"]), ["run", "run-2025", "weekly-run"])
+
+    def test_slug_taken_between_allocation_and_insert_is_retried(self):
+        make_event()
+        with mock.patch("events.models.allocate_slugs", side_effect=[["weekly-run"], ["weekly-run-2"]]) as alloc:
+            event = make_event()
+        self.assertEqual(alloc.call_count, 2)
+        self.assertEqual(event.slug, "weekly-run-2")
+
+    def test_ticket_code_collision_is_retried_without_taking_two_seats(self):
+        event = make_event()
+        taken = make_registration(event).ticket_code
+        with mock.patch("events.models.generate_ticket_code", side_effect=[taken, "RWB-NEWCODE2"]):
+            reg = make_registration(event, phone="841111111")
+        self.assertEqual(reg.ticket_code, "RWB-NEWCODE2")
+        event.refresh_from_db()
+        self.assertEqual(event.seats_taken, 2)
+
+
+@override_settings(CACHES=LOCMEM)
+class ScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("events:event_list")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event = make_event(title="Sunrise 10K")
+
+    def test_matching_etag_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertContains(first, "Sunrise 10K")
+
+        again = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_warm_cache_skips_queries(self):
+        schedule.get_schedule()
+        with self.assertNumQueries(0):
+            schedule.get_schedule()
+
+    def test_saving_an_event_refreshes_the_list(self):
+        etag = self.client.get(self.url)["ETag"]
+        version = schedule._version()
+
+        self.event.title = "Sunset 10K"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+
+        self.assertNotEqual(schedule._version(), version)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Sunset 10K")
+        self.assertNotContains(response, "Sunrise 10K")
+
+    def test_deleting_an_event_refreshes_the_list(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        self.assertNotContains(self.client.get(self.url), "Sunrise 10K")
+
+    def test_saving_a_series_refreshes_the_list(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            series = EventSeries.objects.create(
+                title="Costa do Sol Loop",
+                city=City.MAPUTO,
+                first_start_at=timezone.now() + timedelta(days=1),
+                meeting_point="Marginal",
+            )
+        self.assertContains(self.client.get(self.url), "Costa do Sol Loop")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            series.delete()
+        self.assertNotContains(self.client.get(self.url), "Costa do Sol Loop")
+
+    def test_invalidation_waits_for_commit(self):
+        version = schedule._version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            make_event(title="Sunset 10K")
+        self.assertEqual(schedule._version(), version)
+        self.assertIn(schedule.invalidate, callbacks)
+
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.series = EventSeries.objects.create(
+            title="Wednesday Run",
+            city=City.MAPUTO,
+            first_start_at=self.now + timedelta(days=1),
+            meeting_point="Marginal",
+        )
+
+    def test_materialize_is_idempotent(self):
+        self.assertEqual(materialize_series(self.series, timedelta(weeks=4), now=self.now), 4)
+        self.assertEqual(materialize_series(self.series, timedelta(weeks=4), now=self.now), 0)
+        self.assertEqual(self.series.events.count(), 4)
+        self.assertEqual(len(set(self.series.events.values_list("slug", flat=True))), 4)
+
+    def test_counts_only_its_own_inserts(self):
+        # outra instância da mesma série (ex.: o comando e o admin ao mesmo tempo)
+        stale = EventSeries.objects.get(pk=self.series.pk)
+        materialize_series(self.series, timedelta(weeks=4), now=self.now)
+        self.assertEqual(materialize_series(stale, timedelta(weeks=5), now=self.now), 1)
+        self.assertEqual(self.series.events.count(), 5)
+
+    def test_editing_the_series_keeps_existing_events(self):
+        materialize_series(self.series, timedelta(weeks=2), now=self.now)
+        before = list(self.series.events.values_list("start_at", flat=True))
+
+        self.series.first_start_at += timedelta(hours=2)
+        self.series.every_weeks = 2
+        self.series.save()
+        materialize_series(self.series, timedelta(weeks=2), now=self.now)
+        self.assertEqual(list(self.series.events.values_list("start_at", flat=True)), before)
+
+
+class RenderQueueTests(TestCase):
+    def setUp(self):
+        reg = make_registration(make_event(), payment_status=PaymentStatus.PAID)
+        TicketRenderJob.enqueue([reg.pk])
+        self.job = TicketRenderJob.objects.get(registration=reg)
+
+    def test_claimed_job_is_not_claimed_again(self):
+        self.assertEqual(claim_jobs(), [self.job.pk])
+        self.assertEqual(claim_jobs(), [])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), (RenderStatus.RUNNING, 1))
+
+    def test_failed_job_waits_for_backoff(self):
+        claim_jobs()
+        with mock.patch("events.pdfs.get_ticket_pdf", side_effect=OSError("disk full")):
+            self.assertEqual(render_job(self.job.pk), RenderStatus.PENDING)
+        self.job.refresh_from_db()
+        self.assertGreaterEqual(self.job.next_attempt_at, self.job.updated_at + RETRY_BACKOFF)
+        self.assertEqual(claim_jobs(), [])
+
+        later = self.job.next_attempt_at + timedelta(seconds=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(claim_jobs(), [self.job.pk])
+
+    def test_requeue_clears_backoff(self):
+        TicketRenderJob.objects.filter(pk=self.job.pk).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+        TicketRenderJob.enqueue([self.job.registration_id])
+        self.assertEqual(claim_jobs(), [self.job.pk])
+
+
+class RegistrationsCsvTests(TestCase):
+    def test_formulas_are_exported_as_text(self):
+        event = make_event()
+        make_registration(event, full_name='=HYPERLINK("http://x")', phone="+258841234567")
+        make_registration(event, full_name="Rui Mabunda", phone="841111111")
+
+        csv = "".join(iter_registrations_csv())
+        self.assertTrue(csv.startswith("\ufeffticket_code,"))
+        self.assertIn('"\'=HYPERLINK(""http://x"")"', csv)
+        self.assertIn("'+258841234567", csv)
+        self.assertIn(",Rui Mabunda,841111111,", csv)
+
+
+class EventAdminTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.login(username="admin", password="pass")
+        self.event = make_event()
+        paid = make_registration(self.event, payment_status=PaymentStatus.PAID)
+        Payment.objects.create(
+            registration=paid, reference="R1", amount=Decimal("500.00"), status=PayPaymentStatus.PAID
+        )
+        # pagamento PAID numa inscrição cancelada (a reembolsar): não conta em "Pagos" nem na receita
+        refund = make_registration(self.event, phone="841111111", payment_status=PaymentStatus.PAID)
+        refund.status = RegistrationStatus.CANCELLED
+        refund.save(update_fields=["status"])
+        Payment.objects.create(
+            registration=refund, reference="R2", amount=Decimal("500.00"), status=PayPaymentStatus.PAID
+        )
+
+    def test_changelist_counts_and_revenue_agree(self):
+        # à espera de pagamento (reserva ativa)
+        make_registration(self.event, phone="843333333", hold_expires_at=timezone.now() + timedelta(minutes=10))
+        response = self.client.get(reverse("admin:events_event_changelist"))
+        [event] = response.context["cl"].result_list
+        self.assertEqual((event.paid_count, event.pending_count, event.cancelled_count), (1, 1, 1))
+        self.assertEqual(event.revenue, Decimal("500.00"))
+
+    def test_autocomplete_skips_aggregates(self):
+        url = reverse("admin:autocomplete")
+        params = {"app_label": "events", "model_name": "eventregistration", "field_name": "event", "term": "Weekly"}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual([r["id"] for r in response.json()["results"]], [str(self.event.pk)])
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "GROUP BY" in q["sql"]])
+
+    @override_settings(TICKETS_PDF_MAX=1)
+    def test_large_pdf_export_is_refused(self):
+        data = {"action": "export_tickets_pdf", "_selected_action": [self.event.pk]}
+        response = self.client.post(reverse("admin:events_event_changelist"), data)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+        make_registration(self.event, phone="842222222", payment_status=PaymentStatus.PAID)
+        response = self.client.post(reverse("admin:events_event_changelist"), data, follow=True)
+        self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+        self.assertContains(response, "2 tickets é demais para um só PDF")
+
+    def test_actions_run_without_aggregates(self):
+        data = {"action": "export_registrations_csv", "_selected_action": [self.event.pk]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("admin:events_event_changelist"), data)
+            body = b"".join(response.streaming_content).decode()
+        self.assertEqual(body.count("RWB-"), 2)
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "GROUP BY" in q["sql"]])
+
+
+class TicketPdfTests(TestCase):
+    def test_pdf_is_compressed_and_reproducible(self):
+        reg = make_registration(make_event(), payment_status=PaymentStatus.PAID)
+        with mock.patch.object(rl_config, "pageCompression", 0):
+            pdf = build_ticket_pdf(reg)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertIn(b"FlateDecode", pdf)
+        # invariant: a mesma versão do ingresso dá os mesmos bytes
+        self.assertEqual(build_ticket_pdf(reg), pdf)
+
+    def test_jpeg_poster_is_embedded_as_is(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        storage = {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": tmp.name}}
+        self.enterContext(override_settings(STORAGES={"default": storage}))
+
+        buf = BytesIO()
+        Image.new("RGB", (40, 70), "red").save(buf, "JPEG")
+        jpeg = buf.getvalue()
+        name = default_storage.save("events/posters/poster-pdf.jpg", ContentFile(jpeg))
+
+        pdf = build_ticket_pdf(make_registration(make_event(poster_variants={"pdf": name}), payment_status=PaymentStatus.PAID))
+        self.assertIn(jpeg, pdf)
+        self.assertIn(b"/Filter [ /DCTDecode ]", pdf)
+
+
+class StoredTicketPdfTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+            "tickets": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": tmp.name}},
+        }
+        self.enterContext(override_settings(STORAGES=storages))
+        self.reg = make_registration(make_event(), payment_status=PaymentStatus.PAID)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_version_follows_what_is_printed(self):
+        version = ticket_pdf_version(self.reg)
+        self.assertEqual(ticket_pdf_version(EventRegistration.objects.select_related("event").get(pk=self.reg.pk)), version)
+
+        self.reg.event.title = "Long Run"
+        self.assertNotEqual(ticket_pdf_version(self.reg), version)
+        self.reg.event.title = "Weekly Run"
+        self.reg.full_name = "Ana M. Sitoe"
+        self.assertNotEqual(ticket_pdf_version(self.reg), version)
+
+    def test_stored_pdf_is_reused(self):
+        name = get_ticket_pdf(self.reg)
+        self.assertEqual(name, ticket_pdf_name(self.reg))
+        with mock.patch("events.pdfs.build_ticket_pdf") as build:
+            self.assertEqual(get_ticket_pdf(self.reg), name)
+        build.assert_not_called()
+
+    def test_only_versions_older_than_the_render_are_removed(self):
+        old = get_ticket_pdf(self.reg)
+        an_hour_ago = timezone.now().timestamp() - 3600
+        os.utime(self.path(old), (an_hour_ago, an_hour_ago))
+
+        newer = f"{self.reg.ticket_code}/newer.pdf"
+
+        def parallel_render(reg):
+            # outro worker grava uma versão a meio deste render
+            with open(self.path(newer), "wb") as f:
+                f.write(b"%PDF")
+            # o mtime vem do relógio "coarse" do kernel: fixa-o depois do início do render
+            later = timezone.now().timestamp() + 1
+            os.utime(self.path(newer), (later, later))
+            return b"%PDF"
+
+        self.reg.event.title = "Long Run"
+        with mock.patch("events.pdfs.build_ticket_pdf", side_effect=parallel_render):
+            name = get_ticket_pdf(self.reg)
+
+        self.assertTrue(os.path.exists(self.path(name)))
+        self.assertTrue(os.path.exists(self.path(newer)))
+        self.assertFalse(os.path.exists(self.path(old)))
@@ -0,0 +1,143 @@
+"""
+Token assinado do QR dos ingressos e validação offline no check-in.
+
+Formato: RWB1:<ticket_code>:<event_id>:<assinatura>
+- assinatura = HMAC-SHA256(chave do evento, "<ticket_code>:<event_id>"), 10 bytes em base32
+- só maiúsculas, dígitos, "-" e ":" -> o QR usa o modo alfanumérico (mais compacto)
+
+Os ingressos emitidos antes do token assinado levam no QR "RWB|<ticket_code>"
+(LEGACY_PREFIX): continuam a ser aceites, procurados só pelo código, enquanto houver
+eventos com esses ingressos por realizar.
+
+Cada evento tem a sua chave, derivada de TICKET_SIGNING_KEY. O snapshot exportado
+para os dispositivos de check-in leva a chave do evento e os códigos válidos, por isso
+um dispositivo valida os ingressos desse evento sem rede e sem o segredo principal.
+OfflineValidator e verify_token só usam a biblioteca standard.
+"""
+import base64
+import hashlib
+import hmac
+import json
+
+TOKEN_PREFIX = "RWB1"
+LEGACY_PREFIX = "RWB|"
+SIGNATURE_BYTES = 10
+
+
+class InvalidTicketToken(ValueError):
+    pass
+
+
+def event_key(event_id: int) -> bytes:
+    from django.conf import settings
+    from django.utils.crypto import salted_hmac
+
+    return salted_hmac(
+        "events.tickets.event_key", str(event_id), secret=settings.TICKET_SIGNING_KEY, algorithm="sha256"
+    ).digest()
+
+
+def _signature(key: bytes, ticket_code: str, event_id: int) -> str:
+    digest = hmac.new(key, f"{ticket_code}:{event_id}".encode("ascii"), hashlib.sha256).digest()
+    return base64.b32encode(digest[:SIGNATURE_BYTES]).decode("ascii").rstrip("=")
+
+
+def make_token(ticket_code: str, event_id: int) -> str:
+    return f"{TOKEN_PREFIX}:{ticket_code}:{event_id}:{_signature(event_key(event_id), ticket_code, event_id)}"
+
+
+def ticket_token(reg) -> str:
+    """Conteúdo do QR do ingresso."""
+    return make_token(reg.ticket_code, reg.event_id)
+
+
+def parse_token(token: str) -> tuple[str, int, str]:
+    """Devolve (ticket_code, event_id, assinatura) sem verificar a assinatura."""
+    parts = (token or "").strip().upper().split(":")
+    if len(parts) != 4 or parts[0] != TOKEN_PREFIX or not parts[2].isdigit():
+        raise InvalidTicketToken("QR não é um ingresso RunWithBroto.")
+    return parts[1], int(parts[2]), parts[3]
+
+
+def legacy_code(token: str) -> str | None:
+    """ticket_code de um QR antigo (RWB|<ticket_code>), ou None se o formato for outro."""
+    token = (token or "").strip().upper()
+    if not token.startswith(LEGACY_PREFIX):
+        return None
+    code = token[len(LEGACY_PREFIX):]
+    if not code.startswith("RWB-"):
+        raise InvalidTicketToken("QR não é um ingresso RunWithBroto.")
+    return code
+
+
+def verify_token(token: str, key: bytes, event_id: int | None = None) -> str:
+    """
+    Verifica a assinatura com a chave do evento e devolve o ticket_code.
+    Levanta InvalidTicketToken se o token for inválido ou de outro evento.
+    """
+    ticket_code, token_event_id, signature = parse_token(token)
+    if event_id is not None and token_event_id != event_id:
+        raise InvalidTicketToken("Ingresso de outro evento.")
+    if not hmac.compare_digest(_signature(key, ticket_code, token_event_id), signature):
+        raise InvalidTicketToken("Assinatura inválida.")
+    return ticket_code
+
+
+def build_snapshot(event) -> dict:
+    """
+    Snapshot de check-in de um evento: chave do evento e ingressos válidos
+    (ativos e pagos) indexados pelo código, para lookup O(1) no dispositivo.
+    """
+    from django.utils import timezone
+
+    from .models import paid_registrations
+
+    tickets = {
+        code: name
+        for code, name in paid_registrations([event]).values_list("ticket_code", "full_name")
+    }
+    return {
+        "version": 1,
+        "event": {"id": event.pk, "slug": event.slug, "title": event.title, "start_at": event.start_at.isoformat()},
+        "generated_at": timezone.now().isoformat(),
+        "key": base64.b64encode(event_key(event.pk)).decode("ascii"),
+        "tickets": tickets,
+    }
+
+
+class OfflineValidator:
+    """
+    Validação no dispositivo a partir de um snapshot: assinatura, evento, lista de
+    ingressos válidos e entradas repetidas (neste dispositivo).
+    """
+
+    OK = "ok"
+    INVALID = "invalid"
+    UNKNOWN = "unknown"
+    DUPLICATE = "duplicate"
+
+    def __init__(self, snapshot: dict):
+        self.event_id = snapshot["event"]["id"]
+        self.key = base64.b64decode(snapshot["key"])
+        self.tickets = snapshot["tickets"]
+        self.seen = set()
+
+    @classmethod
+    def load(cls, path: str) -> "OfflineValidator":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def check(self, token: str) -> tuple[str, str | None, str]:
+        """Devolve (resultado, ticket_code, nome/motivo)."""
+        try:
+            code = legacy_code(token) or verify_token(token, self.key, self.event_id)
+        except InvalidTicketToken as e:
+            return self.INVALID, None, str(e)
+
+        name = self.tickets.get(code)
+        if name is None:
+            return self.UNKNOWN, code, "Ingresso não pago ou cancelado."
+        if code in self.seen:
+            return self.DUPLICATE, code, name
+        self.seen.add(code)
+        return self.OK, code, name
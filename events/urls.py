@@ -13,4 +13,7 @@ urlpatterns = [
     path("orders/<str:ticket_code>/success/", views.registration_success, name="registration_success"),
 
     path("orders/<str:ticket_code>/ticket.pdf", views.order_ticket_pdf, name="order_ticket_pdf"),
+
+    # Check-in offline
+    path("checkin/<slug:slug>/snapshot.json", views.checkin_snapshot, name="checkin_snapshot"),
 ]
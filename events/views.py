@@ -1,62 +1,82 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.files.storage import storages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
 from datetime import timedelta
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 
-from .models import Event, City, EventType, EventRegistration, RegistrationStatus, PaymentStatus
+from core.metrics import query_budget
 
-from .pdfs import build_ticket_pdf
+from .models import Event, City, EventType, EventRegistration, EventSoldOut, RegistrationStatus, PaymentStatus
 
+from . import schedule
+from .pdfs import get_ticket_pdf
+from .tickets import build_snapshot
 
+
+@query_budget(2)
 @require_http_methods(["GET"])
 def event_list(request):
     """
     Lista eventos publicados.
+    O fragmento da lista vem da cache (events.schedule) e a resposta suporta ETag/Last-Modified.
     """
     city = request.GET.get("city", "").upper()
     etype = request.GET.get("type", "").upper()
 
-    qs = Event.objects.filter(is_published=True, start_at__gte=timezone.now()).order_by("start_at")
+    if city not in dict(City.choices):
+        city = ""
+    if etype not in dict(EventType.choices):
+        etype = ""
 
-    if city in dict(City.choices):
-        qs = qs.filter(city=city)
+    entry = schedule.get_schedule(city, etype)
 
-    if etype in dict(EventType.choices):
-        qs = qs.filter(event_type=etype)
+    not_modified = get_conditional_response(
+        request, etag=entry["etag"], last_modified=entry["last_modified"]
+    )
+    if not_modified is not None:
+        return not_modified
 
     ctx = {
-        "events": qs,
+        "events_html": mark_safe(entry["html"]),
         "city_choices": City.choices,
         "type_choices": EventType.choices,
         "active_city": city,
         "active_type": etype,
     }
-    return render(request, "events/agenda.html", ctx)
+    resp = render(request, "events/agenda.html", ctx)
+    resp["ETag"] = entry["etag"]
+    resp["Last-Modified"] = http_date(entry["last_modified"])
+    patch_cache_control(resp, public=True, max_age=0, must_revalidate=True)
+    return resp
 
 
+@query_budget(1)
 @require_http_methods(["GET"])
 def event_detail(request, slug):
     event = get_object_or_404(Event, slug=slug, is_published=True)
     return render(request, "events/event_detail.html", {"event": event})
 
 
+@query_budget(1)
 @require_http_methods(["GET"])
 def register_form(request, slug: str):
     event = get_object_or_404(Event, slug=slug, is_published=True)
     return render(request, "events/register.html", {"event": event})
 
 
+@query_budget(15)
 @require_http_methods(["POST"])
 def register(request, slug: str):
     event = get_object_or_404(Event, slug=slug, is_published=True)
 
-    if event.is_sold_out:
-        messages.error(request, "Este evento está esgotado.")
-        return redirect("events:event_detail", slug=event.slug)
-
     full_name = (request.POST.get("full_name") or "").strip()
     phone = (request.POST.get("phone") or "").strip()
     payment_method = (request.POST.get("payment") or "").strip()
@@ -68,24 +88,39 @@ def register(request, slug: str):
     # Evita duplicação acidental por clique duplo:
     # se existir inscrição NÃO paga muito recente para o mesmo telefone/evento,
     # reaproveita em vez de criar outra.
-    cooldown = timezone.now() - timedelta(seconds=45)
+    now = timezone.now()
+    cooldown = now - timedelta(seconds=45)
 
     reg = (
         EventRegistration.objects
-        .filter(event=event, phone=phone, created_at__gte=cooldown)
+        .filter(event=event, phone=phone, created_at__gte=cooldown, status=RegistrationStatus.ACTIVE)
         .exclude(payment_status=PaymentStatus.PAID)
         .order_by("-created_at")
         .first()
     )
 
     if not reg:
-        reg = EventRegistration.objects.create(
-            event=event,
-            phone=phone,
-            status=RegistrationStatus.ACTIVE,
-            full_name=full_name,
-            payment_status=PaymentStatus.UNPAID,
-        )
+        # o lugar é ocupado atomicamente no save(); o check abaixo só evita o INSERT quando já esgotou
+        if event.is_sold_out:
+            messages.error(request, "Este evento está esgotado.")
+            return redirect("events:event_detail", slug=event.slug)
+
+        hold_expires_at = None
+        if not event.is_free:
+            hold_expires_at = now + timedelta(minutes=settings.SEAT_HOLD_MINUTES)
+
+        try:
+            reg = EventRegistration.objects.create(
+                event=event,
+                phone=phone,
+                status=RegistrationStatus.ACTIVE,
+                full_name=full_name,
+                payment_status=PaymentStatus.UNPAID,
+                hold_expires_at=hold_expires_at,
+            )
+        except EventSoldOut:
+            messages.error(request, "Este evento está esgotado.")
+            return redirect("events:event_detail", slug=event.slug)
     else:
         # se reaproveitar, atualiza o nome (opcional)
         reg.full_name = full_name
@@ -93,8 +128,7 @@ def register(request, slug: str):
 
     # Evento grátis => confirma
     if event.is_free:
-        reg.payment_status = PaymentStatus.PAID
-        reg.save(update_fields=["payment_status"])
+        reg.mark_paid()
         return redirect("events:registration_success", ticket_code=reg.ticket_code)
 
     # Pago => inicia pagamento
@@ -104,20 +138,43 @@ def register(request, slug: str):
     )
 
 
+@query_budget(1)
 @require_http_methods(["GET"])
 def registration_success(request, ticket_code):
-    reg = get_object_or_404(EventRegistration, ticket_code=ticket_code)
+    reg = get_object_or_404(EventRegistration.objects.select_related("event"), ticket_code=ticket_code)
 
     return render(request, "events/registration_success.html", {"reg": reg})
 
 
+@query_budget(1)
 def order_ticket_pdf(request, ticket_code):
-    reg = get_object_or_404(EventRegistration, ticket_code=ticket_code)
+    reg = get_object_or_404(EventRegistration.objects.select_related("event"), ticket_code=ticket_code)
 
     if reg.payment_status != PaymentStatus.PAID:
         return HttpResponse("Ticket indisponível: pagamento não confirmado.", status=403)
+    if reg.status != RegistrationStatus.ACTIVE:
+        # pago depois de cancelada e sem lugar (needs_refund)
+        return HttpResponse("Ticket indisponível: inscrição cancelada.", status=403)
+
+    # PDF já gerado para esta versão do evento => só lê o ficheiro
+    name = get_ticket_pdf(reg)
+    return FileResponse(
+        storages["tickets"].open(name, "rb"),
+        as_attachment=True,
+        filename=f"ticket-{reg.ticket_code}.pdf",
+        content_type="application/pdf",
+    )
 
-    pdf_bytes = build_ticket_pdf(reg)
-    resp = HttpResponse(pdf_bytes, content_type="application/pdf")
-    resp["Content-Disposition"] = f'attachment; filename="ticket-{reg.ticket_code}.pdf"'
-    return resp
\ No newline at end of file
+
+@query_budget(4)
+@staff_member_required
+@require_http_methods(["GET"])
+def checkin_snapshot(request, slug):
+    """
+    Snapshot de check-in (chave do evento + ingressos válidos) para os dispositivos
+    validarem os QR offline. Ver events.tickets.OfflineValidator.
+    """
+    event = get_object_or_404(Event, slug=slug)
+    response = JsonResponse(build_snapshot(event))
+    response["Cache-Control"] = "private, no-store"
+    return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, WebhookInbox, WebhookStatus
 
 
 @admin.register(Payment)
@@ -18,4 +18,25 @@ class PaymentAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "method", "currency", "created_at")
     search_fields = ("reference", "paysuite_id", "transaction_id", "registration__ticket_code", "registration__phone")
-    readonly_fields = ("created_at", "updated_at", "raw_provider_payload", "last_webhook_request_id")
\ No newline at end of file
+    list_select_related = ("registration",)
+    readonly_fields = ("created_at", "updated_at", "raw_provider_payload", "last_webhook_request_id")
+
+
+@admin.register(WebhookInbox)
+class WebhookInboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "request_id", "event", "status", "attempts", "next_attempt_at",
+        "received_at", "processed_at", "latency_ms",
+    )
+    list_filter = ("status", "event")
+    search_fields = ("request_id",)
+    readonly_fields = (
+        "request_id", "event", "body", "attempts", "error", "next_attempt_at",
+        "received_at", "processed_at", "latency_ms", "processing_ms",
+    )
+    actions = ("requeue",)
+
+    @admin.action(description="Voltar a pôr na fila")
+    def requeue(self, request, queryset):
+        n = queryset.update(status=WebhookStatus.PENDING, attempts=0, next_attempt_at=None)
+        self.message_user(request, f"{n} webhook(s) na fila para o process_webhooks.")
@@ -0,0 +1,198 @@
+"""
+PaySuite falsa para testes de carga locais (ver os comandos fake_paysuite e loadtest).
+
+Implementa o que a app usa da API real:
+- POST /api/v1/payments        -> cria o pagamento e devolve checkout_url
+- GET  /api/v1/payments/<id>   -> estado (transaction.status)
+- GET  /checkout/<id>          -> "paga" (ou falha com ?outcome=failed), agenda o webhook
+                                  assinado com PAYSUITE_WEBHOOK_SECRET e redireciona para return_url
+
+Latência e taxa de erro (HTTP 500) da API são configuráveis.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.utils import timezone
+
+
+class FakePaySuite:
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        secret: str = "",
+        latency_ms: float = 0,
+        failure_rate: float = 0.0,
+        webhook_delay_ms: float = 200,
+    ):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.webhook_delay_ms = webhook_delay_ms
+
+        self.payments = {}
+        self.lock = threading.Lock()
+        self.stats = {"api_calls": 0, "api_errors": 0, "webhooks_sent": 0, "webhooks_failed": 0}
+        # latência (ms) da app a responder aos webhooks
+        self.webhook_ms = []
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/api/v1"
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.fake = fake
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def send_webhook(self, payment: dict):
+        body = json.dumps({
+            "event": "payment.success" if payment["status"] == "completed" else "payment.failed",
+            "request_id": str(uuid.uuid4()),
+            "data": _payment_data(payment),
+        }).encode("utf-8")
+        signature = hmac.new(self.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        started = time.perf_counter()
+        try:
+            r = requests.post(
+                payment["callback_url"],
+                data=body,
+                headers={"Content-Type": "application/json", "X-Webhook-Signature": signature},
+                timeout=10,
+            )
+            self._count("webhooks_sent" if r.status_code == 200 else "webhooks_failed")
+            with self.lock:
+                self.webhook_ms.append((time.perf_counter() - started) * 1000)
+        except requests.RequestException:
+            self._count("webhooks_failed")
+
+
+def _payment_data(payment: dict) -> dict:
+    tx = {"status": payment["status"]}
+    if payment["status"] == "completed":
+        tx.update({"id": payment["tx_id"], "paid_at": payment["paid_at"]})
+    return {"id": payment["id"], "reference": payment["reference"], "amount": payment["amount"], "transaction": tx}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakePaySuite = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, data: dict):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _api_prelude(self) -> bool:
+        fake = self.fake
+        fake._count("api_calls")
+        if fake.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * fake.latency_ms / 1000)
+        if fake.failure_rate and random.random() < fake.failure_rate:
+            fake._count("api_errors")
+            self._json(500, {"status": "error", "message": "fake failure"})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if urlparse(self.path).path.rstrip("/") != "/api/v1/payments":
+            return self._json(404, {"status": "error", "message": "not found"})
+        if not self._api_prelude():
+            return
+
+        payment = {
+            "id": str(uuid.uuid4()),
+            "reference": payload.get("reference"),
+            "amount": payload.get("amount"),
+            "return_url": payload.get("return_url"),
+            "callback_url": payload.get("callback_url"),
+            "status": "pending",
+        }
+        with self.fake.lock:
+            self.fake.payments[payment["id"]] = payment
+
+        self._json(201, {
+            "status": "success",
+            "data": {
+                "id": payment["id"],
+                "reference": payment["reference"],
+                "checkout_url": f"{self.fake.base_url}/checkout/{payment['id']}",
+            },
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        m = re.fullmatch(r"/api/v1/payments/([\w-]+)/?", url.path)
+        if m:
+            if not self._api_prelude():
+                return
+            payment = self.fake.payments.get(m.group(1))
+            if not payment:
+                return self._json(404, {"status": "error", "message": "payment not found"})
+            return self._json(200, {"status": "success", "data": _payment_data(payment)})
+
+        m = re.fullmatch(r"/checkout/([\w-]+)/?", url.path)
+        if m:
+            payment = self.fake.payments.get(m.group(1))
+            if not payment:
+                return self._json(404, {"status": "error", "message": "payment not found"})
+
+            outcome = (parse_qs(url.query).get("outcome") or ["completed"])[0]
+            with self.fake.lock:
+                if payment["status"] == "pending":
+                    payment["status"] = "failed" if outcome == "failed" else "completed"
+                    payment["tx_id"] = uuid.uuid4().hex[:12]
+                    payment["paid_at"] = timezone.now().isoformat()
+            threading.Timer(self.fake.webhook_delay_ms / 1000, self.fake.send_webhook, args=(payment,)).start()
+
+            self.send_response(302)
+            self.send_header("Location", payment["return_url"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self._json(404, {"status": "error", "message": "not found"})
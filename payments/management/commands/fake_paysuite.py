@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.fake_paysuite import FakePaySuite
+
+
+class Command(BaseCommand):
+    help = (
+        "Arranca uma PaySuite falsa local. Aponta a app para ela com "
+        "PAYSUITE_API_BASE=http://<host>:<port>/api/v1 e PAYSUITE_API_TOKEN=<qualquer>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency-ms", type=float, default=150, help="Latência média da API.")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Fração de pedidos à API com HTTP 500.")
+        parser.add_argument("--webhook-delay-ms", type=float, default=300)
+        parser.add_argument("--secret", default=None, help="Por omissão: PAYSUITE_WEBHOOK_SECRET.")
+
+    def handle(self, *args, **opts):
+        fake = FakePaySuite(
+            host=opts["host"],
+            port=opts["port"],
+            secret=opts["secret"] if opts["secret"] is not None else (settings.PAYSUITE_WEBHOOK_SECRET or ""),
+            latency_ms=opts["latency_ms"],
+            failure_rate=opts["failure_rate"],
+            webhook_delay_ms=opts["webhook_delay_ms"],
+        ).start()
+        self.stdout.write(f"PaySuite falsa em {fake.api_base} (Ctrl+C para parar)")
+        try:
+            while True:
+                time.sleep(5)
+                self.stdout.write(str(fake.stats))
+        except KeyboardInterrupt:
+            fake.stop()
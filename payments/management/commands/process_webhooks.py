@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.models import WebhookInbox, WebhookStatus
+from payments.webhooks import drain_inbox, process_inbox_entry
+
+
+class Command(BaseCommand):
+    help = "Processa os webhooks da PaySuite guardados no WebhookInbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--loop", action="store_true", help="Corre continuamente (worker).")
+        parser.add_argument("--interval", type=float, default=0.5, help="Pausa (s) quando o inbox está vazio.")
+        parser.add_argument("--retry-failed", action="store_true", help="Volta a pôr os FAILED na fila antes de começar.")
+        parser.add_argument(
+            "--replay",
+            nargs="+",
+            metavar="REQUEST_ID",
+            help="Reaplica estes webhooks já processados (ignora a verificação de request_id repetido).",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["replay"]:
+            for entry in WebhookInbox.objects.filter(request_id__in=opts["replay"]):
+                process_inbox_entry(entry, force=True)
+                self.stdout.write(f"{entry.request_id}: {entry.status} {entry.error}".rstrip())
+            return
+
+        if opts["retry_failed"]:
+            n = WebhookInbox.objects.filter(status=WebhookStatus.FAILED).update(
+                status=WebhookStatus.PENDING, attempts=0, next_attempt_at=None
+            )
+            self.stdout.write(f"{n} webhook(s) FAILED de volta à fila.")
+
+        while True:
+            entries = drain_inbox(opts["batch_size"])
+            if entries:
+                latency = sorted(e.latency_ms for e in entries)
+                self.stdout.write(
+                    f"{len(entries)} webhook(s): "
+                    f"{sum(e.status == WebhookStatus.PROCESSED for e in entries)} processed, "
+                    f"{sum(e.status == WebhookStatus.IGNORED for e in entries)} ignored, "
+                    f"{sum(e.status in (WebhookStatus.PENDING, WebhookStatus.FAILED) for e in entries)} com erro; "
+                    f"latência p50={latency[len(latency) // 2]}ms max={latency[-1]}ms"
+                )
+                continue
+
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
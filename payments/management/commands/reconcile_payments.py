@@ -0,0 +1,95 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.models import Payment, PaymentStatus as PayPaymentStatus
+from payments.services.paysuite import PaySuiteClient, PaySuiteError, PaySuiteUnavailable
+from payments.services.transitions import ProviderResult, apply_results
+
+
+class Command(BaseCommand):
+    help = "Consulta na PaySuite os pagamentos PENDING antigos e aplica o estado remoto em lote."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age", type=int, default=10, help="Minutos sem alterações para um PENDING contar como parado.")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=8, help="Consultas simultâneas à PaySuite.")
+        parser.add_argument("--limit", type=int, default=0, help="Máximo de pagamentos por passagem (0 = todos).")
+        parser.add_argument("--dry-run", action="store_true", help="Consulta a PaySuite mas não grava nada.")
+        parser.add_argument("--loop", action="store_true", help="Corre continuamente.")
+        parser.add_argument("--interval", type=float, default=300.0, help="Segundos entre passagens com --loop.")
+
+    def handle(self, *args, **opts):
+        client = PaySuiteClient(pool_size=opts["workers"])
+        while True:
+            self.run_once(client, opts)
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
+
+    def run_once(self, client, opts):
+        cutoff = timezone.now() - timedelta(minutes=opts["min_age"])
+        stale = (
+            Payment.objects
+            .filter(status=PayPaymentStatus.PENDING, updated_at__lt=cutoff)
+            .exclude(paysuite_id__isnull=True)
+            .exclude(paysuite_id="")
+            .select_related("registration")
+            .order_by("pk")
+        )
+
+        totals = Counter()
+        started = time.perf_counter()
+        last_pk = 0
+
+        with ThreadPoolExecutor(max_workers=opts["workers"]) as pool:
+            while True:
+                size = opts["batch_size"]
+                if opts["limit"]:
+                    size = min(size, opts["limit"] - totals["checked"])
+                    if size <= 0:
+                        break
+
+                batch = list(stale.filter(pk__gt=last_pk)[:size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                # só HTTP nas threads; a BD fica na thread principal
+                results = list(pool.map(lambda p: self.fetch(client, p), batch))
+                totals["checked"] += len(batch)
+
+                outcomes = []
+                for payment, remote in zip(batch, results):
+                    if isinstance(remote, Exception):
+                        totals["errors"] += 1
+                        continue
+                    outcomes.append(ProviderResult.from_remote(remote, reference=payment.reference))
+                    totals[outcomes[-1].outcome] += 1
+
+                if not opts["dry_run"]:
+                    # também renova updated_at dos que continuam pending: só voltam daqui a --min-age
+                    apply_results(outcomes)
+
+                if any(isinstance(r, PaySuiteUnavailable) for r in results):
+                    self.stderr.write("PaySuite indisponível (circuit breaker aberto); a parar esta passagem.")
+                    break
+
+        elapsed = time.perf_counter() - started
+        rate = totals["checked"] / elapsed if elapsed else 0
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals['checked']} pagamento(s) em {elapsed:.1f}s ({rate:.1f}/s): "
+            f"{totals['paid']} paid, {totals['failed']} failed, {totals['pending']} pending, {totals['errors']} erro(s)."
+        ))
+
+    @staticmethod
+    def fetch(client, payment):
+        try:
+            return client.get_payment(payment.paysuite_id)
+        except PaySuiteError as e:
+            return e
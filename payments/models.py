@@ -69,4 +69,47 @@ class Payment(models.Model):
         ordering = ("-created_at",)
 
     def __str__(self):
-        return f"{self.reference} • {self.status}"
\ No newline at end of file
+        return f"{self.reference} • {self.status}"
+
+
+class WebhookStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    PROCESSED = "PROCESSED", "Processed"
+    IGNORED = "IGNORED", "Ignored"
+    FAILED = "FAILED", "Failed"
+
+
+class WebhookInbox(models.Model):
+    """
+    Webhook da PaySuite já verificado (HMAC), guardado tal como chegou.
+    O processamento é feito pelo comando process_webhooks.
+    """
+    request_id = models.CharField(max_length=120, unique=True)
+    event = models.CharField(max_length=60, blank=True)
+    body = models.TextField()
+
+    status = models.CharField(
+        max_length=20,
+        choices=WebhookStatus.choices,
+        default=WebhookStatus.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # depois de uma falha só volta a ser processado a partir daqui (backoff)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    # receção -> fim do processamento, e só o processamento
+    latency_ms = models.PositiveIntegerField(blank=True, null=True)
+    processing_ms = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ("received_at",)
+        indexes = [
+            models.Index(fields=["status", "received_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.request_id} • {self.status}"
@@ -0,0 +1,97 @@
+"""
+Pub/sub local (sem broker externo) para avisar quem está à espera de um pagamento.
+
+- No mesmo processo, `publish` acorda imediatamente os subscritores (asyncio.Event).
+- Entre processos (workers do gunicorn, worker de webhooks), a mensagem fica na cache
+  partilhada e os subscritores verificam-na a cada `poll_interval`; nunca vão à BD.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from events.models import PaymentStatus as RegPaymentStatus
+from .models import PaymentStatus as PayPaymentStatus
+
+MESSAGE_TTL = 600
+
+
+def _key(channel: str) -> str:
+    return f"pubsub:{channel}"
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = defaultdict(set)
+
+    def publish(self, channel: str, message: dict):
+        cache.set(_key(channel), message, timeout=MESSAGE_TTL)
+        with self._lock:
+            waiters = list(self._waiters.get(channel, ()))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, channel: str, timeout: float, poll_interval: float = 1.0) -> dict | None:
+        """
+        Espera por uma mensagem no canal (ou devolve a última publicada).
+        Devolve None se nada chegar em `timeout` segundos.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters[channel].add(waiter)
+
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                message = await cache.aget(_key(channel))
+                if message is not None:
+                    return message
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                waiter[1].clear()
+        finally:
+            with self._lock:
+                self._waiters[channel].discard(waiter)
+                if not self._waiters[channel]:
+                    del self._waiters[channel]
+
+
+broker = LocalBroker()
+
+
+def payment_channel(reference: str) -> str:
+    return f"payment:{reference}"
+
+
+def payment_message(payment) -> dict:
+    reg = payment.registration
+    message = {
+        "payment_status": payment.status,
+        "registration_payment_status": reg.payment_status,
+        "ticket_code": reg.ticket_code,
+    }
+    if payment.status == PayPaymentStatus.PAID or reg.payment_status == RegPaymentStatus.PAID:
+        message["state"] = "paid"
+        message["redirect_url"] = reverse("events:registration_success", kwargs={"ticket_code": reg.ticket_code})
+    elif payment.status == PayPaymentStatus.FAILED:
+        message["state"] = "failed"
+    else:
+        message["state"] = "pending"
+    return message
+
+
+def publish_payment(payment):
+    """Avisa os subscritores de que o pagamento saiu de PENDING."""
+    message = payment_message(payment)
+    if message["state"] != "pending":
+        broker.publish(payment_channel(payment.reference), message)
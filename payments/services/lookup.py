@@ -0,0 +1,53 @@
+"""
+Consulta do estado de um pagamento na PaySuite com cache curta e single-flight.
+
+Vários separadores/reloads do mesmo utilizador (e vários workers) partilham a mesma
+chamada: enquanto uma consulta está em curso ou o último resultado é recente, ninguém
+volta a chamar a PaySuite.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .paysuite import PaySuiteError, get_call_budget, get_payment
+
+logger = logging.getLogger(__name__)
+
+
+def _key(paysuite_id: str) -> str:
+    return f"payments:paysuite:{paysuite_id}"
+
+
+def forget_remote_payment(paysuite_id: str):
+    cache.delete(_key(paysuite_id))
+
+
+def get_remote_payment(paysuite_id: str) -> dict | None:
+    """
+    Último estado conhecido na PaySuite (até PAYSUITE_LOOKUP_TTL segundos de idade).
+    Devolve None se não há resultado recente e outro pedido já está a consultar,
+    ou se a PaySuite falhou: o chamador trata como "ainda a verificar".
+    """
+    key = _key(paysuite_id)
+    remote = cache.get(key)
+    if remote is not None:
+        return remote
+
+    lock = f"{key}:lock"
+    # dura o pior caso de um GET com retries (senão outro pedido repetia a chamada a meio)
+    # e expira sozinho se o worker morrer a meio
+    lock_ttl = int(get_call_budget()) + 1
+    if not cache.add(lock, 1, timeout=lock_ttl):
+        return None
+
+    try:
+        remote = get_payment(paysuite_id)
+    except PaySuiteError:
+        logger.warning("PaySuite get_payment failed: paysuite_id=%s", paysuite_id, exc_info=True)
+        return None
+    finally:
+        cache.delete(lock)
+
+    cache.set(key, remote, timeout=settings.PAYSUITE_LOOKUP_TTL)
+    return remote
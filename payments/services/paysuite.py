@@ -1,63 +1,236 @@
+import logging
+import threading
+import time
+
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+# retries dos GET (urllib3): pausa entre tentativas e teto do Retry-After da PaySuite
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_BACKOFF_JITTER = 0.3
+RETRY_AFTER_MAX = 5.0
 
 
 class PaySuiteError(Exception):
     pass
 
 
-def _headers():
-    if not settings.PAYSUITE_API_TOKEN:
-        raise PaySuiteError("PAYSUITE_API_TOKEN não configurado.")
-    return {
-        "Authorization": f"Bearer {settings.PAYSUITE_API_TOKEN}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-
-
-def create_payment_request(
-    *,
-    amount: str,
-    reference: str,
-    description: str,
-    return_url: str,
-    callback_url: str,
-    method: str | None = None,
-):
-    """
-    POST /api/v1/payments
-    Retorna: {id, checkout_url, ...}
-    """
-    url = f"{settings.PAYSUITE_API_BASE}/payments"
-    payload = {
-        "amount": str(amount),
-        "reference": reference,
-        "description": description,
-        "return_url": return_url,
-        "callback_url": callback_url,
-    }
-    if method:
-        payload["method"] = method
-
-    r = requests.post(url, headers=_headers(), json=payload, timeout=25)
-    data = r.json() if r.content else {}
-
-    if r.status_code not in (200, 201) or data.get("status") != "success":
-        raise PaySuiteError(data.get("message") or f"PaySuite error ({r.status_code})")
-    return data["data"]
+class _Retry(Retry):
+    def get_retry_after(self, response):
+        # um Retry-After grande prendia o pedido (e o lock do lookup) sem limite
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, RETRY_AFTER_MAX)
 
 
-def get_payment(paysuite_uuid: str):
+def get_call_budget(retries: int | None = None) -> float:
+    """
+    Pior caso (s) de um GET à PaySuite com os retries: todas as tentativas no timeout
+    mais a pausa máxima entre elas (backoff + jitter, ou o Retry-After limitado).
+    """
+    retries = settings.PAYSUITE_GET_RETRIES if retries is None else retries
+    per_attempt = settings.PAYSUITE_CONNECT_TIMEOUT + settings.PAYSUITE_READ_TIMEOUT
+    # majorado: cada pausa como a maior possível (backoff da última repetição ou Retry-After)
+    pause = max(RETRY_BACKOFF_FACTOR * 2 ** retries + RETRY_BACKOFF_JITTER, RETRY_AFTER_MAX)
+    return (retries + 1) * per_attempt + retries * pause
+
+
+def interpret_payment_status(remote: dict) -> str:
+    """
+    Normaliza status remoto -> "paid" | "failed" | "pending"
+    PaySuite no teu payload usa: transaction.status == "completed"
+    """
+    tx = remote.get("transaction") or {}
+    tx_status = (tx.get("status") or "").lower()
+
+    if tx_status == "completed":
+        return "paid"
+    if tx_status in ("failed", "cancelled", "canceled"):
+        return "failed"
+    return "pending"
+
+
+class PaySuiteUnavailable(PaySuiteError):
+    """PaySuite degradado: o circuit breaker está aberto e o pedido nem é enviado."""
+
+
+class CircuitBreaker:
+    """
+    Abre após `failure_threshold` falhas seguidas e rejeita pedidos durante
+    `reset_timeout` segundos; depois deixa passar um pedido de teste (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("PaySuite circuit breaker aberto após %s falhas", self._failures)
+                self._opened_at = time.monotonic()
+
+
+class PaySuiteClient:
     """
-    GET /api/v1/payments/{uuid}
-    Retorna um dict em data, ex:
-    {"id": "...", "reference": "...", "transaction": {"status":"completed", ...}}
+    Cliente HTTP da PaySuite com uma requests.Session partilhada (keep-alive + pool),
+    timeouts de connect/read separados, retries com jitter só para GET e circuit breaker.
     """
-    url = f"{settings.PAYSUITE_API_BASE}/payments/{paysuite_uuid}"
-    r = requests.get(url, headers=_headers(), timeout=20)
-    data = r.json() if r.content else {}
 
-    if r.status_code != 200 or data.get("status") != "success":
-        raise PaySuiteError(data.get("message") or f"PaySuite error ({r.status_code})")
-    return data["data"]
\ No newline at end of file
+    def __init__(
+        self,
+        *,
+        base_url: str | None = None,
+        token: str | None = None,
+        connect_timeout: float | None = None,
+        read_timeout: float | None = None,
+        retries: int | None = None,
+        pool_size: int = 10,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = (base_url or settings.PAYSUITE_API_BASE).rstrip("/")
+        self.token = token if token is not None else settings.PAYSUITE_API_TOKEN
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else settings.PAYSUITE_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.PAYSUITE_READ_TIMEOUT,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.PAYSUITE_BREAKER_THRESHOLD,
+            reset_timeout=settings.PAYSUITE_BREAKER_RESET,
+        )
+
+        retries = settings.PAYSUITE_GET_RETRIES if retries is None else retries
+        retry = _Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            # POST não é idempotente: só é repetido se a ligação nem chegou a abrir
+            allowed_methods=frozenset({"GET"}),
+            status_forcelist=(429, 500, 502, 503, 504),
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            backoff_jitter=RETRY_BACKOFF_JITTER,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        })
+
+    def _request(self, method: str, path: str, *, ok_status=(200,), **kwargs) -> dict:
+        if not self.token:
+            raise PaySuiteError("PAYSUITE_API_TOKEN não configurado.")
+        if not self.breaker.allow():
+            raise PaySuiteUnavailable("PaySuite indisponível de momento. Tenta novamente daqui a pouco.")
+
+        try:
+            with timed("paysuite"):
+                r = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise PaySuiteError(f"PaySuite sem resposta ({e.__class__.__name__})") from e
+
+        if r.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        try:
+            data = r.json() if r.content else {}
+        except ValueError:
+            data = {}
+
+        if r.status_code not in ok_status or data.get("status") != "success":
+            raise PaySuiteError(data.get("message") or f"PaySuite error ({r.status_code})")
+        return data["data"]
+
+    def create_payment_request(
+        self,
+        *,
+        amount: str,
+        reference: str,
+        description: str,
+        return_url: str,
+        callback_url: str,
+        method: str | None = None,
+    ):
+        """
+        POST /api/v1/payments
+        Retorna: {id, checkout_url, ...}
+        """
+        payload = {
+            "amount": str(amount),
+            "reference": reference,
+            "description": description,
+            "return_url": return_url,
+            "callback_url": callback_url,
+        }
+        if method:
+            payload["method"] = method
+
+        return self._request("POST", "/payments", json=payload, ok_status=(200, 201))
+
+    def get_payment(self, paysuite_uuid: str):
+        """
+        GET /api/v1/payments/{uuid}
+        Retorna um dict em data, ex:
+        {"id": "...", "reference": "...", "transaction": {"status":"completed", ...}}
+        """
+        return self._request("GET", f"/payments/{paysuite_uuid}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> PaySuiteClient:
+    """Cliente partilhado por processo (cada worker do gunicorn tem o seu pool)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaySuiteClient()
+    return _client
+
+
+def create_payment_request(**kwargs):
+    return get_client().create_payment_request(**kwargs)
+
+
+def get_payment(paysuite_uuid: str):
+    return get_client().get_payment(paysuite_uuid)
@@ -0,0 +1,210 @@
+"""
+Máquina de estados do pagamento, partilhada pelo webhook, pelo payment_return/status
+e pela reconciliação.
+
+Recebe resultados já normalizados da PaySuite (ProviderResult) e grava Payment e
+EventRegistration com o mínimo de queries: um SELECT ... FOR UPDATE com o join da
+inscrição e um UPDATE por tabela (bulk_update no modo em lote). Inscrições que
+ficam pagas entram na fila de pré-geração do PDF (TicketRenderJob).
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from events.models import (
+    EventRegistration, RegistrationStatus, TicketRenderJob, PaymentStatus as RegPaymentStatus,
+)
+from ..models import Payment, PaymentStatus as PayPaymentStatus
+from ..pubsub import publish_payment
+from .paysuite import interpret_payment_status
+
+PAID = "paid"
+FAILED = "failed"
+PENDING = "pending"
+
+
+@dataclass
+class ProviderResult:
+    outcome: str
+    payload: dict = field(default_factory=dict)
+    reference: str | None = None
+    paysuite_id: str | None = None
+    transaction_id: str | None = None
+    paid_at: datetime | None = None
+    request_id: str | None = None
+
+    @classmethod
+    def from_remote(cls, remote: dict, *, reference: str | None = None) -> "ProviderResult":
+        """Resposta do get_payment (GET /payments/{id})."""
+        tx = remote.get("transaction") or {}
+        return cls(
+            outcome=interpret_payment_status(remote),
+            payload=remote,
+            reference=reference or remote.get("reference"),
+            paysuite_id=remote.get("id"),
+            transaction_id=_tx_id(tx),
+            paid_at=_parse_paid_at(tx.get("paid_at") or remote.get("paid_at")),
+        )
+
+    @classmethod
+    def from_webhook(cls, payload: dict) -> "ProviderResult":
+        """Corpo de um webhook (payment.success / payment.failed)."""
+        data = payload.get("data") or {}
+        tx = data.get("transaction") or {}
+        event_name = payload.get("event")
+
+        # Critério de sucesso: event_name OU transaction.status
+        outcome = interpret_payment_status(data)
+        if event_name == "payment.success":
+            outcome = PAID
+        elif event_name == "payment.failed" and outcome != PAID:
+            outcome = FAILED
+
+        return cls(
+            outcome=outcome,
+            payload=payload,
+            reference=data.get("reference"),
+            paysuite_id=data.get("id"),
+            transaction_id=_tx_id(tx),
+            paid_at=_parse_paid_at(tx.get("paid_at") or data.get("paid_at")),
+            request_id=payload.get("request_id"),
+        )
+
+
+def _tx_id(tx: dict) -> str | None:
+    value = tx.get("id") or tx.get("transaction_id")
+    return str(value) if value else None
+
+
+def _parse_paid_at(value) -> datetime | None:
+    return parse_datetime(value) if value else None
+
+
+def _transition(payment: Payment, result: ProviderResult, now) -> bool:
+    """
+    Aplica o resultado em memória ao Payment e à inscrição (só o lugar recuperado de
+    uma inscrição cancelada vai logo à BD, ver EventRegistration.reclaim_seat).
+    Devolve True se a inscrição mudou (precisa de ser gravada).
+    PAID é final: um resultado antigo/fora de ordem não o desfaz.
+    """
+    reg = payment.registration
+    payment.raw_provider_payload = result.payload
+    payment.updated_at = now
+    if result.request_id:
+        payment.last_webhook_request_id = result.request_id
+
+    if payment.status == PayPaymentStatus.PAID:
+        return False
+
+    if result.outcome == PAID:
+        payment.status = PayPaymentStatus.PAID
+        payment.transaction_id = result.transaction_id or payment.transaction_id
+        payment.paid_at = result.paid_at or now
+
+        if reg.status == RegistrationStatus.CANCELLED:
+            reg.reclaim_seat()
+        reg.payment_status = RegPaymentStatus.PAID
+        reg.hold_expires_at = None
+        return True
+
+    if result.outcome == FAILED:
+        payment.status = PayPaymentStatus.FAILED
+        reg.payment_status = RegPaymentStatus.FAILED
+        return True
+
+    payment.status = PayPaymentStatus.PENDING
+    return False
+
+
+PAYMENT_FIELDS = ["status", "transaction_id", "paid_at", "raw_provider_payload", "last_webhook_request_id", "updated_at"]
+REGISTRATION_FIELDS = ["payment_status", "hold_expires_at", "status", "needs_refund", "updated_at"]
+
+
+def _locked_payments():
+    return Payment.objects.select_for_update().select_related("registration")
+
+
+def apply_result(result: ProviderResult, *, force: bool = False) -> Payment | None:
+    """
+    Aplica um resultado ao pagamento (encontrado por reference ou paysuite_id).
+    Devolve o Payment atualizado, ou None se não existe ou se o request_id já foi aplicado.
+    """
+    if not result.reference and not result.paysuite_id:
+        return None
+
+    now = timezone.now()
+    with transaction.atomic():
+        q = _locked_payments()
+        payment = q.filter(reference=result.reference).first() if result.reference else None
+        if not payment and result.paysuite_id:
+            payment = q.filter(paysuite_id=result.paysuite_id).first()
+        if not payment:
+            return None
+
+        if not force and result.request_id and payment.last_webhook_request_id == result.request_id:
+            return None
+
+        reg = payment.registration
+        reg_changed = _transition(payment, result, now)
+
+        Payment.objects.filter(pk=payment.pk).update(**{f: getattr(payment, f) for f in PAYMENT_FIELDS})
+        if reg_changed:
+            reg.updated_at = now
+            EventRegistration.objects.filter(pk=reg.pk).update(**{f: getattr(reg, f) for f in REGISTRATION_FIELDS})
+            reg._loaded_status = reg.status
+            if reg.payment_status == RegPaymentStatus.PAID and reg.status == RegistrationStatus.ACTIVE:
+                transaction.on_commit(lambda: TicketRenderJob.enqueue([reg.pk]))
+
+        if payment.status != PayPaymentStatus.PENDING:
+            transaction.on_commit(lambda: publish_payment(payment))
+
+    return payment
+
+
+def apply_results(results: list[ProviderResult]) -> list[Payment]:
+    """
+    Modo em lote (reconciliação): um SELECT para todos os pagamentos, bulk_update
+    em Payment e EventRegistration (e um claim_seat por inscrição cancelada recuperada).
+    """
+    results = [r for r in results if r.reference or r.paysuite_id]
+    if not results:
+        return []
+
+    refs = {r.reference for r in results if r.reference}
+    ids = {r.paysuite_id for r in results if r.paysuite_id}
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = list(_locked_payments().filter(Q(reference__in=refs) | Q(paysuite_id__in=ids)))
+        by_ref = {p.reference: p for p in payments}
+        by_id = {p.paysuite_id: p for p in payments if p.paysuite_id}
+
+        touched, regs = {}, {}
+        for result in results:
+            payment = by_ref.get(result.reference) or by_id.get(result.paysuite_id)
+            if not payment:
+                continue
+            if _transition(payment, result, now):
+                payment.registration.updated_at = now
+                regs[payment.registration.pk] = payment.registration
+            touched[payment.pk] = payment
+
+        Payment.objects.bulk_update(touched.values(), PAYMENT_FIELDS)
+        if regs:
+            EventRegistration.objects.bulk_update(regs.values(), REGISTRATION_FIELDS)
+            paid = [
+                r.pk for r in regs.values()
+                if r.payment_status == RegPaymentStatus.PAID and r.status == RegistrationStatus.ACTIVE
+            ]
+            if paid:
+                transaction.on_commit(lambda: TicketRenderJob.enqueue(paid))
+
+        for payment in touched.values():
+            if payment.status != PayPaymentStatus.PENDING:
+                transaction.on_commit(lambda p=payment: publish_payment(p))
+
+    return list(touched.values())
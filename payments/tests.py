@@ -1,3 +1,374 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import (
+    City, Event, EventRegistration, EventType, RegistrationStatus, PaymentStatus as RegPaymentStatus,
+)
+from .models import Payment, PaymentStatus, WebhookInbox, WebhookStatus
+from .pubsub import LocalBroker, payment_channel, publish_payment
+from .services.paysuite import (
+    RETRY_AFTER_MAX, CircuitBreaker, PaySuiteClient, PaySuiteError, PaySuiteUnavailable, get_call_budget,
+)
+from .services.transitions import ProviderResult, apply_result, apply_results
+from .webhooks import RETRY_BACKOFF, drain_inbox
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def make_payment(capacity=10, **reg_kwargs) -> Payment:
+    event = Event.objects.create(
+        title="Weekly Run",
+        city=City.MAPUTO,
+        event_type=EventType.WEEKLY,
+        start_at=timezone.now() + timedelta(days=3),
+        meeting_point="Marginal",
+        price=Decimal("500.00"),
+        capacity=capacity,
+    )
+    reg = EventRegistration.objects.create(event=event, full_name="Ana Sitoe", phone="841234567", **reg_kwargs)
+    return Payment.objects.create(
+        registration=reg,
+        reference=reg.ticket_code.replace("-", ""),
+        paysuite_id=f"ps-{reg.pk}",
+        amount=Decimal("500.00"),
+        status=PaymentStatus.PENDING,
+    )
+
+
+def remote(status: str, paysuite_id: str) -> dict:
+    return {"id": paysuite_id, "transaction": {"status": status, "id": "tx-1"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class PaymentStatusPollTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payment = make_payment()
+
+    def poll(self, status: str):
+        with mock.patch("payments.views.get_remote_payment", return_value=remote(status, self.payment.paysuite_id)):
+            return self.client.get(reverse("payments:status"), {"ref": self.payment.reference}).json()
+
+    def test_pending_poll_does_not_write(self):
+        # só o SELECT do pagamento com a inscrição: sem SELECT FOR UPDATE nem UPDATE
+        with self.assertNumQueries(1):
+            data = self.poll("pending")
+        self.assertEqual(data["state"], "pending")
+
+    def test_completed_poll_marks_paid(self):
+        data = self.poll("completed")
+        self.assertEqual(data["state"], "paid")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.PAID)
+        self.assertEqual(self.payment.registration.payment_status, RegPaymentStatus.PAID)
+
+    def test_lookup_lock_outlives_a_call_with_retries(self):
+        per_attempt = settings.PAYSUITE_CONNECT_TIMEOUT + settings.PAYSUITE_READ_TIMEOUT
+        self.assertGreater(get_call_budget(), (settings.PAYSUITE_GET_RETRIES + 1) * per_attempt)
+
+
+@override_settings(CACHES=LOCMEM, PAYSUITE_WEBHOOK_SECRET="s3cret")
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        self.payment = make_payment()
+
+    def deliver(self, request_id="req-1", event="payment.success"):
+        body = json.dumps({
+            "event": event,
+            "request_id": request_id,
+            "data": {"id": self.payment.paysuite_id, "reference": self.payment.reference,
+                     "transaction": {"status": "completed", "id": "tx-1"}},
+        }).encode()
+        signature = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse("payments:webhook_paysuite"), body,
+            content_type="application/json", headers={"X-Webhook-Signature": signature},
+        )
+
+    def test_duplicate_delivery_is_stored_and_applied_once(self):
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(WebhookInbox.objects.count(), 1)
+
+        [entry] = drain_inbox()
+        self.assertEqual(entry.status, WebhookStatus.PROCESSED)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.PAID)
+        self.assertEqual(self.payment.last_webhook_request_id, "req-1")
+        self.assertEqual(drain_inbox(), [])
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(
+            reverse("payments:webhook_paysuite"), b"{}",
+            content_type="application/json", headers={"X-Webhook-Signature": "x"},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(WebhookInbox.objects.exists())
+
+    def test_failed_entry_waits_for_backoff(self):
+        self.deliver()
+        with mock.patch("payments.webhooks.apply_webhook", side_effect=RuntimeError("db down")):
+            [entry] = drain_inbox()
+            self.assertEqual(entry.status, WebhookStatus.PENDING)
+            self.assertEqual(entry.attempts, 1)
+            self.assertGreaterEqual(entry.next_attempt_at, entry.processed_at + RETRY_BACKOFF)
+            # a mesma drenagem (ou a seguinte) não volta a pegar nela antes do tempo
+            self.assertEqual(drain_inbox(), [])
+
+        later = entry.next_attempt_at + timedelta(seconds=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            [entry] = drain_inbox()
+        self.assertEqual(entry.status, WebhookStatus.PROCESSED)
+        self.assertEqual(entry.attempts, 2)
+        self.assertIsNone(entry.next_attempt_at)
+
+
+class LatePaymentTests(TestCase):
+    """Pagamento confirmado depois de o release_expired_holds cancelar a inscrição."""
+
+    def setUp(self):
+        self.payment = make_payment(capacity=1, hold_expires_at=timezone.now() - timedelta(minutes=1))
+        self.reg = self.payment.registration
+        EventRegistration.objects.filter(pk=self.reg.pk).update(status=RegistrationStatus.CANCELLED)
+        Event.adjust_seats(self.reg.event_id, -1)
+
+    def paid(self):
+        return ProviderResult.from_remote(remote("completed", self.payment.paysuite_id))
+
+    def assert_registration(self, status, needs_refund, seats_taken):
+        self.reg.refresh_from_db()
+        self.assertEqual(self.reg.payment_status, RegPaymentStatus.PAID)
+        self.assertEqual((self.reg.status, self.reg.needs_refund), (status, needs_refund))
+        self.assertEqual(Event.objects.get(pk=self.reg.event_id).seats_taken, seats_taken)
+
+    def test_revives_when_there_is_room(self):
+        apply_result(self.paid())
+        self.assert_registration(RegistrationStatus.ACTIVE, False, 1)
+
+    def test_full_event_keeps_it_cancelled_for_refund(self):
+        EventRegistration.objects.create(event_id=self.reg.event_id, full_name="Rui", phone="841111111")
+        apply_result(self.paid())
+        self.assert_registration(RegistrationStatus.CANCELLED, True, 1)
+
+    def test_batch_respects_capacity(self):
+        EventRegistration.objects.create(event_id=self.reg.event_id, full_name="Rui", phone="841111111")
+        apply_results([self.paid()])
+        self.assert_registration(RegistrationStatus.CANCELLED, True, 1)
+
+
+@override_settings(CACHES=LOCMEM)
+class PaymentStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payment = make_payment()
+
+    def stream(self, status: str | None):
+        with mock.patch(
+            "payments.views.get_remote_payment",
+            return_value=remote(status, self.payment.paysuite_id) if status else None,
+        ) as lookup:
+            response = self.client.get(reverse("payments:stream"), {"ref": self.payment.reference})
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            # no cliente de testes (WSGI) a espera é 0: responde logo (short polling)
+            body = b"".join(response).decode()
+        return body, lookup
+
+    def test_pending_times_out(self):
+        body, lookup = self.stream("pending")
+        self.assertIn("event: timeout", body)
+        lookup.assert_called_once_with(self.payment.paysuite_id)
+
+    def test_lost_webhook_is_caught_by_the_provider_lookup(self):
+        body, _ = self.stream("completed")
+        self.assertIn("event: payment", body)
+        self.assertIn('"state": "paid"', body)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.PAID)
+
+    def test_already_paid_skips_the_lookup(self):
+        Payment.objects.filter(pk=self.payment.pk).update(status=PaymentStatus.PAID)
+        body, lookup = self.stream(None)
+        self.assertIn('"state": "paid"', body)
+        lookup.assert_not_called()
+
+    def test_unknown_reference(self):
+        self.assertEqual(self.client.get(reverse("payments:stream"), {"ref": "nope"}).status_code, 404)
+
+    @override_settings(PAYMENT_STREAM_TIMEOUT=0.2)
+    async def test_asgi_waits_for_the_broker_then_asks_the_provider(self):
+        with mock.patch(
+            "payments.views.get_remote_payment", return_value=remote("completed", self.payment.paysuite_id)
+        ) as lookup:
+            response = await self.async_client.get(reverse("payments:stream"), {"ref": self.payment.reference})
+            body = "".join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertTrue(body.startswith("retry: 2000"))
+        self.assertIn('"state": "paid"', body)
+        lookup.assert_called_once()
+
+
+@override_settings(CACHES=LOCMEM)
+class PubSubTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.broker = LocalBroker()
+
+    def test_wait_returns_message_published_before(self):
+        self.broker.publish("c", {"state": "paid"})
+        self.assertEqual(asyncio.run(self.broker.wait("c", timeout=1)), {"state": "paid"})
+
+    def test_wait_times_out(self):
+        self.assertIsNone(asyncio.run(self.broker.wait("c", timeout=0.05, poll_interval=0.01)))
+
+    def test_publish_from_another_thread_wakes_the_waiter(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            # sem o aviso, só veria a mensagem no próximo poll (30 s)
+            threading.Timer(0.05, self.broker.publish, ("c", {"state": "paid"})).start()
+            message = await self.broker.wait("c", timeout=5, poll_interval=30)
+            return message, loop.time() - started
+
+        message, elapsed = asyncio.run(scenario())
+        self.assertEqual(message, {"state": "paid"})
+        self.assertLess(elapsed, 2)
+
+    def test_publish_payment_ignores_pending(self):
+        payment = make_payment()
+        publish_payment(payment)
+        self.assertIsNone(cache.get(f"pubsub:{payment_channel(payment.reference)}"))
+
+        payment.status = PaymentStatus.PAID
+        publish_payment(payment)
+        message = cache.get(f"pubsub:{payment_channel(payment.reference)}")
+        self.assertEqual(message["state"], "paid")
+        self.assertEqual(message["ticket_code"], payment.registration.ticket_code)
+
+
+class FakePaySuite(ThreadingHTTPServer):
+    """PaySuite local: responde por ordem com `replies` (status, headers); a última repete-se."""
+
+    def __init__(self, replies):
+        super().__init__(("127.0.0.1", 0), FakePaySuiteHandler)
+        self.replies = list(replies)
+        self.hits = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/api/v1"
+
+
+class FakePaySuiteHandler(BaseHTTPRequestHandler):
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        server.hits.append(self.command)
+        status, headers = server.replies.pop(0) if len(server.replies) > 1 else server.replies[0]
+        body = json.dumps({"status": "success", "data": {"id": "ps-1"}} if status < 300 else {}).encode()
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json", **headers}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class PaySuiteClientTests(SimpleTestCase):
+    def client_for(self, *replies, retries=2, breaker=None):
+        server = FakePaySuite(replies)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = PaySuiteClient(base_url=server.url, token="t", retries=retries, breaker=breaker)
+        client.session.trust_env = False  # sem proxies do ambiente
+        return client, server
+
+    @mock.patch("urllib3.util.retry.time.sleep")
+    def test_get_is_retried(self, sleep):
+        client, server = self.client_for((503, {}), (200, {}))
+        self.assertEqual(client.get_payment("ps-1"), {"id": "ps-1"})
+        self.assertEqual(server.hits, ["GET", "GET"])
+
+    @mock.patch("urllib3.util.retry.time.sleep")
+    def test_post_is_not_retried(self, sleep):
+        client, server = self.client_for((503, {}), (200, {}))
+        with self.assertRaises(PaySuiteError):
+            client.create_payment_request(
+                amount="500.00", reference="RWB1", description="x", return_url="http://r", callback_url="http://c",
+            )
+        self.assertEqual(server.hits, ["POST"])
+        sleep.assert_not_called()
+
+    @mock.patch("urllib3.util.retry.time.sleep")
+    def test_retry_after_is_capped(self, sleep):
+        client, server = self.client_for((503, {"Retry-After": "120"}), (200, {}))
+        client.get_payment("ps-1")
+        sleep.assert_called_once_with(RETRY_AFTER_MAX)
+
+    @mock.patch("urllib3.util.retry.time.sleep")
+    def test_open_breaker_skips_the_request(self, sleep):
+        client, server = self.client_for((500, {}), retries=0, breaker=CircuitBreaker(failure_threshold=2))
+        for _ in range(2):
+            with self.assertRaises(PaySuiteError):
+                client.get_payment("ps-1")
+        with self.assertRaises(PaySuiteUnavailable):
+            client.get_payment("ps-1")
+        self.assertEqual(server.hits, ["GET", "GET"])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("payments.services.paysuite.time.monotonic", return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_probe_closes_on_success(self):
+        self.open_breaker()
+        self.clock.return_value += 31
+        self.assertTrue(self.breaker.allow())
+        # só um pedido de teste de cada vez
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.clock.return_value += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.return_value += 31
+        self.assertTrue(self.breaker.allow())
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
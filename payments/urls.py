@@ -8,5 +8,6 @@ urlpatterns = [
     path("start/", views.start_event_payment, name="start_event_payment"),
     path("return/", views.payment_return, name="return"),
     path("status/", views.payment_status, name="status"),
+    path("stream/", views.payment_stream, name="stream"),
     path("webhook/paysuite/", webhooks.paysuite_webhook, name="webhook_paysuite"),
 ]
\ No newline at end of file
@@ -1,42 +1,36 @@
+import json
 import logging
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.utils import timezone
-from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_http_methods
 
-from events.models import EventRegistration, PaymentStatus as RegPaymentStatus
+from core.metrics import query_budget
+from events.models import EventRegistration, RegistrationStatus, PaymentStatus as RegPaymentStatus
 from .models import Payment, PaymentStatus as PayPaymentStatus, PaymentMethod
-from .services.paysuite import create_payment_request, get_payment, PaySuiteError
+from .pubsub import broker, payment_channel, payment_message
+from .services.lookup import get_remote_payment
+from .services.paysuite import create_payment_request, PaySuiteError
+from .services.transitions import PENDING, ProviderResult, apply_result
 
 logger = logging.getLogger(__name__)
 
 
 def _make_reference(reg: EventRegistration) -> str:
+    # RWB-XXXXXXXX -> RWBXXXXXXXX: único porque o ticket_code é único (sem consulta prévia)
     base = (reg.ticket_code or f"RWB{reg.id}").replace("-", "").strip()
     base = "".join(ch for ch in base if ch.isalnum())
     return base[:32] or f"RWB{reg.id}"
 
 
-def _interpret_remote_payment(remote: dict) -> str:
-    """
-    Normaliza status remoto -> "paid" | "failed" | "pending"
-    PaySuite no teu payload usa: transaction.status == "completed"
-    """
-    tx = remote.get("transaction") or {}
-    tx_status = (tx.get("status") or "").lower()
-
-    if tx_status == "completed":
-        return "paid"
-    if tx_status in ("failed", "cancelled", "canceled"):
-        return "failed"
-    return "pending"
-
-
+@query_budget(8)
 @require_http_methods(["GET"])
 def start_event_payment(request):
     registration_id = request.GET.get("registration_id")
@@ -47,14 +41,17 @@ def start_event_payment(request):
     if reg.payment_status == RegPaymentStatus.PAID:
         return redirect("events:registration_success", ticket_code=reg.ticket_code)
 
+    if reg.status == RegistrationStatus.CANCELLED or reg.hold_expired:
+        messages.error(request, "A reserva do teu lugar expirou. Faz a inscrição novamente.")
+        return redirect("events:register_form", slug=reg.event.slug)
+
     if method and method not in dict(PaymentMethod.choices):
         messages.error(request, "Método de pagamento inválido.")
         return redirect("events:register_form", slug=reg.event.slug)
 
     amount = reg.amount_due or Decimal("0.00")
     if amount <= 0:
-        reg.payment_status = RegPaymentStatus.PAID
-        reg.save(update_fields=["payment_status"])
+        reg.mark_paid()
         return redirect("events:registration_success", ticket_code=reg.ticket_code)
 
     payment, _ = Payment.objects.get_or_create(
@@ -69,8 +66,7 @@ def start_event_payment(request):
     )
 
     if payment.status == PayPaymentStatus.PAID:
-        reg.payment_status = RegPaymentStatus.PAID
-        reg.save(update_fields=["payment_status"])
+        reg.mark_paid()
         return redirect("events:registration_success", ticket_code=reg.ticket_code)
 
     return_url = request.build_absolute_uri(reverse("payments:return")) + f"?ref={payment.reference}"
@@ -104,62 +100,60 @@ def start_event_payment(request):
     return redirect(payment.checkout_url)
 
 
-@require_http_methods(["GET"])
-def payment_return(request):
-    ref = (request.GET.get("ref") or "").strip()
-    if not ref:
-        return render(request, "payments/return.html", {"state": "verifying"})
-
-    payment = get_object_or_404(Payment, reference=ref)
+def _refresh_payment(payment: Payment) -> str:
+    """
+    Estado atual do pagamento; consulta a PaySuite (com cache/single-flight) só se
+    ainda estiver pendente. Devolve "paid" | "failed" | "pending".
+    """
     reg = payment.registration
-
-    # já confirmado
     if payment.status == PayPaymentStatus.PAID or reg.payment_status == RegPaymentStatus.PAID:
-        return redirect("events:registration_success", ticket_code=reg.ticket_code)
-
+        return "paid"
+    if payment.status == PayPaymentStatus.FAILED:
+        return "failed"
     if not payment.paysuite_id:
-        return render(request, "payments/return.html", {"payment": payment, "state": "verifying"})
-
-    try:
-        remote = get_payment(payment.paysuite_id)
-    except PaySuiteError:
-        return render(request, "payments/return.html", {"payment": payment, "state": "verifying"})
+        return "pending"
 
-    # guarda sempre
-    payment.raw_provider_payload = remote
+    remote = get_remote_payment(payment.paysuite_id)
+    if remote is None:
+        return "pending"
 
-    normalized = _interpret_remote_payment(remote)
+    result = ProviderResult.from_remote(remote, reference=payment.reference)
+    # ainda pendente do lado da PaySuite, como já está gravado: nada a escrever
+    # (evita um SELECT ... FOR UPDATE + UPDATE por poll de cada cliente à espera)
+    if result.outcome == PENDING:
+        return "pending"
 
-    tx = remote.get("transaction") or {}
+    updated = apply_result(result)
+    if updated is None:
+        return "pending"
+    payment.status = updated.status
+    payment.registration = updated.registration
+    return {PayPaymentStatus.PAID: "paid", PayPaymentStatus.FAILED: "failed"}.get(updated.status, "pending")
 
-    if normalized == "paid":
-        payment.status = PayPaymentStatus.PAID
-        payment.transaction_id = str(tx.get("id") or tx.get("transaction_id") or payment.transaction_id)
 
-        paid_at = tx.get("paid_at") or remote.get("paid_at")
-        payment.paid_at = parse_datetime(paid_at) if paid_at else timezone.now()
+@query_budget(6)
+@require_http_methods(["GET"])
+def payment_return(request):
+    ref = (request.GET.get("ref") or "").strip()
+    if not ref:
+        return render(request, "payments/return.html", {"state": "verifying"})
 
-        payment.save(update_fields=["status", "transaction_id", "paid_at", "raw_provider_payload", "updated_at"])
+    payment = get_object_or_404(Payment.objects.select_related("registration"), reference=ref)
+    reg = payment.registration
 
-        reg.payment_status = RegPaymentStatus.PAID
-        reg.save(update_fields=["payment_status"])
+    state = _refresh_payment(payment)
 
+    if state == "paid":
         return redirect("events:registration_success", ticket_code=reg.ticket_code)
 
-    if normalized == "failed":
-        payment.status = PayPaymentStatus.FAILED
-        payment.save(update_fields=["status", "raw_provider_payload", "updated_at"])
-
-        reg.payment_status = RegPaymentStatus.FAILED
-        reg.save(update_fields=["payment_status"])
-
+    if state == "failed":
         return render(request, "payments/return.html", {"payment": payment, "state": "failed"})
 
-    payment.status = PayPaymentStatus.PENDING
-    payment.save(update_fields=["status", "raw_provider_payload", "updated_at"])
+    # a página faz polling ao payment_status (JSON) em vez de recarregar
     return render(request, "payments/return.html", {"payment": payment, "state": "verifying"})
 
 
+@query_budget(6)
 @require_http_methods(["GET"])
 def payment_status(request):
     ref = (request.GET.get("ref") or "").strip()
@@ -171,9 +165,62 @@ def payment_status(request):
         return JsonResponse({"ok": False}, status=404)
 
     reg = payment.registration
-    return JsonResponse({
+    state = _refresh_payment(payment)
+
+    data = {
         "ok": True,
+        "state": state,
         "payment_status": payment.status,
         "registration_payment_status": reg.payment_status,
         "ticket_code": reg.ticket_code,
-    })
\ No newline at end of file
+    }
+    if state == "paid":
+        data["redirect_url"] = reverse("events:registration_success", kwargs={"ticket_code": reg.ticket_code})
+    return JsonResponse(data)
+
+
+@require_http_methods(["GET"])
+async def payment_stream(request):
+    """
+    Server-Sent Events: mantém a ligação aberta até o pagamento sair de PENDING
+    (publicado pelo webhook via payments.pubsub) e envia o ticket/redirect.
+    Se nada chegar até ao fim da espera (webhook perdido ou atrasado), pergunta à
+    PaySuite como o payment_status (_refresh_payment: lookup em cache, single-flight).
+
+    Só em ASGI (Procfile) é que a ligação fica presa, e aí custa uma coroutine.
+    Em WSGI cada ligação à espera ocupava um thread do servidor, por isso responde
+    logo com o estado atual e o browser volta a ligar passado `retry` (short polling).
+    """
+    ref = (request.GET.get("ref") or "").strip()
+    payment = None
+    if ref:
+        payment = await Payment.objects.select_related("registration").filter(reference=ref).afirst()
+    if not payment:
+        return JsonResponse({"ok": False}, status=404)
+
+    hold = isinstance(request, ASGIRequest)
+
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def stream():
+        yield "retry: 2000\n\n" if hold else "retry: 4000\n\n"
+
+        # uma única leitura da BD por ligação; depois só o broker
+        message = payment_message(payment)
+        if message["state"] == "pending":
+            timeout = settings.PAYMENT_STREAM_TIMEOUT if hold else 0
+            message = await broker.wait(payment_channel(payment.reference), timeout=timeout)
+
+        if message is None and await sync_to_async(_refresh_payment)(payment) != "pending":
+            message = payment_message(payment)
+
+        if message is None:
+            yield sse("timeout", {"state": "pending"})
+        else:
+            yield sse("payment", message)
+
+    resp = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -2,20 +2,34 @@ import json
 import hmac
 import hashlib
 import logging
+import time
+from datetime import timedelta
 
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Q
 from django.http import HttpResponse, HttpResponseForbidden
-from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .models import Payment, PaymentStatus as PayPaymentStatus
-from events.models import PaymentStatus as RegPaymentStatus
+from core.metrics import query_budget
+
+from .models import WebhookInbox, WebhookStatus
+from .services.transitions import ProviderResult, apply_result
 
 logger = logging.getLogger(__name__)
 
+# tentativas antes de um webhook ficar FAILED (pode ser reprocessado à mão)
+MAX_ATTEMPTS = 5
+# pausa depois da 1.ª falha; dobra a cada tentativa (5s, 10s, 20s, 40s)
+RETRY_BACKOFF = timedelta(seconds=5)
+
+
+def retry_at(attempts: int, now=None):
+    """Quando uma entrada que falhou `attempts` vezes volta a ser processada."""
+    return (now or timezone.now()) + RETRY_BACKOFF * 2 ** (attempts - 1)
+
 
 def _verify_signature(raw: bytes, signature: str | None) -> bool:
     secret = (settings.PAYSUITE_WEBHOOK_SECRET or "").encode("utf-8")
@@ -30,9 +44,14 @@ def _tx_status(payload_data: dict) -> str:
     return (tx.get("status") or "").lower()
 
 
+@query_budget(1)
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def paysuite_webhook(request):
+    """
+    Só verifica a assinatura e grava o corpo no WebhookInbox (idempotente por request_id).
+    O estado do pagamento é atualizado pelo comando process_webhooks.
+    """
     if request.method == "GET":
         return HttpResponse("OK", status=200)
 
@@ -44,72 +63,95 @@ def paysuite_webhook(request):
 
     try:
         payload = json.loads(raw.decode("utf-8"))
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, UnicodeDecodeError):
         return HttpResponse("ok")
 
-    event_name = payload.get("event")
-    request_id = payload.get("request_id")
-    data = payload.get("data") or {}
-
-    reference = data.get("reference")
-    paysuite_id = data.get("id")
+    request_id = str(payload.get("request_id") or "") or "sha256:" + hashlib.sha256(raw).hexdigest()
 
-    logger.info(
-        "PaySuite webhook: event=%s request_id=%s reference=%s paysuite_id=%s tx_status=%s",
-        event_name, request_id, reference, paysuite_id, _tx_status(data)
+    # INSERT ... ON CONFLICT DO NOTHING: retries da PaySuite não criam duplicados
+    WebhookInbox.objects.bulk_create(
+        [WebhookInbox(request_id=request_id[:120], event=str(payload.get("event") or "")[:60], body=raw.decode("utf-8"))],
+        ignore_conflicts=True,
     )
+    return HttpResponse("ok")
 
-    if not reference and not paysuite_id:
-        return HttpResponse("ok")
-
-    with transaction.atomic():
-        q = Payment.objects.select_for_update()
-        payment = q.filter(reference=reference).first() if reference else None
-        if not payment and paysuite_id:
-            payment = q.filter(paysuite_id=paysuite_id).first()
-
-        if not payment:
-            logger.warning("Webhook payment not found: reference=%s paysuite_id=%s payload=%s", reference, paysuite_id, payload)
-            return HttpResponse("ok")
-
-        if request_id and payment.last_webhook_request_id == request_id:
-            return HttpResponse("ok")
-
-        payment.last_webhook_request_id = request_id
-        payment.raw_provider_payload = payload
 
-        reg = payment.registration
+def apply_webhook(payload: dict, *, force: bool = False) -> bool:
+    """
+    Aplica um webhook ao Payment/inscrição (payments.services.transitions).
+    Devolve False se o webhook foi ignorado (sem pagamento, ou request_id já aplicado).
+    """
+    result = ProviderResult.from_webhook(payload)
 
-        # Critério de sucesso: event_name OU transaction.status
-        tx = (data.get("transaction") or {})
-        tx_status = (tx.get("status") or "").lower()
-
-        is_paid = (event_name == "payment.success") or (tx_status == "completed")
-        is_failed = (event_name == "payment.failed") or (tx_status in ("failed", "cancelled", "canceled"))
-
-        if is_paid:
-            payment.status = PayPaymentStatus.PAID
-            payment.transaction_id = str(tx.get("id") or tx.get("transaction_id") or payment.transaction_id)
-
-            paid_at = tx.get("paid_at") or data.get("paid_at")
-            payment.paid_at = parse_datetime(paid_at) if paid_at else timezone.now()
-
-            reg.payment_status = RegPaymentStatus.PAID
-            reg.save(update_fields=["payment_status"])
+    logger.info(
+        "PaySuite webhook: event=%s request_id=%s reference=%s paysuite_id=%s tx_status=%s",
+        payload.get("event"), result.request_id, result.reference, result.paysuite_id,
+        _tx_status(payload.get("data") or {}),
+    )
 
-        elif is_failed:
-            payment.status = PayPaymentStatus.FAILED
+    if not result.reference and not result.paysuite_id:
+        return False
 
-            reg.payment_status = RegPaymentStatus.FAILED
-            reg.save(update_fields=["payment_status"])
+    payment = apply_result(result, force=force)
+    if payment is None:
+        logger.warning(
+            "Webhook ignored (payment not found or duplicate): reference=%s paysuite_id=%s request_id=%s",
+            result.reference, result.paysuite_id, result.request_id,
+        )
+        return False
+    return True
 
-        payment.save(update_fields=[
-            "status",
-            "transaction_id",
-            "paid_at",
-            "last_webhook_request_id",
-            "raw_provider_payload",
-            "updated_at",
-        ])
 
-    return HttpResponse("ok")
\ No newline at end of file
+def process_inbox_entry(entry: WebhookInbox, *, force: bool = False):
+    """
+    Processa uma entrada do inbox e grava o resultado (estado, erro, latência).
+    """
+    started = time.perf_counter()
+    entry.attempts += 1
+    try:
+        with transaction.atomic():
+            applied = apply_webhook(json.loads(entry.body), force=force)
+        entry.status = WebhookStatus.PROCESSED if applied else WebhookStatus.IGNORED
+        entry.error = ""
+    except Exception as e:
+        logger.exception("Webhook processing failed: request_id=%s", entry.request_id)
+        entry.status = WebhookStatus.FAILED if entry.attempts >= MAX_ATTEMPTS else WebhookStatus.PENDING
+        entry.error = f"{e.__class__.__name__}: {e}"
+
+    entry.processed_at = timezone.now()
+    if entry.status == WebhookStatus.PENDING:
+        entry.next_attempt_at = retry_at(entry.attempts, entry.processed_at)
+    else:
+        entry.next_attempt_at = None
+    entry.processing_ms = int((time.perf_counter() - started) * 1000)
+    entry.latency_ms = int((entry.processed_at - entry.received_at).total_seconds() * 1000)
+    entry.save(update_fields=[
+        "status", "attempts", "error", "next_attempt_at", "processed_at", "processing_ms", "latency_ms",
+    ])
+
+
+def _due(now) -> Q:
+    return Q(status=WebhookStatus.PENDING) & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+
+
+def drain_inbox(batch_size: int = 100) -> list[WebhookInbox]:
+    """
+    Processa o próximo lote de webhooks pendentes (por ordem de chegada), cada um na
+    sua transação: os locks, os on_commit (fila de PDFs) e o aviso ao pub/sub saem
+    logo a seguir a cada entrada. Com Postgres, vários workers podem correr em
+    paralelo (SKIP LOCKED na linha de cada entrada).
+    """
+    now = timezone.now()
+    ids = list(
+        WebhookInbox.objects.filter(_due(now)).order_by("received_at").values_list("id", flat=True)[:batch_size]
+    )
+    entries = []
+    for pk in ids:
+        with transaction.atomic():
+            entry = WebhookInbox.objects.select_for_update(skip_locked=True).filter(_due(now), pk=pk).first()
+            if entry is None:
+                # outro worker já a apanhou
+                continue
+            process_inbox_entry(entry)
+        entries.append(entry)
+    return entries
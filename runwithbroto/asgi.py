@@ -3,6 +3,11 @@ ASGI config for runwithbroto project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Production entry point (Procfile: gunicorn with the uvicorn worker). The
+payments:stream view (Server-Sent Events) holds each connection open while the
+payment is pending; under ASGI that costs a coroutine, not a worker thread.
+Under WSGI (e.g. runserver) the view answers at once and the browser re-polls.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +17,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'runwithbroto.settings')
+# em ASGI cada pedido síncrono corre num thread novo: uma ligação persistente nunca
+# seria reaproveitada e ficaria aberta até ao garbage collector (ver DB_CONN_MAX_AGE)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
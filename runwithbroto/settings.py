@@ -1,5 +1,7 @@
 from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,10 +39,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     "core.apps.CoreConfig",
     "events.apps.EventsConfig",
-    "payments.apps.PaymentsConfig"
+    "payments.apps.PaymentsConfig",
+    "checkin.apps.CheckinConfig",
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +58,7 @@ ROOT_URLCONF = 'runwithbroto.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -74,13 +78,98 @@ WSGI_APPLICATION = 'runwithbroto.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DB_PROFILE escolhe a configuração (compara-as com: python manage.py bench_db):
+# - "sqlite" (omissão): WAL (leitores não esperam pelo writer), synchronous=NORMAL,
+#   mmap/cache maiores, BEGIN IMMEDIATE e ligações persistentes
+# - "sqlite-legacy": a configuração por omissão do Django (journal rollback, ligação por pedido)
+# - "postgres" (omissão se DATABASE_URL existir): ligações persistentes com health checks;
+#   DB_POOL=1 usa o pool do psycopg (pip install "psycopg[binary,pool]")
+#
+# DB_CONN_MAX_AGE: as ligações persistentes só servem processos com threads fixos (WSGI,
+# comandos/workers). O web corre em ASGI (Procfile), onde cada pedido síncrono usa um
+# thread novo e a ligação nunca é reaproveitada: o asgi.py põe a omissão a 0 (uma ligação
+# por pedido). Com Postgres em ASGI, o DB_POOL=1 é que reaproveita ligações.
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DB_PROFILE = os.getenv("DB_PROFILE") or ("postgres" if DATABASE_URL else "sqlite")
+SQLITE_PATH = os.getenv("SQLITE_PATH") or BASE_DIR / 'db.sqlite3'
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+
+if DB_PROFILE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # segundos à espera do lock de escrita antes de "database is locked"
+                'timeout': int(os.getenv("SQLITE_TIMEOUT", "20")),
+                # a transação pede logo o lock de escrita: sem o upgrade de leitura para
+                # escrita, que falha sem respeitar o timeout
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=134217728;'  # 128 MB
+                    'PRAGMA cache_size=-20000;'  # ~20 MB por ligação
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+elif DB_PROFILE == "sqlite-legacy":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+        }
+    }
+elif DB_PROFILE == "postgres":
+    if not DATABASE_URL:
+        raise ImproperlyConfigured("DB_PROFILE=postgres precisa de DATABASE_URL.")
+    _db_url = urlsplit(DATABASE_URL)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': unquote(_db_url.path.lstrip("/")),
+            'USER': unquote(_db_url.username or ""),
+            'PASSWORD': unquote(_db_url.password or ""),
+            'HOST': _db_url.hostname or "",
+            'PORT': _db_url.port or "",
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # ex.: ?sslmode=require
+            'OPTIONS': dict(parse_qsl(_db_url.query)),
+        }
+    }
+    if os.getenv("DB_POOL") == "1":
+        # o pool substitui as ligações persistentes (o Django exige CONN_MAX_AGE=0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv("DB_POOL_MIN", "2")),
+            'max_size': int(os.getenv("DB_POOL_MAX", "4")),
+        }
+else:
+    raise ImproperlyConfigured(f"DB_PROFILE desconhecido: {DB_PROFILE}")
+
+
+# Cache partilhada entre os workers do gunicorn (schedule, etc.)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("DJANGO_CACHE_DIR", str(BASE_DIR / ".cache")),
     }
 }
 
+# Tempo máximo (s) que o fragmento do schedule fica em cache
+SCHEDULE_CACHE_TTL = int(os.getenv("SCHEDULE_CACHE_TTL", "3600"))
+
+# Séries (EventSeries): semanas com Event criados (materialize_series) e semanas
+# mostradas na agenda como ocorrências virtuais
+SERIES_HORIZON_WEEKS = int(os.getenv("SERIES_HORIZON_WEEKS", "8"))
+SERIES_PREVIEW_WEEKS = int(os.getenv("SERIES_PREVIEW_WEEKS", "26"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -132,14 +221,54 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # PDFs de tickets já gerados (fora do MEDIA_ROOT: só são servidos pela view)
+    "tickets": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": os.getenv("TICKETS_ROOT", str(BASE_DIR / "private" / "tickets"))},
+    },
+}
+
 
 # settings.py
-PAYSUITE_API_BASE = "https://paysuite.tech/api/v1"
+PAYSUITE_API_BASE = os.getenv("PAYSUITE_API_BASE", "https://paysuite.tech/api/v1")
 PAYSUITE_API_TOKEN = os.getenv("PAYSUITE_API_TOKEN")  # Settings > API Access :contentReference[oaicite:2]{index=2}
 
 # Webhook signing secret (configuras no merchant settings do PaySuite)
 PAYSUITE_WEBHOOK_SECRET = os.getenv("PAYSUITE_WEBHOOK_SECRET")
 
+# Cliente HTTP (payments.services.paysuite.PaySuiteClient)
+PAYSUITE_CONNECT_TIMEOUT = float(os.getenv("PAYSUITE_CONNECT_TIMEOUT", "3.05"))
+PAYSUITE_READ_TIMEOUT = float(os.getenv("PAYSUITE_READ_TIMEOUT", "10"))
+PAYSUITE_GET_RETRIES = int(os.getenv("PAYSUITE_GET_RETRIES", "2"))
+PAYSUITE_BREAKER_THRESHOLD = int(os.getenv("PAYSUITE_BREAKER_THRESHOLD", "5"))
+PAYSUITE_BREAKER_RESET = float(os.getenv("PAYSUITE_BREAKER_RESET", "30"))
+
+# Segundos que o último get_payment de um pagamento é reaproveitado (polling do return)
+PAYSUITE_LOOKUP_TTL = int(os.getenv("PAYSUITE_LOOKUP_TTL", "5"))
+
+# Segundos que o payment_stream (SSE) mantém a ligação aberta antes de o cliente reconectar
+PAYMENT_STREAM_TIMEOUT = int(os.getenv("PAYMENT_STREAM_TIMEOUT", "25"))
+
+# Minutos que um lugar fica reservado para uma inscrição paga à espera de pagamento
+SEAT_HOLD_MINUTES = int(os.getenv("SEAT_HOLD_MINUTES", "20"))
+
+# Assina o QR dos ingressos (events.tickets). Mudar invalida os QR já emitidos.
+TICKET_SIGNING_KEY = os.getenv("TICKET_SIGNING_KEY") or SECRET_KEY
+
+# Máximo de tickets no PDF único do admin: o ReportLab guarda as páginas todas em
+# memória até ao fim e o PDF é gerado dentro do pedido; acima disto, usar o ZIP
+TICKETS_PDF_MAX = int(os.getenv("TICKETS_PDF_MAX", "500"))
+
+# Chave dos scanners de check-in (header X-Checkin-Key); vazio = só sessão de staff
+CHECKIN_API_KEY = os.getenv("CHECKIN_API_KEY", "")
+
 
 LOGGING = {
     "version": 1,
@@ -151,4 +280,24 @@ LOGGING = {
         "handlers": ["console"],
         "level": "INFO",
     },
-}
\ No newline at end of file
+    "loggers": {
+        # uma linha JSON por pedido (core.middleware.RequestMetricsMiddleware)
+        "runwithbroto.metrics": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+
+# Métricas por pedido (core.middleware.RequestMetricsMiddleware)
+REQUEST_METRICS_LOG = os.getenv("REQUEST_METRICS_LOG", "1") == "1"
+# True: uma view acima do orçamento de queries levanta QueryBudgetExceeded (útil em testes)
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+# Orçamentos por nome de URL, para views sem @query_budget (ex.: admin)
+QUERY_BUDGETS = {
+    "admin:events_event_changelist": 12,
+    "admin:events_eventregistration_changelist": 12,
+    "admin:payments_payment_changelist": 12,
+}
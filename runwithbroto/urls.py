@@ -9,6 +9,7 @@ urlpatterns = [
     path("", include("core.urls")),
     path("events/", include("events.urls")),
     path("payments/", include("payments.urls", namespace='payments')),
+    path("checkin/", include("checkin.urls")),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)